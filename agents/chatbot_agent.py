@@ -1,58 +1,237 @@
+import contextvars
+import os
+import threading
+import time
+from collections import Counter, OrderedDict, deque
+from typing import Dict, Optional, Tuple
 from langchain.agents import initialize_agent, AgentType, Tool
-from langchain.tools import tool
 from llm_utils.ollama_wrapper import get_local_llm
+from llm_utils.llm_gateway import LLMGatewayBusy, Priority
 from callbacks.logging_callback import LoggingCallbackHandler
 from agents.validation_agent import run_all_validations
+from agents.intent_router import answer as answer_intent, classify
+from db.duplicate_index import normalize_emirates_id
+from utils.fuzzy_match import normalize
+from utils.logger import get_logger
+
+logger = get_logger("chatbot_agent")
+
+CHAT_MAX_SESSIONS = int(os.environ.get("CHAT_MAX_SESSIONS", "1000"))
+CHAT_MEMORY_TURNS = int(os.environ.get("CHAT_MEMORY_TURNS", "6"))
+CHAT_TOOL_CACHE_SIZE = int(os.environ.get("CHAT_TOOL_CACHE_SIZE", "16"))
+CHAT_TOOL_CACHE_TTL = float(os.environ.get("CHAT_TOOL_CACHE_TTL", "600"))
+# Other turns after which validation details still missing a field are dropped
+CHAT_PENDING_TURNS = int(os.environ.get("CHAT_PENDING_TURNS", "1"))
+CHAT_SESSION_RUNS = 20
+
+# Session whose memory and tool cache the running turn uses
+_current_session: contextvars.ContextVar[Optional["ChatSession"]] = contextvars.ContextVar("chat_session", default=None)
+
 
-@tool
 def greet(name: str) -> str:
     """Returns a greeting for the user."""
-    return f"Hello, {name}! Welcome to the Social Support Chatbot."
+    return f"Hello, {name.strip() or 'there'}! Welcome to the Social Support Chatbot."
+
+
+def parse_validation_input(text: str) -> Tuple[str, str, str, int]:
+    """Emirates ID, name, address and dependents from "id, name, address, dependents" tool input"""
+    parts = [p.strip() for p in text.split(",")]
+    if len(parts) < 4:
+        raise ValueError("Expected: Emirates ID, name, address, number of dependents")
+    emirates_id, name, dependents = parts[0], parts[1], parts[-1]
+    return emirates_id, name, ", ".join(parts[2:-1]), int(dependents)
+
+
+def validation_cache_key(emirates_id: str, name: str, address: str, dependents: int) -> tuple:
+    return ("validate", normalize_emirates_id(emirates_id), normalize(name), normalize(address), int(dependents))
+
 
-def get_chat_agent():
-    callback = LoggingCallbackHandler()
-    llm = get_local_llm()
-    
-    tools = [
-        Tool(
-            name="Greet",
-            func=greet,
-            description="Greets the user when they type their name"
-        )
-    ]
-
-@tool
 def validate_user_data(emirates_id: str, name: str, address: str, dependents: int) -> dict:
-    """Validates user data against government, bank, and credit systems"""
-    return run_all_validations(emirates_id, name, address, dependents)
+    """Validates user data against government, bank, and credit systems, memoized per chat session"""
+    session = _current_session.get()
+    key = validation_cache_key(emirates_id, name, address, dependents)
+    if session is not None:
+        cached = session.cached(key)
+        if cached is not None:
+            logger.info("Validation result served from the session cache")
+            return cached
+    result = run_all_validations(emirates_id, name, address, dependents)
+    if session is not None:
+        session.remember(key, result)
+    return result
+
+
+def _validate_tool(text: str) -> str:
+    try:
+        result = validate_user_data(*parse_validation_input(text))
+    except ValueError as e:
+        return str(e)
+    return str(result)
+
+
+class ChatSession:
+    """Bounded conversation memory and tool-result cache of one chat session"""
+
+    def __init__(self, memory_turns: int = CHAT_MEMORY_TURNS, cache_size: int = CHAT_TOOL_CACHE_SIZE,
+                 cache_ttl: float = CHAT_TOOL_CACHE_TTL):
+        self.history = deque(maxlen=2 * memory_turns)
+        self.pending_fields: Dict[str, str] = {}  # validation details collected by the intent router
+        self.pending_idle_turns = 0
+        self.run_ids = deque(maxlen=CHAT_SESSION_RUNS)  # applications submitted from this session
+        self._cache: "OrderedDict[tuple, tuple]" = OrderedDict()
+        self._cache_size = cache_size
+        self._cache_ttl = cache_ttl
+        self.lock = threading.Lock()
+
+    def cached(self, key: tuple):
+        entry = self._cache.get(key)
+        if entry is None:
+            return None
+        stored_at, value = entry
+        if time.monotonic() - stored_at > self._cache_ttl:
+            del self._cache[key]
+            return None
+        self._cache.move_to_end(key)
+        return value
+
+    def remember(self, key: tuple, value):
+        self._cache[key] = (time.monotonic(), value)
+        self._cache.move_to_end(key)
+        while len(self._cache) > self._cache_size:
+            self._cache.popitem(last=False)
+
+    def transcript(self) -> str:
+        return "\n".join(f"{role}: {text}" for role, text in self.history)
+
+    def expire_pending(self, validation_turn: bool):
+        """Drop incomplete validation details after CHAT_PENDING_TURNS unrelated turns"""
+        if validation_turn or not self.pending_fields:
+            self.pending_idle_turns = 0
+            return
+        self.pending_idle_turns += 1
+        if self.pending_idle_turns >= CHAT_PENDING_TURNS:
+            self.pending_fields.clear()
+            self.pending_idle_turns = 0
+
+
+class ChatSessionManager:
+    """
+    Process-wide chatbot: one ReAct agent, many sessions
+
+    The LLM client, tools and agent are built once on first use. Each
+    session keeps its last turns (prepended to the question) and its own
+    tool-result cache; sessions are evicted least recently used first.
+    Greetings, status lookups and validation requests are answered by the
+    intent router without the LLM; only other messages reach the agent.
+    """
+
+    def __init__(self, max_sessions: int = CHAT_MAX_SESSIONS):
+        self._agent = None
+        self._agent_lock = threading.Lock()
+        self._sessions: "OrderedDict[str, ChatSession]" = OrderedDict()
+        self._max_sessions = max_sessions
+        self._lock = threading.Lock()
+        self._routes = Counter()
+
+    def get_agent(self):
+        with self._agent_lock:
+            if self._agent is None:
+                tools = [
+                    Tool(
+                        name="Greet",
+                        func=greet,
+                        description="Greets the user when they type their name"
+                    ),
+                    Tool(
+                        name="ValidateUserData",
+                        func=_validate_tool,
+                        description=(
+                            "Validates user information against official systems. "
+                            "Input: Emirates ID, name, address, number of dependents (comma separated). "
+                            "Use when user asks about data verification or application status."
+                        )
+                    )
+                ]
+                self._agent = initialize_agent(
+                    tools=tools,
+                    llm=get_local_llm(priority=Priority.CHAT),
+                    agent=AgentType.ZERO_SHOT_REACT_DESCRIPTION,
+                    verbose=False,
+                    handle_parsing_errors=True,
+                    callbacks=[LoggingCallbackHandler()]
+                )
+                logger.info("Chat agent initialized")
+            return self._agent
+
+    def session(self, session_id: str) -> ChatSession:
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is None:
+                session = self._sessions[session_id] = ChatSession()
+                while len(self._sessions) > self._max_sessions:
+                    self._sessions.popitem(last=False)
+            self._sessions.move_to_end(session_id)
+            return session
+
+    def link_run(self, session_id: str, run_id: str):
+        """Let a session ask for the status of an application it submitted"""
+        self.session(session_id).run_ids.append(run_id)
+
+    def reset(self, session_id: str):
+        with self._lock:
+            self._sessions.pop(session_id, None)
+
+    def chat(self, session_id: str, message: str) -> str:
+        """Answer one message in the context of its session"""
+        session = self.session(session_id)
+        # One turn at a time per session keeps its memory in order
+        with session.lock:
+            token = _current_session.set(session)
+            try:
+                intent = classify(message, session.pending_fields)
+                session.expire_pending(intent is not None and intent.name == "validation")
+                if intent is not None:
+                    answer = answer_intent(intent, session.pending_fields, validate_user_data, greet,
+                                           session_runs=list(session.run_ids))
+                    self._count(intent.name)
+                    session.history.append(("User", message))
+                    session.history.append(("Assistant", answer))
+                    return answer
+
+                question = message
+                if session.history:
+                    question = f"Conversation so far:\n{session.transcript()}\n\nNew message: {message}"
+                try:
+                    answer = self.get_agent().invoke({"input": question})["output"]
+                except LLMGatewayBusy:
+                    return "The assistant is busy right now, please try again in a moment."
+                self._count("agent")
+                session.history.append(("User", message))
+                session.history.append(("Assistant", answer))
+                return answer
+            finally:
+                _current_session.reset(token)
+
+
+    def _count(self, route: str):
+        with self._lock:
+            self._routes[route] += 1
+
+    def stats(self) -> dict:
+        """Messages answered per route; "agent" turns are the ones that used the LLM"""
+        with self._lock:
+            total = sum(self._routes.values())
+            return {
+                "messages": total,
+                "routes": dict(self._routes),
+                "llm_free_rate": round(1 - self._routes["agent"] / total, 4) if total else 0.0
+            }
+
+
+# Process-wide chat sessions
+chat_sessions = ChatSessionManager()
+
 
 def get_chat_agent():
-    callback = LoggingCallbackHandler()
-    llm = get_local_llm()
-    
-    tools = [
-        Tool(
-            name="Greet",
-            func=greet,
-            description="Greets the user when they type their name"
-        ),
-        # NEW VALIDATION TOOL
-        Tool(
-            name="ValidateUserData",
-            func=validate_user_data,
-            description=(
-                "Validates user information against official systems. "
-                "Requires Emirates ID, name, address, and number of dependents. "
-                "Use when user asks about data verification or application status."
-            )
-        )
-    ]
-
-    agent = initialize_agent(
-        tools=tools,
-        llm=llm,
-        agent=AgentType.ZERO_SHOT_REACT_DESCRIPTION,
-        verbose=True,
-        callbacks=[callback]
-    )
-    return agent
\ No newline at end of file
+    """Shared chat agent, built on first use"""
+    return chat_sessions.get_agent()
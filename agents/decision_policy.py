@@ -0,0 +1,158 @@
+import os
+import threading
+from dataclasses import dataclass
+from typing import Dict, Optional
+from utils.logger import get_logger
+
+logger = get_logger("decision_policy")
+
+# auto: template clear-cut outcomes; llm: always call the LLM; template: never call it
+DECISION_POLICY = os.environ.get("DECISION_POLICY", "auto")
+# Eligibility probabilities at or beyond these bounds are treated as settled
+DECISION_LOW_CONFIDENCE = float(os.environ.get("DECISION_LOW_CONFIDENCE", "0.1"))
+DECISION_HIGH_CONFIDENCE = float(os.environ.get("DECISION_HIGH_CONFIDENCE", "0.9"))
+# Policy rule quoted to applicants; a model that disagrees with it needs an explanation
+POLICY_MAX_INCOME = 5000
+POLICY_MIN_DEPENDENTS = 2
+DECISION_CHECK_POLICY_RULE = os.environ.get("DECISION_CHECK_POLICY_RULE", "true").lower() == "true"
+TOP_FACTORS = 3
+
+FEATURE_LABELS = {
+    "income": "monthly income",
+    "loans": "outstanding loans",
+    "dependents": "number of dependents",
+    "employment_status": "employment status",
+    "existing_benefits": "existing benefits"
+}
+
+VALIDATION_LABELS = {
+    "bank_validation": "bank",
+    "credit_validation": "credit",
+    "govt_validation": "government records"
+}
+
+
+@dataclass
+class Decision:
+    use_llm: bool
+    reason: str  # borderline, rule_conflict, ml_unavailable, clear_cut, validation_failed, forced, reused
+    response: Optional[str] = None  # templated response when the LLM is skipped
+
+
+class DecisionStats:
+    """Thread-safe counts of decisions by reason, for sizing Ollama capacity"""
+
+    def __init__(self):
+        self._counts: Dict[str, int] = {}
+        self._llm_calls = 0
+        self._lock = threading.Lock()
+
+    def record(self, decision: Decision):
+        with self._lock:
+            key = f"{'llm' if decision.use_llm else 'template'}:{decision.reason}"
+            self._counts[key] = self._counts.get(key, 0) + 1
+            self._llm_calls += decision.use_llm
+
+    def snapshot(self) -> dict:
+        """Totals, LLM skip rate and per-reason counts"""
+        with self._lock:
+            total = sum(self._counts.values())
+            return {
+                "decisions": total,
+                "llm_calls": self._llm_calls,
+                "skip_rate": round((total - self._llm_calls) / total, 4) if total else 0.0,
+                "by_reason": dict(self._counts)
+            }
+
+
+def _factor_sentences(shap_values: Dict[str, float]) -> str:
+    strongest = sorted((shap_values or {}).items(), key=lambda kv: abs(kv[1]), reverse=True)[:TOP_FACTORS]
+    sentences = []
+    for feature, value in strongest:
+        direction = "supported" if value > 0 else "weighed against"
+        sentences.append(f"- Your {FEATURE_LABELS.get(feature, feature)} {direction} eligibility")
+    return "\n".join(sentences)
+
+
+def render_clear_cut(name: str, income: float, loans: float, dependents: int, ml_validation: dict) -> str:
+    """Templated decision for an outcome the model is confident about"""
+    eligible = bool(ml_validation.get("eligible"))
+    confidence = ml_validation.get("confidence") or 0.0
+    verdict = ("eligible for financial assistance" if eligible
+               else "not eligible for financial assistance at this time")
+    lines = [
+        f"Dear {name or 'Applicant'},",
+        "",
+        f"Based on a verified monthly income of AED {income:,.2f}, total loans of AED {loans:,.2f} "
+        f"and {dependents} dependent(s), your application has been assessed as **{verdict}** "
+        f"(eligibility score {confidence * 100:.0f}%).",
+    ]
+    factors = _factor_sentences(ml_validation.get("shap_values"))
+    if factors:
+        lines += ["", "The main factors in this assessment were:", factors]
+    lines += ["", "Eligibility criteria: monthly income below AED 5,000 and at least 2 dependents."]
+    if not eligible:
+        lines.append("If your circumstances change, you are welcome to submit a new application.")
+    return "\n".join(lines)
+
+
+def render_validation_failed(name: str, validation_results: dict) -> str:
+    """Templated response when third-party validation did not pass"""
+    failed = [
+        f"- {VALIDATION_LABELS.get(key, key)}: {result.get('message', 'validation failed')}"
+        for key, result in (validation_results or {}).items()
+        if isinstance(result, dict) and not result.get("valid", False)
+    ]
+    return "\n".join([
+        f"Dear {name or 'Applicant'},",
+        "",
+        "We could not verify your details with the following services, so your application "
+        "cannot be approved at this time:",
+        *(failed or ["- third-party validation did not complete"]),
+        "",
+        "Please check that your information matches your official records and submit again."
+    ])
+
+
+def decide(name: str, income: float, loans: float, dependents: int,
+           ml_validation: dict, validation_results: Optional[dict], policy: str = None) -> Decision:
+    """
+    Choose between a templated response and an LLM explanation
+
+    The LLM is only needed when the model is unsure, unavailable, or
+    disagrees with the published eligibility rule; settled outcomes and
+    failed third-party validation are rendered from templates.
+    """
+    policy = policy or DECISION_POLICY
+    if policy == "llm":
+        return Decision(True, "forced")
+
+    if validation_results is not None and not validation_results.get("all_valid", False):
+        return Decision(False, "validation_failed", render_validation_failed(name, validation_results))
+
+    if not ml_validation or ml_validation.get("status") != "success":
+        reason = "ml_unavailable"
+    else:
+        confidence = ml_validation.get("confidence") or 0.0
+        rule_eligible = income < POLICY_MAX_INCOME and dependents >= POLICY_MIN_DEPENDENTS
+        if DECISION_LOW_CONFIDENCE < confidence < DECISION_HIGH_CONFIDENCE:
+            reason = "borderline"
+        elif DECISION_CHECK_POLICY_RULE and rule_eligible != bool(ml_validation.get("eligible")):
+            reason = "rule_conflict"
+        else:
+            return Decision(False, "clear_cut", render_clear_cut(name, income, loans, dependents, ml_validation))
+
+    if policy == "template" and reason != "ml_unavailable":
+        return Decision(False, "forced", render_clear_cut(name, income, loans, dependents, ml_validation))
+    return Decision(True, reason)
+
+
+def record_decision(decision: Decision):
+    decision_stats.record(decision)
+    stats = decision_stats.snapshot()
+    logger.info(f"Decision via {'LLM' if decision.use_llm else 'template'} ({decision.reason}); "
+                f"LLM skip rate {stats['skip_rate']:.1%} over {stats['decisions']} decisions")
+
+
+# Process-wide counters
+decision_stats = DecisionStats()
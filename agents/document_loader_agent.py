@@ -1,8 +1,12 @@
 import pandas as pd
 import re
 from llama_index.core.readers import SimpleDirectoryReader
+from db import ledger
+from utils.blob_store import read_bytes
 from utils.logger import get_logger
+from utils.statement_reader import read_statement
 import os
+import tempfile
 
 logger = get_logger("document_loader_agent")
 
@@ -42,19 +46,28 @@ def parse_emirates_id_details(text: str) -> dict:
     logger.info(f"Extracted Emirates ID details: {extracted_data}")
     return extracted_data
 
-def load_documents_and_extract_fields(emirates_id_file, emirates_id, bank_statement_file):
+def load_documents_and_extract_fields(emirates_id_file, emirates_id, bank_statement_files=()):
+    """
+    Extract identity fields from the Emirates ID and income/loans from bank statements
+
+    Each statement (one or more months, any account) is added to the
+    applicant's ledger, which skips transactions it already holds; income
+    and loans are the monthly means over the ledger's recent months.
+    """
     # --- PDF Parsing Logic ---
+    bank_statement_files = [f for f in bank_statement_files or () if f is not None]
     logger.info(f"Processing Emirates ID file: {'Provided' if emirates_id_file else 'Not provided'}")
-    logger.info(f"Processing Bank Statement file: {'Provided' if bank_statement_file else 'Not provided'}")
+    logger.info(f"Processing Bank Statement files: {len(bank_statement_files)}")
     
     def parse_pdf(file):
         logger.info("Parsing PDF file using LlamaIndex.")
+        temp_path = None
         try:
-            # Create temp directory if not exists
+            # Create temp directory if not exists; one file per call so concurrent runs don't collide
             os.makedirs("temp_uploads", exist_ok=True)
-            temp_path = "temp_uploads/temp_uploaded.pdf"
+            fd, temp_path = tempfile.mkstemp(dir="temp_uploads", suffix=".pdf")
             
-            with open(temp_path, "wb") as f:
+            with os.fdopen(fd, "wb") as f:
                 f.write(file.read())
                 
             docs = SimpleDirectoryReader(input_files=[temp_path]).load_data()
@@ -73,19 +86,19 @@ def load_documents_and_extract_fields(emirates_id_file, emirates_id, bank_statem
             }
         finally:
             # Clean up temp file
-            if os.path.exists(temp_path):
+            if temp_path and os.path.exists(temp_path):
                 os.remove(temp_path)
 
-    # --- Excel Parsing Logic ---
-    def parse_excel(file):
-        logger.info("Parsing Excel file, skipping metadata rows.")
+    # --- Bank Statement Parsing Logic (Excel, CSV or Parquet) ---
+    def parse_statement(file):
+        logger.info("Parsing bank statement file.")
         try:
-            df = pd.read_excel(file, skiprows=6)  # Skip first 6 rows
-            logger.info(f"Excel parsing successful. Shape: {df.shape}")
+            df = read_statement(read_bytes(file))
+            logger.info(f"Bank statement parsing successful. Shape: {df.shape}")
             logger.info(f"Parsed DataFrame head:\n{df.head().to_string(index=False)}")
             return df
         except Exception as e:
-            logger.error(f"Error parsing Excel: {e}")
+            logger.error(f"Error parsing bank statement: {e}")
             return None
 
     def extract_bank_fields(bank_df):
@@ -134,11 +147,22 @@ def load_documents_and_extract_fields(emirates_id_file, emirates_id, bank_statem
         "phone": ""
     }
     
-    # Parse Bank Statement
-    bank_df = parse_excel(bank_statement_file) if bank_statement_file else None
+    # Parse Bank Statements into the applicant's ledger
+    bank_dfs = [df for df in (parse_statement(f) for f in bank_statement_files) if df is not None]
     extracted_income, extracted_loans = 0.0, 0.0
-    if bank_df is not None:
-        extracted_income, extracted_loans = extract_bank_fields(bank_df)
+    owner = ledger.applicant_key(id_details["emirates_id"]) or ledger.applicant_key(emirates_id)
+    if bank_dfs and not owner:
+        # Without an ID every such applicant would share one ledger
+        logger.warning("No Emirates ID to key the ledger on, using uploaded statements only")
+        extracted_income, extracted_loans = extract_bank_fields(pd.concat(bank_dfs, ignore_index=True))
+    elif bank_dfs:
+        try:
+            update = ledger.ingest_statements(owner, bank_dfs)
+            extracted_income, extracted_loans = ledger.income_and_loans(owner, pending=update.pending)
+        except Exception as e:
+            # The statements alone still give the figures when the ledger is unavailable
+            logger.error(f"Ledger update failed, using uploaded statements only: {e}")
+            extracted_income, extracted_loans = extract_bank_fields(pd.concat(bank_dfs, ignore_index=True))
     
     # Log extraction results
     logger.info(f"Document extraction completed - "
@@ -154,7 +178,6 @@ def load_documents_and_extract_fields(emirates_id_file, emirates_id, bank_statem
         "extracted_name": id_details["name"],
         "extracted_address": id_details["address"],
         "extracted_phone": id_details["phone"],
-        "bank_df": bank_df,
         "extracted_income": extracted_income,
         "extracted_loans": extracted_loans
     }
\ No newline at end of file
@@ -0,0 +1,158 @@
+import re
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Optional, Sequence
+from utils.logger import get_logger
+
+logger = get_logger("intent_router")
+
+VALIDATION_FIELDS = ("emirates_id", "name", "address", "dependents")
+FIELD_LABELS = {
+    "emirates_id": "Emirates ID",
+    "name": "full name",
+    "address": "address",
+    "dependents": "number of dependents"
+}
+MAX_GREETING_WORDS = 8
+
+_GREETING = re.compile(r"^\s*(hi|hello|hey|salam|salaam|marhaba|good\s+(?:morning|afternoon|evening))\b", re.IGNORECASE)
+_GREETING_NAME = re.compile(r"\b(?:my name is|i am|i'm|this is)\s+([a-z][a-z.' -]{0,40}?)\s*(?:[,.!?]|$)", re.IGNORECASE)
+_VALIDATION = re.compile(r"\b(validate|validation|verify|verification|check my (?:data|details|information))\b", re.IGNORECASE)
+_STATUS = re.compile(r"\b(status|progress|track|tracking)\b", re.IGNORECASE)
+_RUN_ID = re.compile(r"\b[0-9a-f]{32}\b", re.IGNORECASE)
+_EMIRATES_ID = re.compile(r"\b784[-\s]?\d{4}[-\s]?\d{7}[-\s]?\d\b")
+_DEPENDENTS_BEFORE = re.compile(r"\b(\d{1,2})\s+(?:dependents?|children|child|kids?)\b", re.IGNORECASE)
+_FIELD_MARKERS = re.compile(
+    r"(?P<emirates_id>\bemirates\s*id(?:\s*(?:number|no\.?))?\s*(?:is|:|=)?)"
+    r"|(?P<name>\b(?:my\s+)?(?:full\s+)?name\s*(?:is|:|=)?)"
+    r"|(?P<address>\baddress\s*(?:is|:|=)?|\bi\s+live\s+(?:in|at))"
+    r"|(?P<dependents>\b(?:dependents|children|kids)\s*(?:is|are|:|=)?)",
+    re.IGNORECASE
+)
+_TRAILING = re.compile(r"(?:[\s,;.!?]|\band\b|\bwith\b|\bi have\b)+$", re.IGNORECASE)
+_LEADING = re.compile(r"^[\s,;:.=-]+")
+
+
+@dataclass
+class Intent:
+    name: str  # greeting, status, validation
+    fields: Dict[str, str] = field(default_factory=dict)
+
+
+def _clean(value: str) -> str:
+    return _TRAILING.sub("", _LEADING.sub("", value)).strip()
+
+
+def extract_fields(message: str) -> Dict[str, str]:
+    """Emirates ID, name, address and dependents mentioned in a message"""
+    fields: Dict[str, str] = {}
+    text = message
+
+    dependents = _DEPENDENTS_BEFORE.search(text)
+    if dependents:
+        fields["dependents"] = dependents.group(1)
+        text = text[:dependents.start()] + " ; " + text[dependents.end():]
+
+    # Each value runs from its marker to the next marker
+    markers = [(m.lastgroup, m.start(), m.end()) for m in _FIELD_MARKERS.finditer(text)]
+    for i, (kind, _, end) in enumerate(markers):
+        stop = markers[i + 1][1] if i + 1 < len(markers) else len(text)
+        value = _clean(text[end:stop])
+        if not value or kind in fields:
+            continue
+        if kind == "emirates_id":
+            digits = re.match(r"[\d\s-]*\d", value)
+            if digits:
+                fields[kind] = digits.group().strip()
+        elif kind == "dependents":
+            number = re.match(r"\d{1,2}", value)
+            if number:
+                fields[kind] = number.group()
+        else:
+            fields[kind] = value
+
+    if "emirates_id" not in fields:
+        emirates_id = _EMIRATES_ID.search(message)
+        if emirates_id:
+            fields["emirates_id"] = emirates_id.group()
+    return fields
+
+
+def classify(message: str, pending_fields: Optional[Dict[str, str]] = None) -> Optional[Intent]:
+    """
+    Rule-based intent of a chat message, None for open-ended questions
+
+    pending_fields are validation details collected in earlier turns; a
+    message adding to them continues the validation request.
+    """
+    if _VALIDATION.search(message):
+        return Intent("validation", extract_fields(message))
+
+    if _STATUS.search(message):
+        run_id = _RUN_ID.search(message)
+        return Intent("status", {"run_id": run_id.group().lower()} if run_id else {})
+
+    if pending_fields:
+        fields = extract_fields(message)
+        if fields:
+            return Intent("validation", fields)
+
+    if _GREETING.match(message) and len(message.split()) <= MAX_GREETING_WORDS:
+        name = _GREETING_NAME.search(message)
+        return Intent("greeting", {"name": name.group(1).strip() if name else ""})
+    return None
+
+
+def _format_validation(result: dict) -> str:
+    lines = [f"Validation status: {'PASSED ✅' if result.get('all_valid') else 'FAILED ❌'}"]
+    for key in ("bank_validation", "credit_validation", "govt_validation"):
+        check = result.get(key)
+        if check:
+            lines.append(f"{'✅' if check.get('valid') else '❌'} {key.replace('_', ' ').title()}: {check.get('message')}")
+    return "\n".join(lines)
+
+
+def _status_answer(fields: Dict[str, str], session_runs: Sequence[str]) -> str:
+    """
+    Status of a run submitted from this chat session
+
+    Runs of other sessions are not confirmed or denied, and there is no
+    lookup by Emirates ID, so the chat cannot be used to find applicants.
+    """
+    from utils.status_tracker import StatusTracker
+
+    run_id = fields.get("run_id") or (session_runs[-1] if session_runs else None)
+    if run_id is None:
+        return "I can only look up applications submitted in this chat session, and there are none yet."
+    if run_id not in session_runs:
+        return "I can only look up applications submitted in this chat session. Please check the run id."
+    status = StatusTracker.get_status(run_id)
+    if status:
+        return f"Application run {run_id[:8]}…: {status}"
+    return f"Application run {run_id[:8]}… has no status yet. It may have expired."
+
+
+def answer(intent: Intent, pending_fields: Dict[str, str], validate: Callable[..., dict],
+           greet: Callable[[str], str], session_runs: Sequence[str] = ()) -> str:
+    """
+    Handle a routed intent by calling the tools directly
+
+    pending_fields is updated in place with the validation details known
+    so far and cleared once the validation runs. session_runs are the run
+    ids submitted from the chat session, the only ones whose status is told.
+    """
+    if intent.name == "greeting":
+        return greet(intent.fields.get("name", ""))
+
+    if intent.name == "status":
+        return _status_answer(intent.fields, session_runs)
+
+    pending_fields.update(intent.fields)
+    missing: List[str] = [f for f in VALIDATION_FIELDS if not pending_fields.get(f)]
+    if missing:
+        labels = [FIELD_LABELS[f] for f in missing]
+        needed = labels[0] if len(labels) == 1 else ", ".join(labels[:-1]) + " and " + labels[-1]
+        return f"To validate your details I also need your {needed}."
+    details = dict(pending_fields)
+    pending_fields.clear()
+    result = validate(details["emirates_id"], details["name"], details["address"], int(details["dependents"]))
+    return _format_validation(result)
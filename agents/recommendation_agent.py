@@ -1,14 +1,21 @@
 import os
 from typing import Dict, Optional
 from utils.logger import get_logger
-from utils.resume_parser import parse_resume  # We'll create this next
+from utils.resume_parser import parse_resume
 from llm_utils.ollama_wrapper import get_local_llm
+from llm_utils.llm_gateway import Priority
+from llm_utils.prompt_budget import PromptSection, compact_list, fit_sections
 from langsmith import traceable
 logger = get_logger("recommendation_agent")
 
+# Per-call token budgets; resume sections are summarized to fit
+RECOMMENDATION_PROMPT_TOKENS = int(os.environ.get("RECOMMENDATION_PROMPT_TOKENS", "600"))
+RECOMMENDATION_COMPLETION_TOKENS = int(os.environ.get("RECOMMENDATION_COMPLETION_TOKENS", "500"))
+RESUME_ITEMS_PER_SECTION = 8
+
 class RecommendationAgent:
     def __init__(self):
-        self.llm = get_local_llm()
+        self.llm = get_local_llm(RECOMMENDATION_COMPLETION_TOKENS, Priority.RECOMMENDATION)
         
     def generate_recommendations(self, 
                                financial_approved: bool,
@@ -19,7 +26,7 @@ class RecommendationAgent:
         
         Args:
             financial_approved: Whether financial assistance was approved
-            resume_text: Extracted text from resume
+            resume_text: Resume PDF as path, bytes or uploaded file object
             financial_data: Dictionary containing financial information
             
         Returns:
@@ -32,12 +39,14 @@ class RecommendationAgent:
             return {"recommendations": [], "status": "no_resume_provided"}
             
         try:
-            # Parse resume and extract skills/experience
+            # Parse resume and extract skills/experience (cached by content hash)
             resume_summary = parse_resume(resume_text)
+            if resume_summary.get("error"):
+                return {"recommendations": [], "status": "resume_parse_failed"}
             
             # Generate recommendations using LLM
             prompt = self._build_prompt(resume_summary, financial_data)
-            recommendations = self.llm.generate(prompt)
+            recommendations = self.llm.invoke(prompt, config={"metadata": {"prompt_name": "recommendations"}})
             
             return {
                 "recommendations": recommendations,
@@ -49,26 +58,34 @@ class RecommendationAgent:
             return {"recommendations": [], "status": "error"}
 
     def _build_prompt(self, resume_summary: Dict, financial_data: Dict) -> str:
-        """Build LLM prompt for generating recommendations"""
-        return f"""
-        You are a career advisor for UAE government social support recipients.
-        Based on the following applicant profile, suggest specific job opportunities
-        or educational programs that would help improve their financial situation.
-
-        Applicant Profile:
-        - Skills: {resume_summary.get('skills', [])}
-        - Experience: {resume_summary.get('experience', [])}
-        - Education: {resume_summary.get('education', [])}
-        - Current Financial Situation:
-          * Monthly Income: AED {financial_data.get('income', 0):,.2f}
-          * Dependents: {financial_data.get('dependents', 0)}
-          * Loan Amount: AED {financial_data.get('loans', 0):,.2f}
-
-        Provide 3-5 concrete recommendations including:
-        - Specific job titles to apply for
-        - Training programs that would increase employability
-        - Educational opportunities
-        - Government support programs they may qualify for
-
-        Format your response as a bulleted list with brief explanations for each recommendation.
-        """
\ No newline at end of file
+        """Build LLM prompt for generating recommendations within the token budget"""
+        financial_data = financial_data or {}
+        profile = [
+            PromptSection(f"- {label}: {compact_list(resume_summary.get(key), RESUME_ITEMS_PER_SECTION)}", shrinkable=True)
+            for label, key in (("Skills", "skills"), ("Experience", "experience"), ("Education", "education"))
+        ]
+        prompt, tokens = fit_sections([
+            PromptSection(
+                "You are a career advisor for UAE government social support recipients.\n"
+                "Based on the following applicant profile, suggest specific job opportunities\n"
+                "or educational programs that would help improve their financial situation.\n\n"
+                "Applicant Profile:"
+            ),
+            *profile,
+            PromptSection(
+                "- Current Financial Situation:\n"
+                f"  * Monthly Income: AED {financial_data.get('income', 0):,.2f}\n"
+                f"  * Dependents: {financial_data.get('dependents', 0)}\n"
+                f"  * Loan Amount: AED {financial_data.get('loans', 0):,.2f}\n"
+            ),
+            PromptSection(
+                "Provide 3-5 concrete recommendations including:\n"
+                "- Specific job titles to apply for\n"
+                "- Training programs that would increase employability\n"
+                "- Educational opportunities\n"
+                "- Government support programs they may qualify for\n\n"
+                "Format your response as a bulleted list with brief explanations for each recommendation."
+            )
+        ], RECOMMENDATION_PROMPT_TOKENS, name="recommendations")
+        logger.info(f"Recommendation prompt: {tokens} tokens")
+        return prompt
@@ -0,0 +1,110 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional
+from utils.logger import get_logger
+from utils.resume_parser import read_pdf_bytes
+
+logger = get_logger("recommendation_queue")
+
+# Recommendation LLM calls allowed at once, and jobs allowed to wait
+RECOMMENDATION_CONCURRENCY = int(os.environ.get("RECOMMENDATION_CONCURRENCY", "1"))
+RECOMMENDATION_MAX_PENDING = int(os.environ.get("RECOMMENDATION_MAX_PENDING", "100"))
+RECOMMENDATION_MAX_RESULTS = int(os.environ.get("RECOMMENDATION_MAX_RESULTS", "1000"))
+
+
+class RecommendationQueue:
+    """
+    Background queue generating career recommendations after the decision
+
+    Jobs run on a dedicated pool whose size is the concurrency limit. Results
+    are stored against the application id and can be fetched with get() or
+    pushed to callbacks registered with on_ready().
+    """
+
+    def __init__(self, concurrency: int = RECOMMENDATION_CONCURRENCY,
+                 max_pending: int = RECOMMENDATION_MAX_PENDING,
+                 max_results: int = RECOMMENDATION_MAX_RESULTS):
+        self._executor = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="recommendations")
+        self._max_pending = max_pending
+        self._max_results = max_results
+        self._results: "OrderedDict[str, Dict]" = OrderedDict()
+        self._pending = 0
+        self._lock = threading.Lock()
+        self._listeners: List[Callable[[str, Dict], None]] = []
+        self._agent = None
+        self._agent_lock = threading.Lock()
+
+    def _get_agent(self):
+        # One agent (and LLM client) shared by all jobs
+        if self._agent is None:
+            with self._agent_lock:
+                if self._agent is None:
+                    from agents.recommendation_agent import RecommendationAgent
+                    self._agent = RecommendationAgent()
+        return self._agent
+
+    def _store(self, application_id: str, result: Dict):
+        with self._lock:
+            self._results[application_id] = result
+            self._results.move_to_end(application_id)
+            while len(self._results) > self._max_results:
+                self._results.popitem(last=False)
+
+    def enqueue(self, application_id: str, resume_file, financial_data: Dict) -> Dict:
+        """Queue recommendation generation and return the pending record"""
+        # Read the upload now; the file object may be closed once the run ends
+        resume_bytes = read_pdf_bytes(resume_file)
+        with self._lock:
+            if self._pending >= self._max_pending:
+                logger.warning(f"Recommendation queue full, dropping {application_id}")
+                return {"recommendations": [], "status": "queue_full", "application_id": application_id}
+            self._pending += 1
+
+        pending = {"recommendations": [], "status": "pending",
+                   "application_id": application_id, "queued_at": time.time()}
+        self._store(application_id, pending)
+        self._executor.submit(self._run, application_id, resume_bytes, financial_data)
+        logger.info(f"Queued recommendations for {application_id}")
+        return pending
+
+    def _run(self, application_id: str, resume_bytes: bytes, financial_data: Dict):
+        try:
+            result = self._get_agent().generate_recommendations(
+                financial_approved=True,
+                resume_text=resume_bytes,
+                financial_data=financial_data
+            )
+        except Exception as e:
+            logger.error(f"Recommendation job failed for {application_id}: {str(e)}")
+            result = {"recommendations": [], "status": "error"}
+        finally:
+            with self._lock:
+                self._pending -= 1
+
+        result = {**result, "application_id": application_id, "completed_at": time.time()}
+        self._store(application_id, result)
+        for listener in list(self._listeners):
+            try:
+                listener(application_id, result)
+            except Exception as e:
+                logger.error(f"Recommendation listener failed: {str(e)}")
+
+    def get(self, application_id: str) -> Optional[Dict]:
+        """Latest recommendation record for an application, None if unknown"""
+        with self._lock:
+            return self._results.get(application_id)
+
+    def on_ready(self, callback: Callable[[str, Dict], None]):
+        """Register a callback receiving (application_id, result) when a job finishes"""
+        self._listeners.append(callback)
+
+    def pending_count(self) -> int:
+        with self._lock:
+            return self._pending
+
+
+# Process-wide queue
+recommendation_queue = RecommendationQueue()
@@ -1,23 +1,37 @@
+import numpy as np
+import pandas as pd
 from utils.logger import get_logger
+from utils import fuzzy_match
 from typing import List
 # from langsmith import traceable
 
 logger = get_logger("reconciliation_agent")
 
+# Tolerances shared by the single-application and columnar reconciliation
+AMOUNT_TOLERANCE = 500
+ADDRESS_SIMILARITY_THRESHOLD = 0.7
+# Names that differ after normalization still match above this fuzzy score
+NAME_SIMILARITY_THRESHOLD = 0.9
+
+# Rows per block when computing batch similarities
+SIMILARITY_CHUNK_ROWS = 100_000
+
+# Columnar input column -> mismatch label used by reconcile_fields
+RECONCILED_FIELDS = {
+    "name": "Name",
+    "phone": "Phone Number",
+    "address": "Address",
+    "income": "Income",
+    "loans": "Loan Amount"
+}
+
 def normalize_text(text: str) -> str:
     """Normalize text for comparison"""
     return text.strip().lower().replace(" ", "").replace("-", "").replace("+", "")
 
 def normalize_address(addr: str) -> str:
     """Normalize address for comparison"""
-    if not addr:
-        return ""
-    import re
-    # Remove all punctuation
-    addr = re.sub(r'[^\w\s]', '', addr)
-    # Replace all whitespace with single space
-    addr = re.sub(r'\s+', ' ', addr)
-    return addr.strip().lower()
+    return fuzzy_match.normalize(addr)
 
 # @traceable(name="Reconciliation Agent", run_type="tool")
 def reconcile_fields(
@@ -51,10 +65,12 @@ def reconcile_fields(
         }
     }
     
-    # Name reconciliation
+    # Name reconciliation (exact after normalization, else fuzzy for reordering/typos)
     if name_ext and normalize_text(name_sub) != normalize_text(name_ext):
-        logger.warning(f"Name mismatch: '{name_sub}' vs '{name_ext}'")
-        mismatches.append("Name")
+        name_similarity = fuzzy_match.similarity(fuzzy_match.normalize(name_sub), fuzzy_match.normalize(name_ext))
+        if name_similarity < NAME_SIMILARITY_THRESHOLD:
+            logger.warning(f"Name mismatch: '{name_sub}' vs '{name_ext}' (similarity: {name_similarity:.2f})")
+            mismatches.append("Name")
     
     # Phone reconciliation
     if phone_ext:
@@ -72,23 +88,20 @@ def reconcile_fields(
         norm_addr_sub = normalize_address(address_sub)
         norm_addr_ext = normalize_address(address_ext)
         
-        # Calculate similarity score
-        similarity = 0
-        if norm_addr_sub and norm_addr_ext:
-            common_chars = set(norm_addr_sub) & set(norm_addr_ext)
-            similarity = len(common_chars) / max(len(norm_addr_sub), len(norm_addr_ext))
+        # Trigram/token similarity score
+        similarity = fuzzy_match.similarity(norm_addr_sub, norm_addr_ext)
         
-        if similarity < 0.7:  # 70% similarity threshold
+        if similarity < ADDRESS_SIMILARITY_THRESHOLD:
             logger.warning(f"Address mismatch: '{address_sub}' vs '{address_ext}' (similarity: {similarity:.2f})")
             mismatches.append("Address")
     
     # Income reconciliation
-    if abs(float(income_sub) - float(income_ext)) > 500:
+    if abs(float(income_sub) - float(income_ext)) > AMOUNT_TOLERANCE:
         logger.warning(f"Income mismatch: {income_sub} vs {income_ext}")
         mismatches.append("Income")
     
     # Loan reconciliation
-    if abs(float(loans_sub) - float(loans_ext)) > 500:
+    if abs(float(loans_sub) - float(loans_ext)) > AMOUNT_TOLERANCE:
         logger.warning(f"Loan amount mismatch: {loans_sub} vs {loans_ext}")
         mismatches.append("Loan Amount")
     
@@ -99,4 +112,90 @@ def reconcile_fields(
     }
     
     logger.info(f"Found {len(mismatches)} mismatches: {mismatches}")
-    return mismatches
\ No newline at end of file
+    return mismatches
+
+
+def _text_column(df: pd.DataFrame, column: str) -> pd.Series:
+    return df[column].fillna("").astype(str)
+
+
+def normalize_text_series(values: pd.Series) -> pd.Series:
+    """Vectorized normalize_text"""
+    return values.str.strip().str.lower().str.replace(r"[ \-+]", "", regex=True)
+
+
+def normalize_address_series(values: pd.Series) -> pd.Series:
+    """
+    Per-element normalize_address (also used for fuzzy name comparison)
+
+    Mapped through Python's re rather than the .str accessor: on
+    pyarrow-backed strings \\w is ASCII-only and would erase Arabic text.
+    """
+    return values.map(fuzzy_match.normalize)
+
+
+def batch_similarity(sub: pd.Series, ext: pd.Series) -> np.ndarray:
+    """Row-wise fuzzy_match.similarity computed in blocks of SIMILARITY_CHUNK_ROWS"""
+    # Identical non-empty pairs score 1.0 without building trigrams
+    identical = ((sub == ext) & (sub != "")).to_numpy()
+    similarity = identical.astype(float)
+    pending = np.flatnonzero(~identical)
+    for start in range(0, pending.size, SIMILARITY_CHUNK_ROWS):
+        rows = pending[start:start + SIMILARITY_CHUNK_ROWS]
+        similarity[rows] = fuzzy_match.batch_similarity(sub.iloc[rows], ext.iloc[rows])
+    return similarity
+
+
+def reconcile_frame(submitted: pd.DataFrame, extracted: pd.DataFrame) -> pd.DataFrame:
+    """
+    Reconcile many applications at once
+
+    Args:
+        submitted: Form values with any of the columns name, phone, address, income, loans
+        extracted: Document values with the same columns, aligned on the index
+
+    Returns:
+        Boolean mismatch matrix, one row per application and one column per
+        reconcile_fields label; fields missing from either frame are never flagged
+    """
+    extracted = extracted.reindex(submitted.index)
+    mismatches = pd.DataFrame(False, index=submitted.index, columns=list(RECONCILED_FIELDS.values()))
+
+    def available(column):
+        return column in submitted.columns and column in extracted.columns
+
+    if available("name"):
+        name_sub = _text_column(submitted, "name")
+        name_ext = _text_column(extracted, "name")
+        differs = ((name_ext != "") & (normalize_text_series(name_sub) != normalize_text_series(name_ext))).to_numpy()
+        similarity = np.ones(len(differs), dtype=float)
+        if differs.any():
+            similarity[differs] = batch_similarity(
+                normalize_address_series(name_sub[differs]), normalize_address_series(name_ext[differs])
+            )
+        mismatches["Name"] = differs & (similarity < NAME_SIMILARITY_THRESHOLD)
+
+    if available("phone"):
+        phone_ext = _text_column(extracted, "phone")
+        sub = normalize_text_series(_text_column(submitted, "phone")).to_numpy(dtype=str)
+        ext = normalize_text_series(phone_ext).to_numpy(dtype=str)
+        contained = (np.char.find(ext, sub) >= 0) | (np.char.find(sub, ext) >= 0)
+        mismatches["Phone Number"] = (phone_ext != "").to_numpy() & ~contained
+
+    if available("address"):
+        address_ext = _text_column(extracted, "address")
+        similarity = batch_similarity(
+            normalize_address_series(_text_column(submitted, "address")),
+            normalize_address_series(address_ext)
+        )
+        mismatches["Address"] = (address_ext != "").to_numpy() & (similarity < ADDRESS_SIMILARITY_THRESHOLD)
+
+    for column in ("income", "loans"):
+        if available(column):
+            sub = pd.to_numeric(submitted[column], errors="coerce").fillna(0.0)
+            ext = pd.to_numeric(extracted[column], errors="coerce").fillna(0.0)
+            mismatches[RECONCILED_FIELDS[column]] = (sub - ext).abs() > AMOUNT_TOLERANCE
+
+    logger.info(f"Reconciled {len(mismatches)} applications, mismatches per field: "
+                f"{mismatches.sum().to_dict()}")
+    return mismatches
@@ -0,0 +1,264 @@
+import io
+import os
+import sys
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from typing import Dict, List, Optional
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from dotenv import load_dotenv
+from fastapi import FastAPI, File, Form, HTTPException, UploadFile
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel
+from agents.chatbot_agent import chat_sessions
+from agents.decision_policy import decision_stats
+from agents.recommendation_queue import recommendation_queue
+from callbacks.token_usage_callback import token_usage
+from db import aggregates
+from db.audit_log import audit_log
+from db.database import init_db
+from llm_utils.llm_gateway import llm_gateway
+from utils.blob_store import BlobStoreFull
+from utils.event_bus import progress_bus, stage_metrics
+from utils.logger import get_logger
+from workflow.memo import node_memo
+from workflow.runner import build_initial_state, public_result, run_application
+
+load_dotenv()
+logger = get_logger("api")
+
+# Workflows run at once, and submissions allowed to wait for a worker
+API_WORKERS = int(os.environ.get("API_WORKERS", "4"))
+API_MAX_PENDING = int(os.environ.get("API_MAX_PENDING", "200"))
+API_MAX_RUNS = int(os.environ.get("API_MAX_RUNS", "10000"))
+_ACTIVE = ("queued", "running")
+
+
+class RunStore:
+    """Bounded record of submitted runs and their results, oldest evicted first"""
+
+    def __init__(self, max_runs: int = API_MAX_RUNS):
+        self._runs: "OrderedDict[str, Dict]" = OrderedDict()
+        self._max_runs = max_runs
+        self._active = 0
+        self._lock = threading.Lock()
+
+    def create(self, run_id: str):
+        with self._lock:
+            self._runs[run_id] = {"run_id": run_id, "status": "queued", "submitted_at": time.time()}
+            self._active += 1
+            while len(self._runs) > self._max_runs:
+                _, evicted = self._runs.popitem(last=False)
+                if evicted["status"] in _ACTIVE:
+                    self._active -= 1
+
+    def update(self, run_id: str, **fields):
+        with self._lock:
+            run = self._runs.get(run_id)
+            if run is None:
+                return
+            if run["status"] in _ACTIVE and fields.get("status", run["status"]) not in _ACTIVE:
+                self._active -= 1
+            run.update(fields)
+
+    def get(self, run_id: str) -> Optional[Dict]:
+        with self._lock:
+            run = self._runs.get(run_id)
+            return dict(run) if run else None
+
+    def active_count(self) -> int:
+        with self._lock:
+            return self._active
+
+
+runs = RunStore()
+executor = ThreadPoolExecutor(max_workers=API_WORKERS, thread_name_prefix="api-workflow")
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    init_db()
+    logger.info(f"API started with {API_WORKERS} workflow workers")
+    yield
+    executor.shutdown(wait=False, cancel_futures=True)
+    audit_log.close()
+
+
+app = FastAPI(title="Social Support Application API", lifespan=lifespan)
+
+
+def _process(run_id: str, initial_state: Dict, profile: bool = False):
+    runs.update(run_id, status="running", started_at=time.time())
+    try:
+        final_state = run_application(initial_state, profile=profile)
+        runs.update(run_id, status="complete", finished_at=time.time(), result=public_result(final_state))
+    except Exception as e:
+        runs.update(run_id, status="error", finished_at=time.time(), error=str(e))
+
+
+async def _upload(file: Optional[UploadFile]) -> Optional[io.BytesIO]:
+    """Uploaded file as an in-memory file object, None when not provided"""
+    if file is None or not file.filename:
+        return None
+    content = await file.read()
+    return io.BytesIO(content) if content else None
+
+
+@app.post("/applications", status_code=202)
+async def submit_application(
+    emirates_id: str = Form(...),
+    name: str = Form(...),
+    phone: str = Form(...),
+    address: str = Form(...),
+    dependents: int = Form(0),
+    income: float = Form(0.0),
+    loans: float = Form(0.0),
+    emirates_id_file: Optional[UploadFile] = File(None),
+    bank_statement_files: Optional[List[UploadFile]] = File(None),
+    resume_file: Optional[UploadFile] = File(None),
+    profile: bool = Form(False),
+    session_id: Optional[str] = Form(None)
+):
+    """
+    Accept an application and process it in the background
+
+    profile=true captures a profile of the run; a chat session_id lets
+    that chat session ask for the run's status.
+    """
+    if runs.active_count() >= API_MAX_PENDING:
+        raise HTTPException(status_code=429, detail="Too many applications in progress, retry later")
+
+    run_id = uuid.uuid4().hex
+    try:
+        initial_state = build_initial_state(
+            run_id,
+            {
+                "emirates_id": emirates_id,
+                "name": name,
+                "phone": phone,
+                "address": address,
+                "dependents": dependents,
+                "income": income,
+                "loans": loans,
+                "emirates_id_file": await _upload(emirates_id_file),
+                "bank_statement_files": [await _upload(f) for f in bank_statement_files or []]
+            },
+            resume_file=await _upload(resume_file)
+        )
+    except BlobStoreFull as e:
+        raise HTTPException(status_code=429, detail=str(e))
+    runs.create(run_id)
+    if session_id:
+        chat_sessions.link_run(session_id, run_id)
+    executor.submit(_process, run_id, initial_state, profile)
+    logger.info(f"Accepted application run {run_id}")
+    return {
+        "run_id": run_id,
+        "status": "queued",
+        "status_url": f"/applications/{run_id}/status",
+        "result_url": f"/applications/{run_id}"
+    }
+
+
+def _get_run(run_id: str) -> Dict:
+    run = runs.get(run_id)
+    if run is None:
+        raise HTTPException(status_code=404, detail=f"Unknown run id: {run_id}")
+    return run
+
+
+@app.get("/applications/{run_id}/status")
+def application_status(run_id: str):
+    """Run state with the latest workflow stage and per-stage timings"""
+    run = _get_run(run_id)
+    latest = progress_bus.latest(run_id)
+    return {
+        "run_id": run_id,
+        "status": run["status"],
+        "stage": latest.stage if latest else None,
+        "label": latest.label if latest else None,
+        "stage_timings": progress_bus.stage_timings(run_id)
+    }
+
+
+@app.get("/applications/{run_id}")
+def application_result(run_id: str):
+    """Final result once complete; 202 with the current status until then"""
+    run = _get_run(run_id)
+    if run["status"] in _ACTIVE:
+        return JSONResponse(status_code=202, content={"run_id": run_id, "status": run["status"]})
+    return run
+
+
+@app.get("/applications/{run_id}/recommendations")
+def application_recommendations(run_id: str):
+    """Career recommendations generated in the background after the decision"""
+    _get_run(run_id)
+    recommendations = recommendation_queue.get(run_id)
+    if recommendations is None:
+        raise HTTPException(status_code=404, detail="No recommendations were requested for this run")
+    return recommendations
+
+
+@app.get("/stats/daily")
+def stats_daily(start: Optional[str] = None, end: Optional[str] = None):
+    """Per-day applications, approval and mismatch rates (YYYY-MM-DD bounds, inclusive)"""
+    return aggregates.daily_stats(start, end)
+
+
+@app.get("/stats/dependents")
+def stats_dependents():
+    return aggregates.income_by_dependents()
+
+
+@app.get("/stats/histogram/{metric}")
+def stats_histogram(metric: str):
+    try:
+        return aggregates.histogram(metric)
+    except ValueError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+
+
+@app.get("/stats/mismatches")
+def stats_mismatches(start: Optional[str] = None, end: Optional[str] = None):
+    return aggregates.mismatch_rates(start, end)
+
+
+class ChatMessage(BaseModel):
+    session_id: str
+    message: str
+
+
+@app.post("/chat")
+def chat(message: ChatMessage):
+    """One chatbot turn; conversation memory and tool results are kept per session"""
+    return {"session_id": message.session_id, "answer": chat_sessions.chat(message.session_id, message.message)}
+
+
+@app.get("/health")
+def health():
+    return {"status": "ok"}
+
+
+@app.get("/metrics")
+def metrics():
+    """Stage timings, LLM gateway load, decision skip rate, token usage, chat routing, audit writes and node reuse"""
+    return {
+        "runs_in_progress": runs.active_count(),
+        "stages": stage_metrics.snapshot(),
+        "llm_gateway": llm_gateway.snapshot(),
+        "decisions": decision_stats.snapshot(),
+        "token_usage": token_usage.summary(),
+        "pending_recommendations": recommendation_queue.pending_count(),
+        "chat": chat_sessions.stats(),
+        "audit_log": audit_log.stats(),
+        "workflow_memo": node_memo.stats()
+    }
+
+
+if __name__ == "__main__":
+    import uvicorn
+    uvicorn.run(app, host="0.0.0.0", port=int(os.environ.get("API_PORT", "8000")))
@@ -0,0 +1,107 @@
+import os
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass, asdict
+from typing import Dict, List, Optional
+from langchain_core.callbacks import BaseCallbackHandler
+from llm_utils.prompt_budget import count_tokens
+from utils.logger import get_logger
+
+logger = get_logger("token_usage")
+
+TOKEN_USAGE_HISTORY = int(os.environ.get("TOKEN_USAGE_HISTORY", "500"))
+
+
+@dataclass
+class TokenUsage:
+    prompt_name: str
+    prompt_tokens: int
+    completion_tokens: int
+    seconds: float
+    tokens_per_second: float
+    measured: bool  # counts reported by Ollama rather than estimated
+    timestamp: float
+
+
+class TokenUsageCallbackHandler(BaseCallbackHandler):
+    """
+    Records prompt/completion token counts and generation speed per LLM call
+
+    Ollama reports prompt_eval_count, eval_count and eval_duration in the
+    generation info; when they are missing the counts are estimated from
+    the text and the speed from the wall time of the call.
+    """
+
+    def __init__(self, history: int = TOKEN_USAGE_HISTORY):
+        self._started: Dict[str, tuple] = {}
+        self._calls = deque(maxlen=history)
+        self._lock = threading.Lock()
+
+    def on_llm_start(self, serialized, prompts, **kwargs):
+        name = (kwargs.get("metadata") or {}).get("prompt_name", "unnamed")
+        with self._lock:
+            self._started[str(kwargs.get("run_id"))] = (name, time.perf_counter(), sum(count_tokens(p) for p in prompts))
+
+    def on_llm_end(self, response, **kwargs):
+        with self._lock:
+            name, started, estimated_prompt = self._started.pop(str(kwargs.get("run_id")), ("unnamed", None, 0))
+        elapsed = time.perf_counter() - started if started else 0.0
+
+        info = {}
+        text = ""
+        for generation in response.generations:
+            for gen in generation:
+                text += gen.text
+                info = gen.generation_info or info
+
+        measured = "eval_count" in info
+        prompt_tokens = int(info.get("prompt_eval_count") or estimated_prompt)
+        completion_tokens = int(info.get("eval_count") or count_tokens(text))
+        eval_seconds = info.get("eval_duration", 0) / 1e9 or elapsed
+        usage = TokenUsage(
+            prompt_name=name,
+            prompt_tokens=prompt_tokens,
+            completion_tokens=completion_tokens,
+            seconds=round(info.get("total_duration", 0) / 1e9 or elapsed, 3),
+            tokens_per_second=round(completion_tokens / eval_seconds, 2) if eval_seconds else 0.0,
+            measured=measured,
+            timestamp=time.time()
+        )
+        with self._lock:
+            self._calls.append(usage)
+        logger.info(f"{name}: {usage.prompt_tokens} prompt + {usage.completion_tokens} completion tokens "
+                    f"in {usage.seconds}s ({usage.tokens_per_second} tok/s{'' if measured else ', estimated'})")
+
+    def on_llm_error(self, error, **kwargs):
+        with self._lock:
+            self._started.pop(str(kwargs.get("run_id")), None)
+
+    def recent(self, limit: Optional[int] = None) -> List[dict]:
+        """Most recent calls, oldest first"""
+        with self._lock:
+            calls = list(self._calls)
+        return [asdict(c) for c in (calls[-limit:] if limit else calls)]
+
+    def summary(self) -> Dict[str, dict]:
+        """Per prompt name call count, average token counts and tokens/sec"""
+        with self._lock:
+            calls = list(self._calls)
+        summary: Dict[str, dict] = {}
+        for call in calls:
+            s = summary.setdefault(call.prompt_name, {"calls": 0, "prompt_tokens": 0, "completion_tokens": 0,
+                                                      "seconds": 0.0})
+            s["calls"] += 1
+            s["prompt_tokens"] += call.prompt_tokens
+            s["completion_tokens"] += call.completion_tokens
+            s["seconds"] += call.seconds
+        for s in summary.values():
+            s["tokens_per_second"] = round(s["completion_tokens"] / s["seconds"], 2) if s["seconds"] else 0.0
+            s["avg_prompt_tokens"] = round(s.pop("prompt_tokens") / s["calls"], 1)
+            s["avg_completion_tokens"] = round(s.pop("completion_tokens") / s["calls"], 1)
+            s["seconds"] = round(s["seconds"], 3)
+        return summary
+
+
+# Process-wide recorder shared by every LLM instance
+token_usage = TokenUsageCallbackHandler()
@@ -0,0 +1,267 @@
+import argparse
+import math
+import os
+import sqlite3
+import sys
+import time
+from collections import defaultdict
+from typing import Dict, List, Optional
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from db.database import get_connection
+from utils.logger import get_logger
+
+logger = get_logger("aggregates")
+
+# Update the summary tables inside insert_application; otherwise only the delta job does
+AGGREGATES_ON_INSERT = os.environ.get("AGGREGATES_ON_INSERT", "1") == "1"
+AGGREGATES_CHUNK_ROWS = int(os.environ.get("AGGREGATES_CHUNK_ROWS", "10000"))
+# Histogram bucket widths in AED
+HISTOGRAM_BUCKETS = {
+    "income": float(os.environ.get("AGG_INCOME_BUCKET", "1000")),
+    "loans": float(os.environ.get("AGG_LOANS_BUCKET", "500"))
+}
+UNKNOWN_DAY = "unknown"  # rows stored before created_at existed
+_WATERMARK = "applications"
+
+
+def init_aggregates():
+    with get_connection() as conn:
+        conn.executescript('''
+            CREATE TABLE IF NOT EXISTS agg_daily (
+                day TEXT PRIMARY KEY,
+                applications INTEGER NOT NULL DEFAULT 0,
+                eligible INTEGER NOT NULL DEFAULT 0,
+                not_eligible INTEGER NOT NULL DEFAULT 0,
+                with_mismatch INTEGER NOT NULL DEFAULT 0,
+                income_sum REAL NOT NULL DEFAULT 0,
+                loans_sum REAL NOT NULL DEFAULT 0
+            );
+            CREATE TABLE IF NOT EXISTS agg_dependents (
+                dependents INTEGER PRIMARY KEY,
+                applications INTEGER NOT NULL DEFAULT 0,
+                eligible INTEGER NOT NULL DEFAULT 0,
+                income_sum REAL NOT NULL DEFAULT 0,
+                loans_sum REAL NOT NULL DEFAULT 0
+            );
+            CREATE TABLE IF NOT EXISTS agg_histogram (
+                metric TEXT NOT NULL,
+                bucket_low REAL NOT NULL,
+                applications INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY (metric, bucket_low)
+            );
+            CREATE TABLE IF NOT EXISTS agg_mismatch (
+                day TEXT NOT NULL,
+                field TEXT NOT NULL,
+                applications INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY (day, field)
+            );
+            CREATE TABLE IF NOT EXISTS agg_watermark (
+                name TEXT PRIMARY KEY,
+                last_id INTEGER NOT NULL
+            );
+        ''')
+        conn.commit()
+    logger.info("Aggregate tables initialized.")
+
+
+def _bucket(value: Optional[float], width: float) -> float:
+    return math.floor((value or 0.0) / width) * width
+
+
+def _summarize(rows: List[tuple]) -> Dict[str, dict]:
+    """Per-table increments of a chunk of (id, created_at, dependents, income, loans, eligible, mismatch_fields)"""
+    daily = defaultdict(lambda: [0, 0, 0, 0, 0.0, 0.0])
+    dependents = defaultdict(lambda: [0, 0, 0.0, 0.0])
+    histogram = defaultdict(int)
+    mismatch = defaultdict(int)
+    for _, created_at, deps, income, loans, eligible, mismatch_fields in rows:
+        day = created_at[:10] if created_at else UNKNOWN_DAY
+        income, loans = income or 0.0, loans or 0.0
+        fields = [f for f in (mismatch_fields or "").split(",") if f]
+        d = daily[day]
+        d[0] += 1
+        d[1] += eligible == 1
+        d[2] += eligible == 0
+        d[3] += bool(fields)
+        d[4] += income
+        d[5] += loans
+        g = dependents[deps or 0]
+        g[0] += 1
+        g[1] += eligible == 1
+        g[2] += income
+        g[3] += loans
+        histogram[("income", _bucket(income, HISTOGRAM_BUCKETS["income"]))] += 1
+        histogram[("loans", _bucket(loans, HISTOGRAM_BUCKETS["loans"]))] += 1
+        for field in fields:
+            mismatch[(day, field)] += 1
+    return {"daily": daily, "dependents": dependents, "histogram": histogram, "mismatch": mismatch}
+
+
+def _apply(conn: sqlite3.Connection, increments: Dict[str, dict]):
+    conn.executemany('''
+        INSERT INTO agg_daily (day, applications, eligible, not_eligible, with_mismatch, income_sum, loans_sum)
+        VALUES (?, ?, ?, ?, ?, ?, ?)
+        ON CONFLICT (day) DO UPDATE SET
+            applications = applications + excluded.applications,
+            eligible = eligible + excluded.eligible,
+            not_eligible = not_eligible + excluded.not_eligible,
+            with_mismatch = with_mismatch + excluded.with_mismatch,
+            income_sum = income_sum + excluded.income_sum,
+            loans_sum = loans_sum + excluded.loans_sum
+    ''', [(day, *values) for day, values in increments["daily"].items()])
+    conn.executemany('''
+        INSERT INTO agg_dependents (dependents, applications, eligible, income_sum, loans_sum)
+        VALUES (?, ?, ?, ?, ?)
+        ON CONFLICT (dependents) DO UPDATE SET
+            applications = applications + excluded.applications,
+            eligible = eligible + excluded.eligible,
+            income_sum = income_sum + excluded.income_sum,
+            loans_sum = loans_sum + excluded.loans_sum
+    ''', [(deps, *values) for deps, values in increments["dependents"].items()])
+    conn.executemany('''
+        INSERT INTO agg_histogram (metric, bucket_low, applications) VALUES (?, ?, ?)
+        ON CONFLICT (metric, bucket_low) DO UPDATE SET applications = applications + excluded.applications
+    ''', [(*key, count) for key, count in increments["histogram"].items()])
+    conn.executemany('''
+        INSERT INTO agg_mismatch (day, field, applications) VALUES (?, ?, ?)
+        ON CONFLICT (day, field) DO UPDATE SET applications = applications + excluded.applications
+    ''', [(*key, count) for key, count in increments["mismatch"].items()])
+
+
+def _watermark(conn: sqlite3.Connection) -> int:
+    row = conn.execute("SELECT last_id FROM agg_watermark WHERE name = ?", (_WATERMARK,)).fetchone()
+    return row[0] if row else 0
+
+
+def apply_pending(conn: sqlite3.Connection, chunk_size: int = AGGREGATES_CHUNK_ROWS) -> int:
+    """
+    Fold applications above the watermark into the summary tables
+
+    Runs in the caller's transaction and advances the watermark with the
+    increments, so each application is counted exactly once whether the
+    insert path or the delta job picks it up. The caller commits.
+
+    Returns:
+        Number of applications applied
+    """
+    last_id = _watermark(conn)
+    applied = 0
+    while True:
+        rows = conn.execute(
+            "SELECT id, created_at, dependents, extracted_income, extracted_loans, eligible, mismatch_fields "
+            "FROM applications WHERE id > ? ORDER BY id LIMIT ?", (last_id, chunk_size)
+        ).fetchall()
+        if not rows:
+            break
+        _apply(conn, _summarize(rows))
+        last_id = rows[-1][0]
+        conn.execute(
+            "INSERT INTO agg_watermark (name, last_id) VALUES (?, ?) "
+            "ON CONFLICT (name) DO UPDATE SET last_id = excluded.last_id", (_WATERMARK, last_id)
+        )
+        applied += len(rows)
+    return applied
+
+
+def refresh() -> int:
+    """Delta job: apply applications stored since the last refresh, one commit per call"""
+    with get_connection() as conn:
+        applied = apply_pending(conn)
+        conn.commit()
+    if applied:
+        logger.info(f"Applied {applied} applications to the summary tables")
+    return applied
+
+
+def rebuild() -> int:
+    """Recompute every summary table from the applications table"""
+    with get_connection() as conn:
+        for table in ("agg_daily", "agg_dependents", "agg_histogram", "agg_mismatch", "agg_watermark"):
+            conn.execute(f"DELETE FROM {table}")
+        applied = apply_pending(conn)
+        conn.commit()
+    logger.info(f"Rebuilt summary tables from {applied} applications")
+    return applied
+
+
+# --- Query API: reads pre-aggregated rows only ---
+
+def _rows(query: str, params: tuple = ()) -> List[dict]:
+    with get_connection() as conn:
+        cursor = conn.execute(query, params)
+        names = [d[0] for d in cursor.description]
+        return [dict(zip(names, row)) for row in cursor.fetchall()]
+
+
+def _day_filter(start: Optional[str], end: Optional[str]):
+    clauses, params = [], []
+    if start:
+        clauses.append("day >= ?")
+        params.append(start)
+    if end:
+        clauses.append("day <= ?")
+        params.append(end)
+    if clauses:
+        clauses.append(f"day != '{UNKNOWN_DAY}'")
+    return (" WHERE " + " AND ".join(clauses)) if clauses else "", tuple(params)
+
+
+def daily_stats(start: Optional[str] = None, end: Optional[str] = None) -> List[dict]:
+    """Applications, approval and mismatch rates and mean extracted amounts per day (YYYY-MM-DD bounds)"""
+    where, params = _day_filter(start, end)
+    rows = _rows(f"SELECT * FROM agg_daily{where} ORDER BY day", params)
+    for row in rows:
+        n = row["applications"]
+        decided = row["eligible"] + row["not_eligible"]
+        row["approval_rate"] = round(row["eligible"] / decided, 4) if decided else None
+        row["mismatch_rate"] = round(row["with_mismatch"] / n, 4) if n else None
+        row["avg_income"] = round(row.pop("income_sum") / n, 2) if n else None
+        row["avg_loans"] = round(row.pop("loans_sum") / n, 2) if n else None
+    return rows
+
+
+def income_by_dependents() -> List[dict]:
+    """Mean extracted income and loans and approval share per number of dependents"""
+    rows = _rows("SELECT * FROM agg_dependents ORDER BY dependents")
+    for row in rows:
+        n = row["applications"]
+        row["avg_income"] = round(row.pop("income_sum") / n, 2)
+        row["avg_loans"] = round(row.pop("loans_sum") / n, 2)
+        row["approval_share"] = round(row["eligible"] / n, 4)
+    return rows
+
+
+def histogram(metric: str) -> List[dict]:
+    """Applications per bucket of extracted income or loans"""
+    if metric not in HISTOGRAM_BUCKETS:
+        raise ValueError(f"Unknown histogram metric: {metric}")
+    return _rows(
+        "SELECT bucket_low, bucket_low + ? AS bucket_high, applications FROM agg_histogram "
+        "WHERE metric = ? ORDER BY bucket_low", (HISTOGRAM_BUCKETS[metric], metric)
+    )
+
+
+def mismatch_rates(start: Optional[str] = None, end: Optional[str] = None) -> List[dict]:
+    """Applications and share of applications with a mismatch, per reconciled field"""
+    where, params = _day_filter(start, end)
+    total = _rows(f"SELECT COALESCE(SUM(applications), 0) AS n FROM agg_daily{where}", params)[0]["n"]
+    rows = _rows(f"SELECT field, SUM(applications) AS applications FROM agg_mismatch{where} "
+                 "GROUP BY field ORDER BY applications DESC", params)
+    for row in rows:
+        row["rate"] = round(row["applications"] / total, 4) if total else None
+    return rows
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Maintain the application summary tables")
+    parser.add_argument("--rebuild", action="store_true", help="recompute from scratch")
+    parser.add_argument("--interval", type=float, default=0, help="repeat the delta job every N seconds")
+    args = parser.parse_args()
+    init_aggregates()
+    if args.rebuild:
+        rebuild()
+    while True:
+        print(f"Applied {refresh()} applications")
+        if args.interval <= 0:
+            break
+        time.sleep(args.interval)
@@ -0,0 +1,249 @@
+import argparse
+import atexit
+import json
+import os
+import queue
+import sqlite3
+import sys
+import threading
+import time
+import zlib
+from typing import Any, Dict, List, Optional
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from db.duplicate_index import normalize_emirates_id
+from utils.logger import get_logger
+
+logger = get_logger("audit_log")
+
+# Separate file, so audit writes never contend with the applications table
+AUDIT_DB_PATH = os.environ.get("AUDIT_DB_PATH", "audit_log.db")
+AUDIT_BATCH_SIZE = int(os.environ.get("AUDIT_BATCH_SIZE", "64"))
+AUDIT_FLUSH_INTERVAL = float(os.environ.get("AUDIT_FLUSH_INTERVAL", "1.0"))
+AUDIT_MAX_PENDING = int(os.environ.get("AUDIT_MAX_PENDING", "10000"))
+AUDIT_COMPRESSION_LEVEL = 6
+
+
+def _json_default(value: Any):
+    # NumPy scalars and arrays (ML scores, SHAP values) as numbers, anything else as text
+    if hasattr(value, "tolist"):
+        return value.tolist()
+    return str(value)
+
+
+def serialize_record(record: Dict[str, Any]) -> bytes:
+    """Compact JSON of a run record"""
+    return json.dumps(record, separators=(",", ":"), default=_json_default, ensure_ascii=False).encode("utf-8")
+
+
+def decode_record(blob: bytes) -> Dict[str, Any]:
+    return json.loads(zlib.decompress(blob).decode("utf-8"))
+
+
+class AuditLog:
+    """
+    Append-only store of the complete final state of every workflow run
+
+    record() only enqueues; a background thread serializes, compresses and
+    inserts records in batches of up to batch_size, or every flush_interval
+    seconds, in one transaction each. When max_pending records are already
+    waiting new ones are dropped (and counted) rather than blocking the run.
+    Records are indexed by run id, Emirates ID and application id.
+
+    The records hold every applicant field, so they are read only through
+    this class or the command line (python db/audit_log.py), never the API.
+    """
+
+    def __init__(self, db_path: str = AUDIT_DB_PATH, batch_size: int = AUDIT_BATCH_SIZE,
+                 flush_interval: float = AUDIT_FLUSH_INTERVAL, max_pending: int = AUDIT_MAX_PENDING):
+        self.db_path = db_path
+        self._batch_size = batch_size
+        self._flush_interval = flush_interval
+        self._queue: "queue.Queue[Optional[tuple]]" = queue.Queue(maxsize=max_pending)
+        self._writer: Optional[threading.Thread] = None
+        self._writer_lock = threading.Lock()
+        self._initialized = False
+        self._stats = {"written": 0, "dropped": 0, "failed": 0, "batches": 0, "raw_bytes": 0, "stored_bytes": 0}
+        self._stats_lock = threading.Lock()
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def init(self):
+        if self._initialized:
+            return
+        conn = self._connect()
+        try:
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS audit_records (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    run_id TEXT NOT NULL,
+                    application_id INTEGER,
+                    emirates_id TEXT,
+                    status TEXT,
+                    created_at REAL NOT NULL,
+                    payload BLOB NOT NULL
+                )
+            ''')
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_audit_application ON audit_records (application_id)")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_audit_emirates_id ON audit_records (emirates_id)")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_audit_run ON audit_records (run_id)")
+            conn.commit()
+            self._initialized = True
+        finally:
+            conn.close()
+
+    def _ensure_writer(self):
+        if self._writer is not None:
+            return
+        with self._writer_lock:
+            if self._writer is None:
+                self.init()
+                self._writer = threading.Thread(target=self._write_loop, name="audit-log-writer", daemon=True)
+                self._writer.start()
+                logger.info(f"Audit log writer started ({self.db_path})")
+
+    def record(self, run_id: str, application_id: Optional[int], emirates_id: Optional[str],
+               status: str, state: Dict[str, Any]) -> bool:
+        """Queue one run's record; returns False when it was dropped"""
+        self._ensure_writer()
+        entry = (run_id, application_id, normalize_emirates_id(emirates_id) or None, status, time.time(), dict(state))
+        try:
+            self._queue.put_nowait(entry)
+            return True
+        except queue.Full:
+            self._count("dropped")
+            logger.warning(f"Audit log queue full, dropped record of run {run_id}")
+            return False
+
+    def _count(self, key: str, amount: int = 1):
+        with self._stats_lock:
+            self._stats[key] += amount
+
+    def _write_loop(self):
+        conn = self._connect()
+        while True:
+            entry = self._queue.get()
+            batch = [entry]
+            deadline = time.monotonic() + self._flush_interval
+            while len(batch) < self._batch_size and batch[-1] is not None:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            records = [e for e in batch if e is not None]
+            if records:
+                self._write_batch(conn, records)
+            for _ in batch:
+                self._queue.task_done()
+            if batch[-1] is None:
+                conn.close()
+                return
+
+    def _write_batch(self, conn: sqlite3.Connection, records: List[tuple]):
+        rows, raw_bytes = [], 0
+        try:
+            for run_id, application_id, emirates_id, status, created_at, state in records:
+                payload = serialize_record(state)
+                raw_bytes += len(payload)
+                rows.append((run_id, application_id, emirates_id, status, created_at,
+                             zlib.compress(payload, AUDIT_COMPRESSION_LEVEL)))
+            conn.executemany(
+                "INSERT INTO audit_records (run_id, application_id, emirates_id, status, created_at, payload) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                rows
+            )
+            conn.commit()
+        except Exception as e:
+            conn.rollback()
+            self._count("failed", len(records))
+            logger.error(f"Audit log batch of {len(records)} records failed: {str(e)}")
+            return
+        with self._stats_lock:
+            self._stats["written"] += len(rows)
+            self._stats["batches"] += 1
+            self._stats["raw_bytes"] += raw_bytes
+            self._stats["stored_bytes"] += sum(len(row[-1]) for row in rows)
+
+    def flush(self):
+        """Block until every queued record is written"""
+        if self._writer is not None:
+            self._queue.join()
+
+    def close(self):
+        """Write what is queued and stop the writer"""
+        if self._writer is not None and self._writer.is_alive():
+            self._queue.put(None)
+            self._writer.join()
+
+    def _query(self, where: str, params: tuple, limit: int) -> List[Dict[str, Any]]:
+        self.init()
+        conn = self._connect()
+        try:
+            rows = conn.execute(
+                "SELECT id, run_id, application_id, emirates_id, status, created_at, payload "
+                f"FROM audit_records WHERE {where} ORDER BY id DESC LIMIT ?",
+                (*params, limit)
+            ).fetchall()
+        finally:
+            conn.close()
+        return [
+            {"audit_id": row[0], "run_id": row[1], "application_id": row[2], "emirates_id": row[3],
+             "status": row[4], "created_at": row[5], "state": decode_record(row[6])}
+            for row in rows
+        ]
+
+    def by_application(self, application_id: int, limit: int = 10) -> List[Dict[str, Any]]:
+        """
+        Records of a stored application, newest first
+
+        Looked up through the application's run id, since runs stored via
+        the spool are recorded with a provisional id the compactor replaces.
+        """
+        from db.database import get_connection
+        with get_connection() as conn:
+            row = conn.execute("SELECT run_id FROM applications WHERE id = ?", (application_id,)).fetchone()
+        if row and row[0]:
+            return self.by_run(row[0])[:limit]
+        return self._query("application_id = ?", (application_id,), limit)
+
+    def by_emirates_id(self, emirates_id: str, limit: int = 50) -> List[Dict[str, Any]]:
+        """Records of every run for an Emirates ID (any formatting), newest first"""
+        return self._query("emirates_id = ?", (normalize_emirates_id(emirates_id),), limit)
+
+    def by_run(self, run_id: str) -> List[Dict[str, Any]]:
+        return self._query("run_id = ?", (run_id,), 10)
+
+    def stats(self) -> dict:
+        with self._stats_lock:
+            stats = dict(self._stats)
+        stats["pending"] = self._queue.qsize()
+        stats["compression_ratio"] = round(stats["raw_bytes"] / stats["stored_bytes"], 2) if stats["stored_bytes"] else 0.0
+        return stats
+
+
+# Process-wide audit log; queued records are written before the interpreter exits
+audit_log = AuditLog()
+atexit.register(audit_log.close)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Print stored audit records of past runs as JSON")
+    lookup = parser.add_mutually_exclusive_group(required=True)
+    lookup.add_argument("--run-id")
+    lookup.add_argument("--application-id", type=int)
+    lookup.add_argument("--emirates-id")
+    parser.add_argument("--limit", type=int, default=10)
+    args = parser.parse_args()
+    if args.run_id:
+        records = audit_log.by_run(args.run_id)
+    elif args.application_id is not None:
+        records = audit_log.by_application(args.application_id, args.limit)
+    else:
+        records = audit_log.by_emirates_id(args.emirates_id, args.limit)
+    print(json.dumps(records, indent=2, ensure_ascii=False))
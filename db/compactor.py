@@ -0,0 +1,152 @@
+import argparse
+import glob
+import json
+import os
+import sys
+import time
+from typing import List, Tuple
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from db.aggregates import apply_pending
+from db.database import APPLICATION_COLUMNS, INSERT_APPLICATION_SQL, get_connection, init_db
+from db.ledger import apply_spooled
+from db.spool import OPEN_SUFFIX, SEALED_SUFFIX, SPOOL_DIR
+from utils.logger import get_logger
+
+logger = get_logger("compactor")
+
+COMPACTOR_INTERVAL = float(os.environ.get("COMPACTOR_INTERVAL", "5"))
+# Spool bytes read per transaction
+COMPACTOR_BATCH_BYTES = int(os.environ.get("COMPACTOR_BATCH_BYTES", str(4 * 2**20)))
+
+
+def init_compactor():
+    with get_connection() as conn:
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS spool_offsets (
+                segment TEXT PRIMARY KEY,
+                offset INTEGER NOT NULL
+            )
+        ''')
+        conn.commit()
+
+
+def _segment_key(path: str, spool_dir: str) -> str:
+    """<replica>/<segment> without suffix, so sealing a segment keeps its offset"""
+    relative = os.path.relpath(path, spool_dir).replace(os.sep, "/")
+    for suffix in (OPEN_SUFFIX, SEALED_SUFFIX):
+        if relative.endswith(suffix):
+            return relative[:-len(suffix)]
+    return relative
+
+
+def _read_lines(path: str, offset: int, max_bytes: int) -> Tuple[List[dict], int]:
+    """Complete lines from offset on (a partly written last line is left), and the new offset"""
+    with open(path, "rb") as f:
+        f.seek(offset)
+        data = f.read(max_bytes)
+    end = data.rfind(b"\n") + 1
+    if end == 0 and len(data) == max_bytes:
+        # A single line longer than the batch: read it whole
+        with open(path, "rb") as f:
+            f.seek(offset)
+            data = f.readline()
+        end = len(data) if data.endswith(b"\n") else 0
+    records = []
+    for line in data[:end].splitlines():
+        if not line.strip():
+            continue
+        try:
+            records.append(json.loads(line))
+        except ValueError:
+            logger.error(f"Skipping unreadable spool line in {path} at offset {offset}")
+    return records, offset + end
+
+
+def compact_segment(path: str, spool_dir: str = SPOOL_DIR, batch_bytes: int = COMPACTOR_BATCH_BYTES) -> int:
+    """
+    Insert a segment's unread records, one transaction per batch
+
+    Rows are inserted with INSERT OR IGNORE on the unique run_id, spooled
+    ledger transactions are applied skipping stored hashes, and the segment
+    offset, the rows and the summary-table increments commit together, so
+    every spooled run is stored exactly once even if the compactor stops
+    mid-segment or a segment is read twice.
+
+    Returns:
+        Number of rows inserted
+    """
+    key = _segment_key(path, spool_dir)
+    inserted = 0
+    with get_connection() as conn:
+        row = conn.execute("SELECT offset FROM spool_offsets WHERE segment = ?", (key,)).fetchone()
+        offset = row[0] if row else 0
+        while True:
+            records, new_offset = _read_lines(path, offset, batch_bytes)
+            if new_offset == offset:
+                break
+            conn.execute("BEGIN IMMEDIATE")
+            applications = [r for r in records if r.get("kind", "application") == "application"]
+            before = conn.total_changes
+            conn.executemany(
+                INSERT_APPLICATION_SQL.format(conflict="OR IGNORE"),
+                [tuple(r.get(k) for k in APPLICATION_COLUMNS) for r in applications]
+            )
+            inserted += conn.total_changes - before
+            for record in records:
+                if record.get("kind") == "ledger":
+                    apply_spooled(conn, record)
+            conn.execute(
+                "INSERT INTO spool_offsets (segment, offset) VALUES (?, ?) "
+                "ON CONFLICT (segment) DO UPDATE SET offset = excluded.offset", (key, new_offset)
+            )
+            apply_pending(conn)
+            conn.commit()
+            offset = new_offset
+    return inserted
+
+
+def _remove_consumed(path: str, spool_dir: str):
+    """Delete a sealed segment once every byte of it is committed"""
+    key = _segment_key(path, spool_dir)
+    with get_connection() as conn:
+        row = conn.execute("SELECT offset FROM spool_offsets WHERE segment = ?", (key,)).fetchone()
+        if row is None or row[0] < os.path.getsize(path):
+            return
+        os.remove(path)
+        conn.execute("DELETE FROM spool_offsets WHERE segment = ?", (key,))
+        conn.commit()
+
+
+def compact(spool_dir: str = SPOOL_DIR) -> int:
+    """One pass over every replica's spool; returns the rows inserted"""
+    inserted = 0
+    sealed = sorted(glob.glob(os.path.join(spool_dir, "*", f"*{SEALED_SUFFIX}")))
+    active = sorted(glob.glob(os.path.join(spool_dir, "*", f"*{OPEN_SUFFIX}")))
+    for path in sealed + active:
+        try:
+            inserted += compact_segment(path, spool_dir)
+        except FileNotFoundError:
+            # Sealed by its writer since listing; the sealed name is picked up next pass
+            continue
+    for path in sealed:
+        _remove_consumed(path, spool_dir)
+    if inserted:
+        logger.info(f"Compacted {inserted} spooled applications into the database")
+    return inserted
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Merge per-replica write spools into the main database")
+    parser.add_argument("--spool-dir", default=SPOOL_DIR)
+    parser.add_argument("--interval", type=float, default=COMPACTOR_INTERVAL, help="seconds between passes")
+    parser.add_argument("--once", action="store_true", help="run a single pass and exit")
+    args = parser.parse_args()
+    init_db()
+    init_compactor()
+    logger.info(f"Compactor started on {args.spool_dir}")
+    while True:
+        count = compact(args.spool_dir)
+        if args.once:
+            print(f"Compacted {count} applications")
+            break
+        time.sleep(args.interval)
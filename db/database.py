@@ -1,39 +1,194 @@
+import os
+import queue
 import sqlite3
+import threading
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from typing import Dict, Iterable, Optional
 from utils.logger import get_logger
+from db.duplicate_index import duplicate_index
 
 logger = get_logger("database")
 
+DB_PATH = os.environ.get("SOCIAL_SUPPORT_DB", "social_support.db")
+DB_POOL_SIZE = int(os.environ.get("DB_POOL_SIZE", "4"))
+# direct: insert into DB_PATH; spool: append to this replica's spool for db/compactor.py
+DB_WRITE_MODE = os.environ.get("DB_WRITE_MODE", "direct")
+
+# Columns added after the first release: name -> SQLite declaration
+_MIGRATED_COLUMNS = {
+    "created_at": "TEXT",  # UTC, YYYY-MM-DD HH:MM:SS
+    "eligible": "INTEGER",  # 1/0, NULL when no decision was made
+    "mismatch_fields": "TEXT",  # comma-separated reconciliation mismatches
+    "run_id": "TEXT",  # workflow run that stored the row, unique when set
+    "submitted_emirates_id": "TEXT"  # as typed in the form; emirates_id is read from the ID card
+}
+
+# Columns written by insert_application and the spool compactor
+APPLICATION_COLUMNS = (
+    "run_id", "emirates_id", "name", "phone", "address", "dependents",
+    "submitted_income", "submitted_loans", "extracted_income", "extracted_loans",
+    "created_at", "eligible", "mismatch_fields", "submitted_emirates_id"
+)
+INSERT_APPLICATION_SQL = (
+    f"INSERT {{conflict}} INTO applications ({', '.join(APPLICATION_COLUMNS)}) "
+    f"VALUES ({', '.join('?' * len(APPLICATION_COLUMNS))})"
+)
+
+
+class ConnectionPool:
+    """
+    Reusable SQLite connections for one database file
+
+    Connections are opened on demand and returned to an idle queue of at
+    most `size` entries after use, so requests skip the connect/close cost.
+    A connection is used by one thread at a time.
+    """
+
+    def __init__(self, db_path: str, size: int = DB_POOL_SIZE):
+        self.db_path = db_path
+        self._idle = queue.LifoQueue(maxsize=size)
+
+    def _open(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.db_path, check_same_thread=False, timeout=30)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    @contextmanager
+    def connection(self):
+        try:
+            conn = self._idle.get_nowait()
+        except queue.Empty:
+            conn = self._open()
+        try:
+            yield conn
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            try:
+                self._idle.put_nowait(conn)
+            except queue.Full:
+                conn.close()
+
+
+_pools: Dict[str, ConnectionPool] = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(db_path: str = None) -> ConnectionPool:
+    """Process-wide connection pool of a database file"""
+    db_path = db_path or DB_PATH
+    with _pools_lock:
+        if db_path not in _pools:
+            _pools[db_path] = ConnectionPool(db_path)
+        return _pools[db_path]
+
+
+def get_connection(db_path: str = None):
+    """Pooled connection as a context manager: `with get_connection() as conn:`"""
+    return get_pool(db_path).connection()
+
+
 # Initialize SQLite DB
 def init_db():
-    conn = sqlite3.connect("social_support.db")
-    c = conn.cursor()
-    c.execute('''
-        CREATE TABLE IF NOT EXISTS applications (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            emirates_id TEXT,
-            name TEXT,
-            phone TEXT,
-            address TEXT,
-            dependents INTEGER,
-            submitted_income REAL,
-            submitted_loans REAL,
-            extracted_income REAL,
-            extracted_loans REAL
-        )
-    ''')
-    conn.commit()
-    conn.close()
+    if DB_WRITE_MODE == "spool":
+        # The compactor owns the schema and all writes; replicas only read
+        duplicate_index.load_from_db(DB_PATH)
+        return
+    with get_connection() as conn:
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS applications (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                emirates_id TEXT,
+                name TEXT,
+                phone TEXT,
+                address TEXT,
+                dependents INTEGER,
+                submitted_income REAL,
+                submitted_loans REAL,
+                extracted_income REAL,
+                extracted_loans REAL
+            )
+        ''')
+        _migrate(conn)
+        conn.commit()
     logger.info("Database and table initialized.")
+    from db.ledger import init_ledger
+    from db.aggregates import init_aggregates
+    init_ledger()
+    init_aggregates()
+    duplicate_index.load_from_db(DB_PATH)
+
+
+def _migrate(conn: sqlite3.Connection):
+    """Add columns missing from databases created by earlier versions"""
+    existing = {row[1] for row in conn.execute("PRAGMA table_info(applications)")}
+    for column, declaration in _MIGRATED_COLUMNS.items():
+        if column not in existing:
+            conn.execute(f"ALTER TABLE applications ADD COLUMN {column} {declaration}")
+            logger.info(f"Added column applications.{column}")
+    # Makes spooled rows idempotent: a run is stored at most once
+    conn.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_applications_run_id ON applications (run_id)")
+
+def application_record(emirates_id, name, phone, address, dependents, submitted_income, submitted_loans,
+                       extracted_income, extracted_loans, eligible: Optional[bool] = None,
+                       mismatch_fields: Iterable[str] = (), run_id: Optional[str] = None,
+                       submitted_emirates_id: Optional[str] = None) -> Dict:
+    """Row of APPLICATION_COLUMNS, stamped with the current UTC time"""
+    return {
+        "run_id": run_id,
+        "emirates_id": emirates_id,
+        "name": name,
+        "phone": phone,
+        "address": address,
+        "dependents": dependents,
+        "submitted_income": submitted_income,
+        "submitted_loans": submitted_loans,
+        "extracted_income": extracted_income,
+        "extracted_loans": extracted_loans,
+        "created_at": datetime.now(timezone.utc).strftime("%Y-%m-%d %H:%M:%S"),
+        "eligible": None if eligible is None else int(bool(eligible)),
+        "mismatch_fields": ",".join(mismatch_fields),
+        "submitted_emirates_id": submitted_emirates_id
+    }
+
+
+def insert_application(emirates_id, name, phone, address, dependents, submitted_income, submitted_loans,
+                       extracted_income, extracted_loans, eligible: Optional[bool] = None,
+                       mismatch_fields: Iterable[str] = (), run_id: Optional[str] = None,
+                       submitted_emirates_id: Optional[str] = None):
+    """
+    Store an application and return its id
+
+    emirates_id is the one read from the ID card; submitted_emirates_id,
+    the one typed into the form, is what the duplicate check compares.
+
+    With DB_WRITE_MODE=spool (and a run_id) the row is appended to this
+    replica's spool instead, and a negative provisional id is returned;
+    db/compactor.py inserts it into the database later.
+    """
+    from db.aggregates import AGGREGATES_ON_INSERT, apply_pending
+    record = application_record(emirates_id, name, phone, address, dependents, submitted_income, submitted_loans,
+                                extracted_income, extracted_loans, eligible, mismatch_fields, run_id,
+                                submitted_emirates_id)
+    index_emirates_id = submitted_emirates_id or emirates_id
+    if DB_WRITE_MODE == "spool" and run_id:
+        from db.spool import get_spool_writer, provisional_id
+        get_spool_writer().append(record)
+        application_id = provisional_id(run_id)
+        duplicate_index.add(application_id, index_emirates_id, phone, address, run_id)
+        logger.info(f"Spooled application for {name} (Emirates ID: {emirates_id})")
+        return application_id
 
-def insert_application(emirates_id, name, phone, address, dependents, submitted_income, submitted_loans, extracted_income, extracted_loans):
-    conn = sqlite3.connect("social_support.db")
-    c = conn.cursor()
-    c.execute('''
-        INSERT INTO applications (
-            emirates_id, name, phone, address, dependents,
-            submitted_income, submitted_loans, extracted_income, extracted_loans
-        ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-    ''', (emirates_id, name, phone, address, dependents, submitted_income, submitted_loans, extracted_income, extracted_loans))
-    conn.commit()
-    conn.close()
+    with get_connection() as conn:
+        c = conn.execute(INSERT_APPLICATION_SQL.format(conflict=""), tuple(record[k] for k in APPLICATION_COLUMNS))
+        application_id = c.lastrowid
+        if AGGREGATES_ON_INSERT:
+            # Same transaction, so the summary tables never miss or double count a row
+            apply_pending(conn)
+        conn.commit()
+    duplicate_index.add(application_id, index_emirates_id, phone, address, run_id)
     logger.info(f"Inserted application for {name} (Emirates ID: {emirates_id})")
+    return application_id
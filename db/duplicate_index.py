@@ -0,0 +1,153 @@
+import os
+import re
+import sqlite3
+import threading
+from collections import defaultdict
+from typing import Dict, Iterable, List, Optional
+from utils.fuzzy_match import normalize as normalize_address
+from utils.logger import get_logger
+
+logger = get_logger("duplicate_index")
+
+# Keys whose match rejects a submission as a duplicate
+DUPLICATE_REJECT_KEYS = tuple(
+    k.strip() for k in os.environ.get("DUPLICATE_REJECT_KEYS", "emirates_id,phone,address").split(",") if k.strip()
+)
+
+_NON_DIGITS = re.compile(r"\D")
+
+
+def normalize_emirates_id(value: Optional[str]) -> str:
+    """Digits only, so 784-1990-1234567-1 and 784199012345671 collide"""
+    return _NON_DIGITS.sub("", str(value or ""))
+
+
+def normalize_phone(value: Optional[str]) -> str:
+    """Digits without international or trunk prefix (00971 / +971 / 0)"""
+    digits = _NON_DIGITS.sub("", str(value or ""))
+    if digits.startswith("00"):
+        digits = digits[2:]
+    if digits.startswith("971"):
+        digits = digits[3:]
+    return digits.lstrip("0")
+
+
+_NORMALIZERS = {
+    "emirates_id": normalize_emirates_id,
+    "phone": normalize_phone,
+    "address": normalize_address
+}
+
+
+# Rows scanned by the index: the Emirates ID typed into the form (what the
+# check compares against), or the stored one for rows from before it was kept
+_INDEX_QUERY = (
+    "SELECT id, run_id, COALESCE(submitted_emirates_id, emirates_id), phone, address "
+    "FROM applications WHERE id > ? ORDER BY id"
+)
+
+
+def _entry(application_id: int, run_id: Optional[str]) -> str:
+    """Index entry of an application: its run id, so a spooled run's provisional and final ids are one entry"""
+    return run_id or f"#{application_id}"
+
+
+class DuplicateIndex:
+    """
+    Hashed lookup of stored applications by normalized Emirates ID, phone and address
+
+    Warmed with one scan of the applications table. Before every lookup
+    the rows stored since (by any process or replica) are read by primary
+    key from the highest id seen, so a lookup costs one indexed range query
+    plus a constant number of dict hits. insert_application also adds its
+    own rows, so runs of this process are visible at once.
+
+    Entries are keyed by run id: a spooled run is added under its
+    provisional id and replaced by the compacted row's id, and a session
+    excludes its own earlier runs by run id.
+    """
+
+    def __init__(self):
+        self._index: Dict[str, Dict[str, Dict[str, int]]] = {kind: defaultdict(dict) for kind in _NORMALIZERS}
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+        self._db_path: Optional[str] = None
+        self._last_id = 0
+        self._loaded = False
+
+    def load_from_db(self, db_path: Optional[str] = None):
+        """Rebuild the index from the applications table"""
+        with self._refresh_lock:
+            self._db_path = db_path
+            with self._lock:
+                self._index = {kind: defaultdict(dict) for kind in _NORMALIZERS}
+                self._last_id = 0
+            count = self._read_new_rows()
+            self._loaded = True
+        logger.info(f"Duplicate index loaded with {count} applications")
+
+    def refresh(self) -> int:
+        """Index applications stored since the last read; returns how many"""
+        if not self._loaded:
+            self.load_from_db()
+            return 0
+        with self._refresh_lock:
+            return self._read_new_rows()
+
+    def _read_new_rows(self) -> int:
+        from db.database import get_connection
+        try:
+            with get_connection(self._db_path) as conn:
+                rows = conn.execute(_INDEX_QUERY, (self._last_id,)).fetchall()
+        except sqlite3.OperationalError as e:
+            logger.warning(f"Duplicate index not refreshed from database: {str(e)}")
+            return 0
+        if rows:
+            with self._lock:
+                for app_id, run_id, emirates_id, phone, address in rows:
+                    self._add_to(self._index, app_id, run_id,
+                                 {"emirates_id": emirates_id, "phone": phone, "address": address})
+                self._last_id = rows[-1][0]
+        return len(rows)
+
+    @staticmethod
+    def _add_to(index, application_id: int, run_id: Optional[str], values: Dict[str, Optional[str]]):
+        entry = _entry(application_id, run_id)
+        for kind, normalize in _NORMALIZERS.items():
+            key = normalize(values.get(kind))
+            if key:
+                index[kind][key][entry] = application_id
+
+    def add(self, application_id: int, emirates_id: str, phone: str, address: str, run_id: Optional[str] = None):
+        """Register a newly stored application (emirates_id as submitted)"""
+        with self._lock:
+            self._add_to(self._index, application_id, run_id,
+                         {"emirates_id": emirates_id, "phone": phone, "address": address})
+
+    def find(self, emirates_id: str, phone: str, address: str,
+             exclude_runs: Iterable[str] = (), kinds: Iterable[str] = DUPLICATE_REJECT_KEYS) -> Dict[str, List[int]]:
+        """
+        Stored applications sharing a normalized key with the submission
+
+        Emirates IDs are compared as submitted on both sides, since the
+        check runs before the ID card is read.
+
+        Returns:
+            Mapping of key kind to matching application ids, only non-empty kinds
+        """
+        self.refresh()
+        values = {"emirates_id": emirates_id, "phone": phone, "address": address}
+        excluded = set(exclude_runs or ())
+        matches = {}
+        with self._lock:
+            for kind in kinds:
+                key = _NORMALIZERS[kind](values.get(kind))
+                entries = self._index[kind].get(key, {}) if key else {}
+                ids = sorted(i for entry, i in entries.items() if entry not in excluded)
+                if ids:
+                    matches[kind] = ids
+        return matches
+
+
+# Process-wide index
+duplicate_index = DuplicateIndex()
@@ -0,0 +1,305 @@
+import os
+from dataclasses import dataclass
+from typing import List, Optional, Tuple
+import numpy as np
+import pandas as pd
+from db.database import DB_WRITE_MODE, get_connection
+from db.duplicate_index import normalize_emirates_id
+from utils.logger import get_logger
+
+logger = get_logger("ledger")
+
+# Most recent months averaged into the extracted income and loans
+LEDGER_MONTHS = int(os.environ.get("LEDGER_MONTHS", "12"))
+
+# Canonical statement columns; hashing covers all but month
+STATEMENT_COLUMNS = ["date", "description", "income", "expenditure"]
+MONTHLY_COLUMNS = ["salary", "emi", "other_income", "other_expenditure", "transactions"]
+
+
+@dataclass
+class LedgerUpdate:
+    applicant_key: str
+    received: int  # transactions in the statement
+    inserted: int  # transactions not seen before
+    months: List[str]  # months whose aggregates changed
+    pending: Optional[pd.DataFrame] = None  # spooled monthly increments not yet in ledger_monthly
+
+
+def applicant_key(emirates_id: Optional[str]) -> str:
+    """Ledger key of an applicant: the Emirates ID, digits only"""
+    return normalize_emirates_id(emirates_id)
+
+
+def init_ledger():
+    with get_connection() as conn:
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS ledger_transactions (
+                applicant_key TEXT NOT NULL,
+                txn_hash INTEGER NOT NULL,
+                month TEXT NOT NULL,
+                txn_date TEXT,
+                description TEXT,
+                income REAL,
+                expenditure REAL,
+                PRIMARY KEY (applicant_key, txn_hash)
+            )
+        ''')
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS ledger_monthly (
+                applicant_key TEXT NOT NULL,
+                month TEXT NOT NULL,
+                salary REAL NOT NULL DEFAULT 0,
+                emi REAL NOT NULL DEFAULT 0,
+                other_income REAL NOT NULL DEFAULT 0,
+                other_expenditure REAL NOT NULL DEFAULT 0,
+                transactions INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY (applicant_key, month)
+            )
+        ''')
+        conn.commit()
+    logger.info("Ledger tables initialized.")
+
+
+def _descriptions(values: pd.Series) -> pd.Categorical:
+    """
+    Stripped descriptions as a Categorical, missing values as ""
+
+    String work runs once per distinct description; rows are remapped
+    through their integer codes.
+    """
+    categorical = pd.Categorical(values)
+    stripped = np.append(categorical.categories.astype(str).str.strip().to_numpy(dtype=object), "")
+    remap, categories = pd.factorize(stripped)
+    # Missing values have code -1, which picks the trailing ""
+    return pd.Categorical.from_codes(remap[categorical.codes], categories=categories)
+
+
+def statement_frame(bank_df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Statement rows in canonical columns (date, description, income, expenditure, month)
+
+    Source columns are matched by name as in the original Excel layout;
+    rows without a parseable date are dropped. Descriptions are categorical.
+    """
+    columns = {str(c).strip().lower(): c for c in bank_df.columns}
+    def find(fragment):
+        return next((source for name, source in columns.items() if fragment in name), None)
+
+    date_col, desc_col, income_col, expend_col = find('date'), find('desc'), find('income'), find('expend')
+    if date_col is None:
+        return pd.DataFrame(columns=STATEMENT_COLUMNS + ["month"])
+
+    frame = pd.DataFrame({
+        # One resolution for every format, so equal dates hash equally
+        "date": pd.to_datetime(bank_df[date_col], errors='coerce').astype("datetime64[ns]"),
+        "description": _descriptions(bank_df[desc_col] if desc_col else pd.Series([""] * len(bank_df))),
+        "income": pd.to_numeric(bank_df[income_col], errors='coerce').fillna(0.0).astype(float) if income_col else 0.0,
+        "expenditure": pd.to_numeric(bank_df[expend_col], errors='coerce').fillna(0.0).astype(float) if expend_col else 0.0
+    }, index=bank_df.index).dropna(subset=["date"])
+    frame["month"] = frame["date"].dt.strftime("%Y-%m")
+    return frame.reset_index(drop=True)
+
+
+def transaction_hashes(frame: pd.DataFrame) -> np.ndarray:
+    """
+    Signed 64-bit content hash per transaction
+
+    Identical rows within one statement are told apart by their occurrence
+    number, so an overlapping statement of the same account yields the same
+    hashes while two equal same-day payments are both kept.
+    """
+    occurrence = frame.groupby(STATEMENT_COLUMNS, sort=False, dropna=False, observed=True).cumcount()
+    keyed = frame[STATEMENT_COLUMNS].assign(occurrence=occurrence)
+    return pd.util.hash_pandas_object(keyed, index=False).to_numpy().view(np.int64)
+
+
+def classify(descriptions: pd.Categorical) -> Tuple[np.ndarray, np.ndarray]:
+    """Salary and EMI masks, matched once per distinct description and taken by code"""
+    lowered = descriptions.categories.str.lower()
+    is_salary = np.asarray(lowered.str.contains('salary', regex=False), dtype=bool)
+    is_emi = np.asarray(lowered.str.contains('emi', regex=False), dtype=bool)
+    codes = descriptions.codes
+    return is_salary[codes], is_emi[codes]
+
+
+def monthly_aggregates(frame: pd.DataFrame) -> pd.DataFrame:
+    """Salary, EMI, other income and other expenditure per month"""
+    is_salary, is_emi = classify(frame["description"].array)
+    income = frame["income"].to_numpy(dtype=float)
+    expenditure = frame["expenditure"].to_numpy(dtype=float)
+    parts = pd.DataFrame({
+        "month": frame["month"].to_numpy(),
+        "salary": np.where(is_salary, income, 0.0),
+        "emi": np.where(is_emi, expenditure, 0.0),
+        "other_income": np.where(is_salary, 0.0, income),
+        "other_expenditure": np.where(is_emi, 0.0, expenditure),
+        "transactions": 1
+    })
+    return parts.groupby("month", sort=True).sum()
+
+
+def _known_hashes(conn, key: str, months: List[str]) -> set:
+    placeholders = ",".join("?" * len(months))
+    rows = conn.execute(
+        f"SELECT txn_hash FROM ledger_transactions WHERE applicant_key = ? AND month IN ({placeholders})",
+        (key, *months)
+    ).fetchall()
+    return {row[0] for row in rows}
+
+
+def _store(conn, key: str, new: pd.DataFrame) -> pd.DataFrame:
+    """Insert new transactions and add them to their months; returns the monthly increments"""
+    conn.executemany(
+        "INSERT INTO ledger_transactions VALUES (?, ?, ?, ?, ?, ?, ?)",
+        zip([key] * len(new), new["txn_hash"].tolist(), new["month"].tolist(),
+            new["date"].dt.strftime("%Y-%m-%d").tolist(), new["description"].tolist(),
+            new["income"].tolist(), new["expenditure"].tolist())
+    )
+    monthly = monthly_aggregates(new)
+    conn.executemany('''
+        INSERT INTO ledger_monthly (applicant_key, month, salary, emi, other_income, other_expenditure, transactions)
+        VALUES (?, ?, ?, ?, ?, ?, ?)
+        ON CONFLICT (applicant_key, month) DO UPDATE SET
+            salary = salary + excluded.salary,
+            emi = emi + excluded.emi,
+            other_income = other_income + excluded.other_income,
+            other_expenditure = other_expenditure + excluded.other_expenditure,
+            transactions = transactions + excluded.transactions
+    ''', [(key, month, *map(float, row[:-1]), int(row[-1]))
+          for month, row in zip(monthly.index, monthly[MONTHLY_COLUMNS].to_numpy())])
+    return monthly
+
+
+def _spool_record(key: str, new: pd.DataFrame) -> dict:
+    """Spool line of new transactions, applied by db/compactor.py through apply_spooled"""
+    return {
+        "kind": "ledger",
+        "applicant_key": key,
+        "transactions": {
+            "txn_hash": new["txn_hash"].tolist(),
+            "date": new["date"].dt.strftime("%Y-%m-%d").tolist(),
+            "description": new["description"].astype(str).tolist(),
+            "income": new["income"].tolist(),
+            "expenditure": new["expenditure"].tolist()
+        }
+    }
+
+
+def apply_spooled(conn, record: dict) -> int:
+    """
+    Store a spooled statement's transactions not stored yet
+
+    Runs in the compactor's write transaction, so transactions spooled by
+    several runs (or read twice) are stored and counted once.
+
+    Returns:
+        Number of transactions stored
+    """
+    frame = pd.DataFrame(record["transactions"])
+    if frame.empty:
+        return 0
+    frame["date"] = pd.to_datetime(frame["date"]).astype("datetime64[ns]")
+    frame["description"] = pd.Categorical(frame["description"])
+    frame["month"] = frame["date"].dt.strftime("%Y-%m")
+    key = record["applicant_key"]
+    new = frame[~frame["txn_hash"].isin(_known_hashes(conn, key, frame["month"].unique().tolist()))]
+    if not new.empty:
+        _store(conn, key, new)
+    return len(new)
+
+
+def ingest_statements(emirates_id: str, bank_dfs: List[pd.DataFrame]) -> LedgerUpdate:
+    """
+    Add the new transactions of an applicant's statements to their ledger
+
+    Transactions already stored (by content hash) are skipped, and only the
+    months that received new transactions have their aggregates updated.
+    With DB_WRITE_MODE=spool the new transactions are appended to this
+    replica's spool for the compactor instead, and returned as the update's
+    pending monthly increments for income_and_loans.
+
+    Raises:
+        ValueError: The Emirates ID has no digits, so there is no ledger to update
+    """
+    key = applicant_key(emirates_id)
+    if not key:
+        raise ValueError("No Emirates ID to key the ledger on")
+    # Hashed per statement, so occurrence numbers restart in each one
+    frames = [f.assign(txn_hash=transaction_hashes(f)) for f in map(statement_frame, bank_dfs) if not f.empty]
+    if not frames:
+        return LedgerUpdate(key, 0, 0, [])
+    frame = pd.concat(frames, ignore_index=True).drop_duplicates("txn_hash")
+    # Categories of each statement differ; one set again for classify()
+    frame["description"] = pd.Categorical(frame["description"].astype(str))
+    months = frame["month"].unique().tolist()
+
+    if DB_WRITE_MODE == "spool":
+        from db.spool import get_spool_writer
+        with get_connection() as conn:
+            new = frame[~frame["txn_hash"].isin(_known_hashes(conn, key, months))]
+        if new.empty:
+            return LedgerUpdate(key, len(frame), 0, [])
+        get_spool_writer().append(_spool_record(key, new))
+        monthly = monthly_aggregates(new)
+        logger.info(f"Spooled {len(new)} of {len(frame)} transactions for applicant {key[:3]}...")
+        return LedgerUpdate(key, len(frame), len(new), monthly.index.tolist(), pending=monthly)
+
+    with get_connection() as conn:
+        # Known hashes are read under the write lock, so a concurrent ingest of
+        # the same statement waits, then finds these rows and adds nothing
+        conn.execute("BEGIN IMMEDIATE")
+        new = frame[~frame["txn_hash"].isin(_known_hashes(conn, key, months))]
+        if new.empty:
+            conn.rollback()
+            logger.info(f"Statements for applicant {key[:3]}... hold no new transactions ({len(frame)} known)")
+            return LedgerUpdate(key, len(frame), 0, [])
+        monthly = _store(conn, key, new)
+        conn.commit()
+    logger.info(f"Ledger for applicant {key[:3]}...: {len(new)} of {len(frame)} transactions new, "
+                f"{len(monthly)} month(s) updated")
+    return LedgerUpdate(key, len(frame), len(new), monthly.index.tolist())
+
+
+def ingest_statement(emirates_id: str, bank_df: pd.DataFrame) -> LedgerUpdate:
+    """Add one statement's new transactions to an applicant's ledger (see ingest_statements)"""
+    return ingest_statements(emirates_id, [bank_df])
+
+
+def ledger_version(emirates_id: str) -> Tuple[int, Optional[str]]:
+    """Stored transaction count and latest month of an applicant, which change whenever the ledger does"""
+    key = applicant_key(emirates_id)
+    if not key:
+        return 0, None
+    with get_connection() as conn:
+        row = conn.execute(
+            "SELECT COUNT(*), MAX(month) FROM ledger_transactions WHERE applicant_key = ?", (key,)
+        ).fetchone()
+    return row[0], row[1]
+
+
+def monthly_summary(emirates_id: str, months: int = LEDGER_MONTHS) -> pd.DataFrame:
+    """Stored monthly aggregates of an applicant, most recent `months` in date order"""
+    with get_connection() as conn:
+        rows = conn.execute(
+            f"SELECT month, {', '.join(MONTHLY_COLUMNS)} FROM ledger_monthly "
+            "WHERE applicant_key = ? ORDER BY month DESC LIMIT ?",
+            (applicant_key(emirates_id), months)
+        ).fetchall()
+    return pd.DataFrame(rows, columns=["month"] + MONTHLY_COLUMNS).iloc[::-1].set_index("month")
+
+
+def income_and_loans(emirates_id: str, months: int = LEDGER_MONTHS,
+                     pending: Optional[pd.DataFrame] = None) -> Tuple[float, float]:
+    """
+    Mean monthly salary and EMI over the recent months that had any
+
+    pending: monthly increments spooled by this run and not yet compacted
+    """
+    summary = monthly_summary(emirates_id, months)
+    if pending is not None and not pending.empty:
+        summary = summary.add(pending[MONTHLY_COLUMNS], fill_value=0).sort_index().iloc[-months:]
+    salary = summary["salary"][summary["salary"] > 0]
+    emi = summary["emi"][summary["emi"] > 0]
+    return (float(salary.mean()) if not salary.empty else 0.0,
+            float(emi.mean()) if not emi.empty else 0.0)
@@ -0,0 +1,38 @@
+import sys
+import os
+import sqlite3
+import time
+import pandas as pd
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../../')))
+from utils.logger import get_logger
+from db.database import DB_PATH
+from agents.reconciliation_agent import reconcile_frame
+logger = get_logger("sample_query")
+
+AUDIT_CHUNK_ROWS = 250_000
+
+def audit_applications(db_path: str = DB_PATH, chunk_size: int = AUDIT_CHUNK_ROWS) -> pd.DataFrame:
+    """Reconcile submitted vs extracted amounts of every stored application"""
+    conn = sqlite3.connect(db_path)
+    results = []
+    try:
+        query = ("SELECT id, submitted_income, extracted_income, submitted_loans, extracted_loans "
+                 "FROM applications ORDER BY id")
+        for chunk in pd.read_sql_query(query, conn, index_col="id", chunksize=chunk_size):
+            submitted = chunk[["submitted_income", "submitted_loans"]].set_axis(["income", "loans"], axis=1)
+            extracted = chunk[["extracted_income", "extracted_loans"]].set_axis(["income", "loans"], axis=1)
+            results.append(reconcile_frame(submitted, extracted))
+    finally:
+        conn.close()
+    audit = pd.concat(results) if results else pd.DataFrame()
+    logger.info(f"Audited {len(audit)} applications from database.")
+    return audit
+
+# Example usage:
+if __name__ == "__main__":
+    start = time.perf_counter()
+    audit = audit_applications()
+    print(f"Audited {len(audit)} applications in {time.perf_counter() - start:.2f}s")
+    if not audit.empty:
+        print(audit.sum().to_string())
+        print(audit[audit.any(axis=1)].head(20))
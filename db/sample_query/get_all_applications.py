@@ -3,10 +3,11 @@ import os
 import sqlite3
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../../')))
 from utils.logger import get_logger
+from db.database import DB_PATH
 logger = get_logger("sample_query")
 
 def get_all_applications():
-    conn = sqlite3.connect("social_support.db")
+    conn = sqlite3.connect(DB_PATH)
     c = conn.cursor()
     c.execute("SELECT * FROM applications")
     rows = c.fetchall()
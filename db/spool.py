@@ -0,0 +1,134 @@
+import atexit
+import glob
+import json
+import os
+import socket
+import threading
+import time
+from typing import Any, Dict, Optional
+from utils.logger import get_logger
+
+logger = get_logger("spool")
+
+# Root of the per-replica spools; must be on the volume the compactor reads
+SPOOL_DIR = os.environ.get("SPOOL_DIR", "spool")
+SPOOL_SEGMENT_BYTES = int(os.environ.get("SPOOL_SEGMENT_BYTES", str(8 * 2**20)))
+SPOOL_SEGMENT_SECONDS = float(os.environ.get("SPOOL_SEGMENT_SECONDS", "300"))
+SPOOL_FSYNC = os.environ.get("SPOOL_FSYNC", "1") == "1"
+
+# Segments being appended to end in .open; sealed ones in .jsonl
+OPEN_SUFFIX = ".open"
+SEALED_SUFFIX = ".jsonl"
+
+
+def replica_name() -> str:
+    """Pod name under Kubernetes, host name elsewhere"""
+    return os.environ.get("HOSTNAME") or socket.gethostname()
+
+
+def provisional_id(run_id: str) -> int:
+    """
+    Negative stand-in for the application id of a spooled run
+
+    The real id is assigned when the compactor inserts the row; the stand-in
+    lets this replica's duplicate index and session bookkeeping refer to the
+    application meanwhile.
+    """
+    return -int(run_id.replace("-", "")[:15], 16) - 1
+
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except (PermissionError, OSError):
+        return True
+    return True
+
+
+class SpoolWriter:
+    """
+    Append-only JSON-lines spool of one process
+
+    Each process of each replica appends to its own segment files under
+    SPOOL_DIR/<replica>/, so writers never share a file or a lock. A
+    segment is sealed (renamed to .jsonl) once it exceeds the size or age
+    limit; the compactor also reads complete lines of open segments.
+    Lines are application rows, or ledger transactions marked kind=ledger.
+    """
+
+    def __init__(self, spool_dir: str = SPOOL_DIR, segment_bytes: int = SPOOL_SEGMENT_BYTES,
+                 segment_seconds: float = SPOOL_SEGMENT_SECONDS, fsync: bool = SPOOL_FSYNC):
+        self.directory = os.path.join(spool_dir, replica_name())
+        self._segment_bytes = segment_bytes
+        self._segment_seconds = segment_seconds
+        self._fsync = fsync
+        self._file = None
+        self._path: Optional[str] = None
+        self._opened_at = 0.0
+        self._seq = 0
+        self._lock = threading.Lock()
+
+    def _seal_stale_segments(self):
+        """Seal open segments left by processes of this replica that have exited"""
+        for path in glob.glob(os.path.join(self.directory, f"*{OPEN_SUFFIX}")):
+            try:
+                pid = int(os.path.basename(path).split("-")[0])
+            except ValueError:
+                continue
+            if pid != os.getpid() and not _pid_alive(pid):
+                os.replace(path, path[:-len(OPEN_SUFFIX)] + SEALED_SUFFIX)
+                logger.info(f"Sealed stale spool segment {path}")
+
+    def _open_segment(self):
+        if self._path is None:
+            os.makedirs(self.directory, exist_ok=True)
+            self._seal_stale_segments()
+        self._seq += 1
+        name = f"{os.getpid()}-{int(time.time() * 1000):013d}-{self._seq:06d}{OPEN_SUFFIX}"
+        self._path = os.path.join(self.directory, name)
+        self._file = open(self._path, "ab")
+        self._opened_at = time.monotonic()
+
+    def _seal(self):
+        if self._file is None:
+            return
+        self._file.close()
+        os.replace(self._path, self._path[:-len(OPEN_SUFFIX)] + SEALED_SUFFIX)
+        self._file = None
+
+    def append(self, record: Dict[str, Any]):
+        """Durably append one record (one line); returns once it is on disk"""
+        line = (json.dumps(record, separators=(",", ":"), ensure_ascii=False) + "\n").encode("utf-8")
+        with self._lock:
+            if self._file is not None and (
+                self._file.tell() + len(line) > self._segment_bytes
+                or time.monotonic() - self._opened_at > self._segment_seconds
+            ):
+                self._seal()
+            if self._file is None:
+                self._open_segment()
+            self._file.write(line)
+            self._file.flush()
+            if self._fsync:
+                os.fsync(self._file.fileno())
+
+    def close(self):
+        with self._lock:
+            self._seal()
+
+
+_writer: Optional[SpoolWriter] = None
+_writer_lock = threading.Lock()
+
+
+def get_spool_writer() -> SpoolWriter:
+    """Process-wide spool writer, created on first use"""
+    global _writer
+    if _writer is None:
+        with _writer_lock:
+            if _writer is None:
+                _writer = SpoolWriter()
+                atexit.register(_writer.close)
+    return _writer
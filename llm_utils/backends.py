@@ -0,0 +1,139 @@
+import hashlib
+import os
+import re
+import time
+from typing import Any, Callable, Dict, List, Optional
+from langchain_core.language_models.llms import LLM
+from llm_utils.llm_gateway import GatedLLMMixin, Priority
+from llm_utils.prompt_budget import count_tokens, truncate_to_tokens
+from utils.logger import get_logger
+
+logger = get_logger("llm_backends")
+
+LLM_BACKEND = os.environ.get("LLM_BACKEND", "ollama")
+FAKE_LLM_LATENCY = float(os.environ.get("FAKE_LLM_LATENCY", "0.2"))
+FAKE_LLM_TOKENS_PER_SECOND = float(os.environ.get("FAKE_LLM_TOKENS_PER_SECOND", "0"))  # 0: no generation delay
+
+_NAME = re.compile(r"^Name: (.+)$", re.MULTILINE)
+_ML_LINE = re.compile(r"^ML assessment: (.+)$", re.MULTILINE)
+_QUESTION = re.compile(r"^Question: (.+)$", re.MULTILINE)
+
+_GENERIC_RESPONSES = [
+    "Thank you for your message. Your application is being processed according to UAE social support policies.",
+    "Applications are assessed on monthly income, loans and the number of dependents.",
+    "Please make sure your Emirates ID and bank statement are uploaded so your details can be verified.",
+]
+
+
+def _decision_response(prompt: str) -> str:
+    name = _NAME.search(prompt)
+    ml_line = _ML_LINE.search(prompt)
+    return (
+        f"Dear {name.group(1) if name else 'Applicant'},\n\n"
+        f"Your application has been reviewed. ML assessment: {ml_line.group(1) if ml_line else 'unavailable'}.\n"
+        "The decision follows the eligibility criteria: monthly income below AED 5000 and at least 2 dependents."
+    )
+
+
+def _recommendation_response(prompt: str) -> str:
+    return (
+        "- Customer Service Representative: builds on communication skills and offers stable hours\n"
+        "- Data Entry Clerk: entry-level role with government and private sector demand\n"
+        "- Vocational training through the national skills programmes to increase employability\n"
+        "- Evening diploma courses at a local college to open higher paid roles"
+    )
+
+
+def _react_response(prompt: str) -> str:
+    questions = _QUESTION.findall(prompt)
+    question = questions[-1] if questions else ""
+    answer = _GENERIC_RESPONSES[int(hashlib.sha256(question.encode("utf-8")).hexdigest(), 16) % len(_GENERIC_RESPONSES)]
+    return f" I can answer this directly.\nFinal Answer: {answer}"
+
+
+# Prompt marker -> completion renderer, checked in order
+_TEMPLATES: List[tuple] = [
+    ("Final Answer:", _react_response),
+    ("financial assistance advisor", _decision_response),
+    ("career advisor", _recommendation_response),
+]
+
+
+class FakeLLM(GatedLLMMixin, LLM):
+    """
+    Deterministic in-process stand-in for llama3
+
+    Completions are rendered from templates keyed on markers in the prompt
+    (decision, recommendation and ReAct chat prompts) or picked from canned
+    text by prompt hash, so the same prompt always gets the same answer.
+    Each call sleeps `latency` seconds plus one token interval per
+    completion token when `tokens_per_second` is set.
+    """
+
+    priority: int = Priority.CHAT
+    latency: float = FAKE_LLM_LATENCY
+    tokens_per_second: float = FAKE_LLM_TOKENS_PER_SECOND
+    max_tokens: Optional[int] = None
+    responses: Dict[str, str] = {}  # prompt marker -> fixed completion, takes precedence over templates
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake"
+
+    @property
+    def _identifying_params(self) -> Dict[str, Any]:
+        return {"latency": self.latency, "tokens_per_second": self.tokens_per_second, "max_tokens": self.max_tokens}
+
+    def render(self, prompt: str) -> str:
+        for marker, text in self.responses.items():
+            if marker in prompt:
+                return text
+        for marker, renderer in _TEMPLATES:
+            if marker in prompt:
+                return renderer(prompt)
+        digest = int(hashlib.sha256(prompt.encode("utf-8")).hexdigest(), 16)
+        return _GENERIC_RESPONSES[digest % len(_GENERIC_RESPONSES)]
+
+    def _call(self, prompt: str, stop: Optional[List[str]] = None, run_manager=None, **kwargs) -> str:
+        text = self.render(prompt)
+        if self.max_tokens:
+            text = truncate_to_tokens(text, self.max_tokens)
+        for token in stop or []:
+            if token in text:
+                text = text[:text.index(token)]
+        delay = self.latency
+        if self.tokens_per_second > 0:
+            delay += count_tokens(text) / self.tokens_per_second
+        if delay > 0:
+            time.sleep(delay)
+        return text
+
+
+def _build_ollama(max_completion_tokens: Optional[int], priority: Priority, callbacks: list):
+    from llm_utils.ollama_wrapper import GatedOllama
+    return GatedOllama(
+        model="llama3",
+        temperature=0.3,
+        num_predict=max_completion_tokens,
+        priority=int(priority),
+        callbacks=callbacks
+    )
+
+
+def _build_fake(max_completion_tokens: Optional[int], priority: Priority, callbacks: list):
+    return FakeLLM(max_tokens=max_completion_tokens, priority=int(priority), callbacks=callbacks)
+
+
+BACKENDS: Dict[str, Callable] = {
+    "ollama": _build_ollama,
+    "fake": _build_fake
+}
+
+
+def create_llm(max_completion_tokens: Optional[int] = None, priority: Priority = Priority.CHAT,
+               callbacks: Optional[list] = None, backend: Optional[str] = None):
+    """Build an LLM of the configured backend (LLM_BACKEND)"""
+    backend = backend or LLM_BACKEND
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown LLM backend: {backend} (expected one of {', '.join(BACKENDS)})")
+    return BACKENDS[backend](max_completion_tokens, priority, callbacks or [])
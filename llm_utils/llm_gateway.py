@@ -0,0 +1,177 @@
+import heapq
+import itertools
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from enum import IntEnum
+from typing import Dict, Optional
+from utils.logger import get_logger
+
+logger = get_logger("llm_gateway")
+
+
+class Priority(IntEnum):
+    """Lower values are admitted first"""
+    DECISION = 0
+    RECOMMENDATION = 1
+    CHAT = 2
+
+
+# One llama3 generation saturates the 2 CPUs of a pod; more in flight only slows all of them
+LLM_MAX_CONCURRENCY = int(os.environ.get("LLM_MAX_CONCURRENCY", "1"))
+LLM_MAX_QUEUE = int(os.environ.get("LLM_MAX_QUEUE", "32"))
+LLM_QUEUE_TIMEOUTS = {
+    Priority.DECISION: float(os.environ.get("LLM_QUEUE_TIMEOUT_DECISION", "120")),
+    Priority.RECOMMENDATION: float(os.environ.get("LLM_QUEUE_TIMEOUT_RECOMMENDATION", "300")),
+    Priority.CHAT: float(os.environ.get("LLM_QUEUE_TIMEOUT_CHAT", "30"))
+}
+WAIT_SAMPLES = 500
+
+
+class LLMGatewayBusy(RuntimeError):
+    """The gateway could not admit an LLM call"""
+
+
+class LLMQueueFull(LLMGatewayBusy):
+    """Rejected on arrival because the wait queue is at capacity"""
+
+
+class LLMQueueTimeout(LLMGatewayBusy):
+    """Waited longer than the queue timeout of its priority"""
+
+
+class _Waiter:
+    __slots__ = ("priority", "seq", "event", "granted", "cancelled")
+
+    def __init__(self, priority: int, seq: int):
+        self.priority = priority
+        self.seq = seq
+        self.event = threading.Event()
+        self.granted = False
+        self.cancelled = False
+
+    def __lt__(self, other: "_Waiter") -> bool:
+        return (self.priority, self.seq) < (other.priority, other.seq)
+
+
+class LLMGateway:
+    """
+    Admission control in front of the local Ollama server
+
+    At most max_concurrency calls run at once. Further callers wait in a
+    priority queue (FIFO within a priority) of at most max_queue entries,
+    fail immediately when it is full and give up after the queue timeout
+    of their priority. A released slot is handed directly to the next
+    waiter, so late arrivals cannot overtake queued calls.
+    """
+
+    def __init__(self, max_concurrency: int = LLM_MAX_CONCURRENCY, max_queue: int = LLM_MAX_QUEUE,
+                 timeouts: Optional[Dict[Priority, float]] = None):
+        self.max_concurrency = max(1, max_concurrency)
+        self.max_queue = max_queue
+        self.timeouts = dict(timeouts or LLM_QUEUE_TIMEOUTS)
+        self._active = 0
+        self._queued = 0
+        self._waiters = []
+        self._seq = itertools.count()
+        self._lock = threading.Lock()
+        self._stats = {p: {"admitted": 0, "rejected": 0, "timed_out": 0, "wait_total": 0.0, "wait_max": 0.0,
+                           "waits": deque(maxlen=WAIT_SAMPLES)} for p in Priority}
+
+    def _record_wait(self, priority: Priority, waited: float):
+        stats = self._stats[priority]
+        stats["admitted"] += 1
+        stats["wait_total"] += waited
+        stats["wait_max"] = max(stats["wait_max"], waited)
+        stats["waits"].append(waited)
+
+    def acquire(self, priority: Priority = Priority.CHAT, timeout: Optional[float] = None):
+        """Wait for a slot, raises LLMQueueFull or LLMQueueTimeout"""
+        priority = Priority(priority)
+        timeout = self.timeouts[priority] if timeout is None else timeout
+        with self._lock:
+            if self._active < self.max_concurrency and self._queued == 0:
+                self._active += 1
+                self._record_wait(priority, 0.0)
+                return
+            if self._queued >= self.max_queue:
+                self._stats[priority]["rejected"] += 1
+                logger.warning(f"LLM queue full, rejected {priority.name.lower()} call")
+                raise LLMQueueFull(f"LLM queue full ({self._queued} waiting), {priority.name.lower()} call rejected")
+            waiter = _Waiter(priority, next(self._seq))
+            heapq.heappush(self._waiters, waiter)
+            self._queued += 1
+
+        started = time.monotonic()
+        waiter.event.wait(timeout)
+        waited = time.monotonic() - started
+        with self._lock:
+            # The slot may have been granted between the timeout and taking the lock
+            if not waiter.granted:
+                waiter.cancelled = True
+                self._queued -= 1
+                self._stats[priority]["timed_out"] += 1
+                logger.warning(f"{priority.name.lower()} call timed out after {waited:.1f}s in the LLM queue")
+                raise LLMQueueTimeout(f"{priority.name.lower()} call waited {waited:.1f}s for the LLM")
+            self._record_wait(priority, waited)
+
+    def release(self):
+        """Hand the slot to the next live waiter or free it"""
+        with self._lock:
+            while self._waiters:
+                waiter = heapq.heappop(self._waiters)
+                if waiter.cancelled:
+                    continue
+                waiter.granted = True
+                self._queued -= 1
+                waiter.event.set()
+                return
+            self._active -= 1
+
+    @contextmanager
+    def slot(self, priority: Priority = Priority.CHAT, timeout: Optional[float] = None):
+        self.acquire(priority, timeout)
+        try:
+            yield
+        finally:
+            self.release()
+
+    def snapshot(self) -> dict:
+        """Current load and per priority admission and wait-time metrics"""
+        with self._lock:
+            by_priority = {}
+            for priority, stats in self._stats.items():
+                waits = sorted(stats["waits"])
+                by_priority[priority.name.lower()] = {
+                    "admitted": stats["admitted"],
+                    "rejected": stats["rejected"],
+                    "timed_out": stats["timed_out"],
+                    "avg_wait_seconds": round(stats["wait_total"] / stats["admitted"], 3) if stats["admitted"] else 0.0,
+                    "p95_wait_seconds": round(waits[int(0.95 * (len(waits) - 1))], 3) if waits else 0.0,
+                    "max_wait_seconds": round(stats["wait_max"], 3)
+                }
+            return {
+                "active": self._active,
+                "queue_depth": self._queued,
+                "max_concurrency": self.max_concurrency,
+                "priorities": by_priority
+            }
+
+
+class GatedLLMMixin:
+    """
+    Routes a LangChain LLM's generation through the gateway
+
+    The concrete class declares a `priority` field; the slot is held only
+    for the generation itself.
+    """
+
+    def _generate(self, prompts, stop=None, run_manager=None, **kwargs):
+        with llm_gateway.slot(self.priority):
+            return super()._generate(prompts, stop=stop, run_manager=run_manager, **kwargs)
+
+
+# Process-wide gateway shared by every LLM instance
+llm_gateway = LLMGateway()
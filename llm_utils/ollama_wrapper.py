@@ -1,15 +1,33 @@
+from functools import lru_cache
+from typing import Optional
 from langchain_community.llms import Ollama
 from callbacks.logging_callback import LoggingCallbackHandler
+from callbacks.token_usage_callback import token_usage
+from llm_utils.backends import LLM_BACKEND, create_llm
+from llm_utils.llm_gateway import GatedLLMMixin, Priority
 from utils.logger import get_logger
 
 logger = get_logger("ollama_wrapper")
 
-def get_local_llm():
+
+class GatedOllama(GatedLLMMixin, Ollama):
+    """Ollama LLM admitted through the process-wide LLM gateway"""
+    priority: int = Priority.CHAT
+
+
+@lru_cache(maxsize=None)
+def get_local_llm(max_completion_tokens: Optional[int] = None, priority: Priority = Priority.CHAT):
+    """
+    Shared LLM client per completion cap and priority, built on first use
+
+    Args:
+        max_completion_tokens: Cap on generated tokens (Ollama num_predict), None for no cap
+        priority: Gateway queue priority of this LLM's calls
+
+    Returns:
+        LLM of the backend selected by LLM_BACKEND (ollama or fake)
+    """
     callback = LoggingCallbackHandler()
-    llm = Ollama(
-        model="llama3",
-        temperature=0.3,
-        callbacks=[callback]
-    )
-    logger.info("Initialized Ollama LLM with logging callback")
-    return llm
\ No newline at end of file
+    llm = create_llm(max_completion_tokens, priority, callbacks=[callback, token_usage])
+    logger.info(f"Initialized {LLM_BACKEND} LLM ({Priority(priority).name.lower()} priority) with logging and token usage callbacks")
+    return llm
@@ -0,0 +1,77 @@
+import math
+import re
+from dataclasses import dataclass
+from typing import Iterable, List, Optional, Tuple
+from utils.logger import get_logger
+
+logger = get_logger("prompt_budget")
+
+# Word, number or single punctuation pieces; long pieces split into several BPE tokens
+_PIECES = re.compile(r"\w+|[^\w\s]")
+CHARS_PER_TOKEN_PIECE = 6
+TRUNCATION_MARK = " …"
+
+
+def count_tokens(text: str) -> int:
+    """Approximate llama3 token count without loading a tokenizer"""
+    if not text:
+        return 0
+    return sum(math.ceil(len(piece) / CHARS_PER_TOKEN_PIECE) for piece in _PIECES.findall(text))
+
+
+def truncate_to_tokens(text: str, max_tokens: int) -> str:
+    """Cut text at a piece boundary so it fits max_tokens"""
+    if count_tokens(text) <= max_tokens:
+        return text
+    used = 0
+    for match in _PIECES.finditer(text):
+        used += math.ceil(len(match.group()) / CHARS_PER_TOKEN_PIECE)
+        if used > max_tokens - 1:  # keep room for the truncation mark
+            return text[:match.start()].rstrip() + TRUNCATION_MARK
+    return text
+
+
+def compact_list(items: Optional[Iterable[str]], max_items: int = 8, max_item_tokens: int = 24) -> str:
+    """Render a bounded, semicolon separated summary of a list section"""
+    items = [str(item).strip() for item in (items or []) if str(item).strip()]
+    if not items:
+        return "Not provided"
+    shown = [truncate_to_tokens(item, max_item_tokens) for item in items[:max_items]]
+    hidden = len(items) - len(shown)
+    return "; ".join(shown) + (f" (+{hidden} more)" if hidden else "")
+
+
+@dataclass
+class PromptSection:
+    text: str
+    shrinkable: bool = False  # data sections may be cut, instructions may not
+
+
+def fit_sections(sections: List[PromptSection], budget: int, name: str = "prompt") -> Tuple[str, int]:
+    """
+    Join prompt sections within a token budget
+
+    Fixed sections are kept whole. The remaining budget is shared between
+    shrinkable sections: short ones keep their full text and hand their
+    unused share to the longer ones, which are truncated to fit.
+
+    Returns:
+        The prompt text and its approximate token count
+    """
+    counts = [count_tokens(s.text) for s in sections]
+    remaining = budget - sum(c for s, c in zip(sections, counts) if not s.shrinkable)
+    shrinkable = sorted((i for i, s in enumerate(sections) if s.shrinkable), key=lambda i: counts[i])
+
+    texts = [s.text for s in sections]
+    for position, i in enumerate(shrinkable):
+        share = max(0, remaining // (len(shrinkable) - position))
+        if counts[i] > share:
+            texts[i] = truncate_to_tokens(texts[i], share) if share > 0 else ""
+            logger.info(f"{name}: section truncated from {counts[i]} to {count_tokens(texts[i])} tokens")
+        remaining -= count_tokens(texts[i])
+
+    prompt = "\n".join(t for t in texts if t)
+    tokens = count_tokens(prompt)
+    if tokens > budget:
+        logger.warning(f"{name}: {tokens} tokens exceed the budget of {budget} (fixed sections too long)")
+    return prompt, tokens
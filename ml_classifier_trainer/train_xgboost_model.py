@@ -2,76 +2,262 @@
 import xgboost as xgb
 import pandas as pd
 import numpy as np
-import joblib
-from sklearn.model_selection import train_test_split
+import argparse
+import json
+import gc
 import os
+import resource
+import sqlite3
+import sys
+import tempfile
+import time
+from contextlib import contextmanager
+from typing import Iterator, List, Optional, Tuple
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from utils.model_registry import publish_model
 
 # Configuration
 MODEL_DIR = "models"
-MODEL_FILE = "social_support_xgboost_model.pkl"
 DUMMY_DATA_SIZE = 5000
+CHUNK_SIZE = 100_000
+EVAL_FRACTION = 0.2
+MAX_EVAL_ROWS = 1_000_000
+FEATURES = ['income', 'loans', 'dependents', 'employment_status', 'existing_benefits']
+TARGET = 'eligible'
+SQLITE_QUERY = f"SELECT {', '.join(FEATURES + [TARGET])} FROM training_data"
 
-def generate_dummy_data():
+MODEL_PARAMS = {
+    'objective': 'binary:logistic',
+    'max_depth': 4,
+    'learning_rate': 0.1,
+    'subsample': 0.8,
+    'colsample_bytree': 0.8,
+    'tree_method': 'hist',
+    'max_bin': 256,
+    'random_state': 42
+}
+N_ESTIMATORS = 150
+
+
+def generate_dummy_data(size: int = DUMMY_DATA_SIZE, rng: Optional[np.random.Generator] = None):
     """Generate realistic dummy data for UAE social support"""
-    np.random.seed(42)
-    
+    rng = rng if rng is not None else np.random.default_rng(42)
+
     # Generate features
     data = {
-        'income': np.clip(np.random.normal(15000, 6000, DUMMY_DATA_SIZE), 2000, 50000),
-        'loans': np.clip(np.random.normal(10000, 4000, DUMMY_DATA_SIZE), 0, 30000),
-        'dependents': np.random.randint(0, 7, DUMMY_DATA_SIZE),
-        'employment_status': np.random.choice([0, 1], DUMMY_DATA_SIZE, p=[0.2, 0.8]),
-        'existing_benefits': np.random.choice([0, 1], DUMMY_DATA_SIZE, p=[0.7, 0.3])
+        'income': np.clip(rng.normal(15000, 6000, size), 2000, 50000),
+        'loans': np.clip(rng.normal(10000, 4000, size), 0, 30000),
+        'dependents': rng.integers(0, 7, size),
+        'employment_status': rng.choice([0, 1], size, p=[0.2, 0.8]),
+        'existing_benefits': rng.choice([0, 1], size, p=[0.7, 0.3])
     }
-    
+
     # Generate target based on UAE-like rules
     conditions = (
-        (data['income'] < 18000) & 
-        (data['loans'] > 5000) & 
-        (data['dependents'] >= 1) & 
-        (data['employment_status'] == 1) & 
+        (data['income'] < 18000) &
+        (data['loans'] > 5000) &
+        (data['dependents'] >= 1) &
+        (data['employment_status'] == 1) &
         (data['existing_benefits'] == 0)
     )
     data['eligible'] = np.where(conditions, 1, 0)
     return pd.DataFrame(data)
 
-def train_and_save_model():
+# --- Chunked data sources ---
+def synthetic_chunks(rows: int, chunk_size: int) -> Iterator[pd.DataFrame]:
+    """Dummy data generated chunk by chunk, reproducible for a given chunk size"""
+    for i, start in enumerate(range(0, rows, chunk_size)):
+        yield generate_dummy_data(min(chunk_size, rows - start), np.random.default_rng(42 + i))
+
+def parquet_chunks(path: str, chunk_size: int) -> Iterator[pd.DataFrame]:
+    """Record batches of a Parquet file or partitioned directory, feature columns only"""
+    import pyarrow.dataset as ds
+    dataset = ds.dataset(path, format="parquet", partitioning="hive")
+    missing = [c for c in FEATURES + [TARGET] if c not in dataset.schema.names]
+    if missing:
+        # e.g. the applications export (db/exporter.py), which has no labelled training columns
+        raise ValueError(f"{path} has no training columns {', '.join(missing)}; expected {', '.join(FEATURES + [TARGET])}")
+    for batch in dataset.to_batches(columns=FEATURES + [TARGET], batch_size=chunk_size):
+        yield batch.to_pandas()
+
+def sqlite_chunks(path: str, query: str, chunk_size: int) -> Iterator[pd.DataFrame]:
+    """Query results of a SQLite database fetched chunk by chunk"""
+    conn = sqlite3.connect(path)
+    try:
+        for chunk in pd.read_sql_query(query, conn, chunksize=chunk_size):
+            yield chunk
+    finally:
+        conn.close()
+
+def split_chunk(chunk: pd.DataFrame, eval_fraction: float, rng: np.random.Generator) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    is_eval = rng.random(len(chunk)) < eval_fraction
+    return chunk[~is_eval], chunk[is_eval]
+
+
+class ChunkIterator(xgb.DataIter):
+    """Feeds training chunks to XGBoost's external memory DMatrix"""
+
+    def __init__(self, make_chunks, eval_fraction: float, eval_parts: List[pd.DataFrame], cache_dir: str):
+        self._make_chunks = make_chunks
+        self._eval_fraction = eval_fraction
+        self._eval_parts = eval_parts
+        self._chunks = None
+        self._first_pass = True
+        self._eval_rows = 0
+        self._rng = None
+        super().__init__(cache_prefix=os.path.join(cache_dir, "train"))
+
+    def reset(self):
+        if self._chunks is not None:
+            self._first_pass = False
+        self._chunks = iter(self._make_chunks())
+        self._rng = np.random.default_rng(7)
+
+    def next(self, input_data) -> bool:
+        if self._chunks is None:
+            self.reset()
+        chunk = next(self._chunks, None)
+        if chunk is None:
+            return False
+        train, evaluation = split_chunk(chunk, self._eval_fraction, self._rng)
+        # Keep the evaluation sample from the first pass only, bounded in size
+        if self._first_pass and self._eval_rows < MAX_EVAL_ROWS:
+            self._eval_parts.append(evaluation)
+            self._eval_rows += len(evaluation)
+        input_data(data=train[FEATURES], label=train[TARGET])
+        return True
+
+# --- Timing and memory report ---
+def _rss_mb() -> float:
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2**20
+    except (OSError, ValueError):
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+@contextmanager
+def phase(report: dict, name: str):
+    """Record wall time, CPU time and memory of a training phase"""
+    rss_before = _rss_mb()
+    wall, cpu = time.perf_counter(), time.process_time()
+    yield
+    report[name] = {
+        'wall_seconds': round(time.perf_counter() - wall, 3),
+        'cpu_seconds': round(time.process_time() - cpu, 3),
+        'rss_mb': round(_rss_mb(), 1),
+        'rss_delta_mb': round(_rss_mb() - rss_before, 1),
+        'peak_rss_mb': round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+    }
+
+def print_report(report: dict):
+    print(f"\n{'phase':<10} {'wall s':>9} {'cpu s':>9} {'rss MB':>9} {'delta MB':>9} {'peak MB':>9}")
+    for name, stats in report.items():
+        print(f"{name:<10} {stats['wall_seconds']:>9.2f} {stats['cpu_seconds']:>9.2f} "
+              f"{stats['rss_mb']:>9.1f} {stats['rss_delta_mb']:>9.1f} {stats['peak_rss_mb']:>9.1f}")
+
+# --- Training ---
+def _train_in_memory(make_chunks, args, report):
+    with phase(report, 'data_load'):
+        rng = np.random.default_rng(7)
+        train_parts, eval_parts = zip(*(split_chunk(c, args.eval_fraction, rng) for c in make_chunks()))
+        train_df, eval_df = pd.concat(train_parts), pd.concat(eval_parts)
+
+    with phase(report, 'train'):
+        model = xgb.XGBClassifier(n_estimators=N_ESTIMATORS, n_jobs=args.n_jobs, **MODEL_PARAMS)
+        model.fit(train_df[FEATURES], train_df[TARGET],
+                  eval_set=[(eval_df[FEATURES], eval_df[TARGET])],
+                  verbose=args.verbose)
+
+    with phase(report, 'eval'):
+        metrics = {
+            'train_accuracy': float(model.score(train_df[FEATURES], train_df[TARGET])),
+            'test_accuracy': float(model.score(eval_df[FEATURES], eval_df[TARGET])),
+            'rows': int(len(train_df) + len(eval_df))
+        }
+    return model, metrics
+
+def _train_external_memory(make_chunks, args, report):
+    with tempfile.TemporaryDirectory(prefix="xgb-cache-") as cache_dir:
+        with phase(report, 'data_load'):
+            eval_parts: List[pd.DataFrame] = []
+            iterator = ChunkIterator(make_chunks, args.eval_fraction, eval_parts, cache_dir)
+            dtrain = xgb.ExtMemQuantileDMatrix(iterator, max_bin=MODEL_PARAMS['max_bin'], nthread=args.n_jobs)
+            eval_df = pd.concat(eval_parts)
+            deval = xgb.DMatrix(eval_df[FEATURES], label=eval_df[TARGET], nthread=args.n_jobs)
+
+        with phase(report, 'train'):
+            params = {k: v for k, v in MODEL_PARAMS.items() if k != 'random_state'}
+            params.update({'seed': MODEL_PARAMS['random_state'], 'nthread': args.n_jobs, 'eval_metric': 'logloss'})
+            booster = xgb.train(params, dtrain, num_boost_round=N_ESTIMATORS,
+                                evals=[(deval, 'eval')], verbose_eval=args.verbose)
+
+        with phase(report, 'eval'):
+            eval_pred = booster.predict(deval) > 0.5
+            metrics = {
+                'test_accuracy': float((eval_pred == eval_df[TARGET].to_numpy()).mean()),
+                'rows': int(dtrain.num_row() + deval.num_row())
+            }
+
+        raw_model = booster.save_raw("ubj")
+        # Free the DMatrix (and the booster holding it) while its cache files still exist
+        del booster, dtrain, deval, iterator
+        gc.collect()
+
+    # Wrap the booster in the sklearn estimator the validator expects
+    model = xgb.XGBClassifier(n_jobs=args.n_jobs)
+    model.load_model(bytearray(raw_model))
+    return model, metrics
+
+def train_and_save_model(args=None):
+    args = args or parse_args([])
     os.makedirs(MODEL_DIR, exist_ok=True)
-    
-    # Generate and prepare data
-    df = generate_dummy_data()
-    X = df.drop('eligible', axis=1)
-    y = df['eligible']
-    
-    # Split data
-    X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42)
-    
-    # Train model
-    model = xgb.XGBClassifier(
-        objective='binary:logistic',
-        n_estimators=150,
-        max_depth=4,
-        learning_rate=0.1,
-        subsample=0.8,
-        colsample_bytree=0.8,
-        random_state=42
-    )
-    
-    model.fit(X_train, y_train,
-              eval_set=[(X_test, y_test)],
-              verbose=True)
-    
-    # Evaluating model  
-    train_acc = model.score(X_train, y_train)
-    test_acc = model.score(X_test, y_test)
-    print(f"\nModel trained - Train accuracy: {train_acc:.2f}, Test accuracy: {test_acc:.2f}")
-    
-    # Save model
-    joblib.dump(model, os.path.join(MODEL_DIR, MODEL_FILE))
-    print(f"Model saved to {os.path.join(MODEL_DIR, MODEL_FILE)}")
-    
-    # Save feature list
-    joblib.dump(list(X.columns), os.path.join(MODEL_DIR, "model_features.pkl"))
+
+    if args.source == 'parquet':
+        make_chunks = lambda: parquet_chunks(args.path, args.chunk_size)
+    elif args.source == 'sqlite':
+        make_chunks = lambda: sqlite_chunks(args.path, args.query, args.chunk_size)
+    else:
+        make_chunks = lambda: synthetic_chunks(args.rows, args.chunk_size)
+
+    report = {}
+    train = _train_external_memory if args.external_memory else _train_in_memory
+    model, metrics = train(make_chunks, args, report)
+    print(f"\nModel trained - {', '.join(f'{k}: {v:.4f}' if isinstance(v, float) else f'{k}: {v}' for k, v in metrics.items())}")
+
+    # Publish model and feature list as a new registry version; running
+    # validators pick it up on their next manifest check
+    with phase(report, 'save'):
+        version = publish_model(
+            model, FEATURES,
+            metadata={**metrics, 'source': args.source, 'external_memory': args.external_memory,
+                      'phases': dict(report)},
+            registry_dir=MODEL_DIR
+        )
+    print(f"Model published to registry as version {version}")
+
+    print_report(report)
+    if args.report:
+        with open(args.report, "w", encoding="utf-8") as f:
+            json.dump({'version': version, 'metrics': metrics, 'phases': report}, f, indent=2)
+    return version
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Train the social support eligibility model")
+    parser.add_argument("--source", choices=["synthetic", "parquet", "sqlite"], default="synthetic")
+    parser.add_argument("--path", help="Parquet file/directory or SQLite database")
+    parser.add_argument("--query", default=SQLITE_QUERY, help="Query for --source sqlite")
+    parser.add_argument("--rows", type=int, default=DUMMY_DATA_SIZE, help="Rows for --source synthetic")
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE)
+    parser.add_argument("--eval-fraction", type=float, default=EVAL_FRACTION)
+    parser.add_argument("--external-memory", action="store_true",
+                        help="Stream chunks into an external memory DMatrix instead of loading all rows")
+    parser.add_argument("--n-jobs", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--report", help="Write the phase report as JSON to this path")
+    parser.add_argument("--verbose", action="store_true")
+    args = parser.parse_args(argv)
+    if args.source != "synthetic" and not args.path:
+        parser.error("--path is required for --source parquet/sqlite")
+    return args
 
 if __name__ == "__main__":
-    train_and_save_model()
+    train_and_save_model(parse_args())
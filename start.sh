@@ -13,6 +13,13 @@ done
 # Confirm model available
 echo "✅ Llama3 model ready."
 
+# One application process per container: its LLM gateway, blob store,
+# duplicate index and caches are per process, so each role gets its own pod
+if [ "${APP_ROLE:-ui}" = "api" ]; then
+    echo "🌐 Launching REST API on port 8000..."
+    exec uvicorn api.server:app --host 0.0.0.0 --port 8000
+fi
+
 # Run Streamlit app
 echo "🚀 Launching Streamlit application..."
-streamlit run ui/streamlit_app.py --server.port=8501 --server.address=0.0.0.0
+exec streamlit run ui/streamlit_app.py --server.port=8501 --server.address=0.0.0.0
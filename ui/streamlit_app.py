@@ -1,14 +1,21 @@
 import streamlit as st
 import time
+import uuid
 import pandas as pd
+from concurrent.futures import ThreadPoolExecutor
 import sys
 import os
 from dotenv import load_dotenv
 import logging
-from workflow.workflow import app as workflow_app
+from workflow.runner import build_initial_state, run_application
 from utils.logger import get_logger
-import re
+from utils.blob_store import BlobStoreFull
+from utils.fuzzy_match import normalize
 from utils.status_tracker import StatusTracker
+from utils.event_bus import progress_bus
+from agents.recommendation_queue import recommendation_queue
+from agents.decision_policy import decision_stats
+from llm_utils.llm_gateway import llm_gateway
 from langsmith import traceable
 
 # --- Setup ---
@@ -19,190 +26,48 @@ logging.basicConfig(
 )
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 logger = get_logger("streamlit_app")
-logger.info("Streamlit app started")
 st.set_page_config(page_title="GenAI Social Support", layout="wide", page_icon="🤖")
 load_dotenv() 
 os.environ["LANGCHAIN_TRACING_V2"] = "true"
 
 api_key = os.environ.get("LANGSMITH_API_KEY")
 
-st.markdown("""
-<style>
-/* Body styling - Light mode */
-body { 
-    color: #333333; 
-    background-color: #f8f9fa;
-}
-
-/* Dark mode overrides */
-@media (prefers-color-scheme: dark) {
-    body {
-        color: #e0e0e0 !important;
-        background-color: #0e1117 !important;
+@st.cache_resource
+def load_styles() -> str:
+    """Page CSS, read once per server process"""
+    with open(os.path.join(os.path.dirname(__file__), "styles.css"), encoding="utf-8") as f:
+        return f.read()
+
+st.markdown(f"<style>{load_styles()}</style>", unsafe_allow_html=True)
+
+# --- Process-wide resources ---
+@st.cache_resource
+def init_resources():
+    """
+    DB pool and schema, compiled workflow, ML validator and LLM client
+
+    Streamlit re-executes this script on every interaction; cached
+    resources are built by the first session and shared by all later
+    reruns and sessions of the server process.
+    """
+    from db.database import get_pool, init_db
+    from llm_utils.ollama_wrapper import get_local_llm
+    from llm_utils.llm_gateway import Priority
+    from utils.utils import FINANCIAL_COMPLETION_TOKENS
+    from utils.xgboost_validator import validator
+    from workflow.workflow import app as workflow_app
+
+    logger.info("Streamlit app started")
+    init_db()
+    logger.info("Database initialized.")
+    return {
+        "db_pool": get_pool(),
+        "workflow": workflow_app,
+        "validator": validator,
+        "llm": get_local_llm(FINANCIAL_COMPLETION_TOKENS, Priority.DECISION)
     }
-    .stForm {
-        background-color: #1e1e1e !important;
-        border: 1px solid #333;
-    }
-    .stTextInput input, 
-    .stNumberInput input, 
-    .stTextArea textarea {
-        background-color: #2d2d2d !important;
-        color: #e0e0e0 !important;
-        border: 1px solid #444 !important;
-    }
-    .stTextInput label, 
-    .stNumberInput label, 
-    .stTextArea label, 
-    .stFileUploader label, 
-    .stSelectbox label {
-        color: #e0e0e0 !important;
-    }
-    .dataframe {
-        background-color: #1e1e1e !important;
-        color: #e0e0e0 !important;
-    }
-    .mismatch {
-        background-color: #5c0000 !important;
-    }
-}
-
-/* Form container */
-.stForm {
-    border-radius: 10px;
-    padding: 2rem;
-    background: #ffffff;
-    color: #333333;
-    border: 1px solid #e0e0e0;
-    box-shadow: 0 2px 8px rgba(0,0,0,0.1);
-    margin-bottom: 2rem;
-}
-
-/* Input fields */
-.stTextInput input, 
-.stNumberInput input, 
-.stTextArea textarea {
-    background-color: #f8f9fa !important;
-    color: #222 !important;
-    border: 1px solid #ced4da !important;
-}
-
-/* Labels */
-.stTextInput label, 
-.stNumberInput label, 
-.stTextArea label, 
-.stFileUploader label, 
-.stSelectbox label {
-    color: #333333 !important;
-    font-weight: 500 !important;
-}
-
-/* Button styling */
-.stButton > button {
-    background-color: #007bff !important;  /* Bright blue */
-    color: #ffffff !important;             /* White text */
-    border-radius: 5px !important;
-    padding: 0.75rem 1.5rem !important;
-    font-weight: bold !important;
-    font-size: 1.1rem !important;
-    border: none !important;
-    width: 100% !important;
-    margin-top: 1.5rem !important;
-    box-shadow: 0 2px 8px rgba(0, 123, 255, 0.3) !important;
-    transition: background-color 0.3s ease, transform 0.2s ease !important;
-}
-
-.stButton > button:hover {
-    background-color: #0056b3 !important;  /* Darker blue on hover */
-    transform: scale(1.03) !important;
-}
-
-.stButton > button:disabled {
-    background-color: #6c757d !important;
-    color: #ced4da !important;
-    transform: none !important;
-    cursor: not-allowed !important;
-}
-
-/* Headings */
-h1, h2, h3, h4, h5, h6 {
-    color: inherit !important;
-}
-
-/* Form sections */
-.stSubheader {
-    color: inherit !important;
-    border-bottom: 2px solid #4CAF50;
-    padding-bottom: 0.5rem;
-    margin-top: 1.5rem !important;
-    margin-bottom: 1rem !important;
-}
-
-/* Progress bar color */
-.stProgress > div > div { 
-    background-color: #4CAF50 !important; 
-}
-
-/* DataFrame appearance */
-.dataframe { 
-    font-size: 14px; 
-    background-color: white;
-}
-
-/* Mismatch class background */
-.mismatch { 
-    background-color: #ffcccc !important; 
-}
-
-/* Sidebar styles */
-[data-testid="stSidebar"] {
-    background-color: #ffffff !important;
-    color: #222 !important;
-}
-
-[data-testid="stSidebar"] .stHeader, 
-[data-testid="stSidebar"] .stInfo, 
-[data-testid="stSidebar"] .stSubheader, 
-[data-testid="stSidebar"] .stCaption {
-    color: #222 !important;
-}
-
-/* Dark mode sidebar */
-@media (prefers-color-scheme: dark) {
-    [data-testid="stSidebar"] {
-        background-color: #1e1e1e !important;
-        color: #e0e0e0 !important;
-    }
-    [data-testid="stSidebar"] .stHeader, 
-    [data-testid="stSidebar"] .stInfo, 
-    [data-testid="stSidebar"] .stSubheader, 
-    [data-testid="stSidebar"] .stCaption {
-        color: #e0e0e0 !important;
-    }
-}
-
-/* Chat message styling */
-.stChatMessage {
-    border-radius: 10px !important;
-    padding: 1rem !important;
-    margin-bottom: 1rem !important;
-    box-shadow: 0 2px 5px rgba(0,0,0,0.1) !important;
-}
-
-/* Footer styling */
-footer {
-    color: #6c757d !important;
-    font-size: 0.9rem !important;
-    text-align: center !important;
-    padding: 1rem 0 !important;
-}
-</style>
-""", unsafe_allow_html=True)
-
-# Initialize DB
-from db.database import init_db, insert_application
-init_db()
-logger.info("Database initialized.")
+
+init_resources()
 
 # --- Session State ---
 if 'chat_history' not in st.session_state:
@@ -219,6 +84,13 @@ if 'final_state' not in st.session_state:
 # Add to your session state initialization
 if 'current_status' not in st.session_state:
     st.session_state.current_status = "Ready for submission"
+if 'run_id' not in st.session_state:
+    st.session_state.run_id = None
+if 'pending_recommendations' not in st.session_state:
+    st.session_state.pending_recommendations = None
+# Applications stored from this session; resubmissions are not duplicates of them
+if 'stored_run_ids' not in st.session_state:
+    st.session_state.stored_run_ids = []
 
 # --- Header ---
 st.title("📋 UAE Social Support Application")
@@ -240,13 +112,64 @@ def format_currency(value):
     """Format currency values"""
     return f"AED {float(value):,.2f}" if value else "N/A"
 
-def normalize_address(addr):
-    if not addr:
-        return ""
-    # Remove punctuation, lower case, and normalize whitespace
-    addr = re.sub(r'[^\w\s]', '', addr)
-    addr = re.sub(r'\s+', ' ', addr)
-    return addr.strip().lower()
+def append_recommendations(recommendations):
+    """Add a finished recommendation result to the chat history"""
+    if recommendations.get('status') != 'success':
+        return
+    st.session_state.chat_history.append(
+        ("🤖 Career Advisor", "Based on your resume, here are some career development suggestions:")
+    )
+    # If recommendations are a list of strings
+    if isinstance(recommendations.get('recommendations'), list):
+        for rec in recommendations['recommendations']:
+            st.session_state.chat_history.append(
+                ("💼 Recommendation", rec)
+            )
+    # If recommendations are in a single string with newlines
+    elif isinstance(recommendations.get('recommendations'), str):
+        for rec in recommendations['recommendations'].split('\n'):
+            if rec.strip():  # Skip empty lines
+                st.session_state.chat_history.append(
+                    ("💼 Recommendation", rec.strip())
+                )
+
+@st.cache_data(max_entries=256)
+def build_reconciliation_table(form_values: tuple, document_values: tuple) -> pd.DataFrame:
+    """
+    Form vs document comparison, cached on the compared values
+
+    Both tuples hold emirates_id, name, phone, address, income and loans.
+    """
+    form_id, form_name, form_phone, form_address, form_income, form_loans = form_values
+    doc_id, doc_name, doc_phone, doc_address, doc_income, doc_loans = document_values
+    return pd.DataFrame({
+        "Field": ["Emirates ID", "Name", "Phone", "Address",
+                  "Monthly Income", "Loan Amount"],
+        "Form Value": [
+            form_id,
+            form_name,
+            format_phone(form_phone),
+            form_address,
+            format_currency(form_income),
+            format_currency(form_loans)
+        ],
+        "Document Value": [
+            doc_id,
+            doc_name,
+            format_phone(doc_phone),
+            doc_address,
+            format_currency(doc_income),
+            format_currency(doc_loans)
+        ],
+        "Status": [
+            "Match" if form_id == doc_id else "Mismatch",
+            "Match" if form_name.strip().lower() == doc_name.strip().lower() else "Mismatch",
+            "Match" if form_phone.replace(" ", "") == (doc_phone or "").replace(" ", "") else "Mismatch",
+            "Match" if normalize(form_address) == normalize(doc_address) else "Mismatch",
+            "Match" if abs(form_income - float(doc_income or 0.0)) <= 500 else "Mismatch",
+            "Match" if abs(form_loans - float(doc_loans or 0.0)) <= 500 else "Mismatch"
+        ]
+    })
 
 # --- Form ---
 with st.form("application_form", clear_on_submit=False):
@@ -291,7 +214,10 @@ with st.form("application_form", clear_on_submit=False):
     with col5:
         emirates_id_file = st.file_uploader("Emirates ID (PDF)", type=["pdf"], help="Upload scanned Emirates ID")
     with col6:
-        bank_statement_file = st.file_uploader("Bank Statement (Excel)", type=["xlsx", "xls"], help="Upload bank statement in Excel format")
+        bank_statement_files = st.file_uploader(
+            "Bank Statements (Excel, CSV or Parquet)", type=["xlsx", "xls", "csv", "parquet"], accept_multiple_files=True,
+            help="Upload one or more bank statements (several months or accounts)"
+        )
     
    
     st.divider()
@@ -312,6 +238,7 @@ if submitted and not st.session_state.processing:
         st.stop()
     
     st.session_state.processing = True
+    st.session_state.run_id = uuid.uuid4().hex
     st.session_state.form_data = {
         "emirates_id": emirates_id,
         "name": name,
@@ -321,7 +248,7 @@ if submitted and not st.session_state.processing:
         "income": income,
         "loans": loans,
         "emirates_id_file": emirates_id_file,
-        "bank_statement_file": bank_statement_file
+        "bank_statement_files": bank_statement_files
     }
     
     # Force UI update before heavy processing
@@ -329,44 +256,39 @@ if submitted and not st.session_state.processing:
 
 if st.session_state.processing:
     with st.status("🔍 Processing your application...", expanded=True) as status:
+        run_id = st.session_state.run_id
         try:
-            def process_application(initial_state):
-                return workflow_app.invoke(initial_state)
-            
             # Initialize state with cached form data
-            initial_state = {
-                **st.session_state.form_data,
-                "resume_file": resume_file,
-                "extracted_emirates_id": "",
-                "extracted_name": "",
-                "extracted_address": "",
-                "extracted_phone": "",
-                "extracted_income": 0.0,
-                "extracted_loans": 0.0,
-                "mismatches": [],
-                "ollama_response": ""
-            }
-            
-            # Update status for document extraction
-            st.session_state.current_status = "📄 Extracting documents"
-            st.write(st.session_state.current_status)
-            time.sleep(0.5)  # Simulate processing time
+            initial_state = build_initial_state(
+                run_id,
+                st.session_state.form_data,
+                resume_file=resume_file,
+                prior_run_ids=st.session_state.stored_run_ids
+            )
             
-            final_state = process_application(initial_state)
-            # Run the workflow
-            st.session_state.current_status = "🔍 Validating information"
-            st.write(st.session_state.current_status)
-            final_state = workflow_app.invoke(initial_state)
+            # Run the workflow off the script thread and stream this run's
+            # stage events from the progress bus while it executes
+            last_seq = 0
+            with ThreadPoolExecutor(max_workers=1) as executor:
+                future = executor.submit(run_application, initial_state)
+                while True:
+                    done = future.done()
+                    for event in progress_bus.events_since(run_id, last_seq):
+                        last_seq = event.seq
+                        if event.status == "started":
+                            st.write(event.label)
+                        elif event.status == "reused":
+                            st.write(f"{event.label}, reusing the previous result")
+                        elif event.duration is not None:
+                            st.caption(f"{event.stage} {event.status} in {event.duration:.2f}s")
+                    if done:
+                        break
+                    time.sleep(0.2)
+                # Stored by the runner unless rejected as a duplicate
+                final_state = future.result()
             st.session_state.final_state = final_state
-            
-            # Store in database
-            insert_application(
-                final_state['extracted_emirates_id'], 
-                name, phone, address, dependents,
-                income, loans,
-                final_state['extracted_income'],
-                final_state['extracted_loans']
-            )
+            if final_state.get('application_id') is not None:
+                st.session_state.stored_run_ids.append(run_id)
             
             # Update to complete status
             st.session_state.current_status = "✅ Processing complete"
@@ -415,8 +337,15 @@ if st.session_state.processing:
                     
                     st.session_state.chat_history.append(("🤖 AI Validator", factors_msg))
 
-            # Show discrepancies if any
-            if final_state['mismatches']:
+            # Show duplicate rejection or discrepancies if any
+            if final_state.get('duplicate_of'):
+                duplicate_fields = ', '.join(k.replace('_', ' ').title() for k in final_state['duplicate_of'])
+                st.session_state.chat_history.append(
+                    ("🤖 System",
+                     f"❌ An application with the same {duplicate_fields} has already been submitted. "
+                     "Duplicate applications are not accepted.")
+                )
+            elif final_state['mismatches']:
                 # Reconciliation warning
                 st.session_state.chat_history.append(
                     ("🤖 Reconciliation Agent", 
@@ -442,27 +371,23 @@ if st.session_state.processing:
                 st.balloons()
 
 
-            if final_state.get('recommendations', {}).get('status') == 'success':
+            # Recommendations are generated in the background after the decision
+            if (final_state.get('recommendations') or {}).get('status') == 'pending':
+                st.session_state.pending_recommendations = run_id
                 st.session_state.chat_history.append(
-                    ("🤖 Career Advisor", "Based on your resume, here are some career development suggestions:")
+                    ("🤖 Career Advisor", "Preparing career suggestions based on your resume...")
                 )
-                # If recommendations are a list of strings
-                if isinstance(final_state['recommendations'].get('recommendations'), list):
-                    for rec in final_state['recommendations']['recommendations']:
-                        st.session_state.chat_history.append(
-                            ("💼 Recommendation", rec)
-                        )
-                # If recommendations are in a single string with newlines
-                elif isinstance(final_state['recommendations'].get('recommendations'), str):
-                    for rec in final_state['recommendations']['recommendations'].split('\n'):
-                        if rec.strip():  # Skip empty lines
-                            st.session_state.chat_history.append(
-                                ("💼 Recommendation", rec.strip())
-                            )
 
 
+        except BlobStoreFull as e:
+            StatusTracker.set_status(run_id, "❌ Processing error")
+            st.session_state.current_status = "❌ Processing error"
+            logger.warning(f"Run {run_id} rejected: {str(e)}")
+            st.error(f"{str(e)}. Your form is kept, please submit again in a moment.")
+
         except RuntimeError as e:
             error_msg = str(e)
+            StatusTracker.set_status(run_id, "❌ Processing error")
             st.session_state.current_status = "❌ Processing error"
             if "Financial evaluation error" in error_msg:
                 st.error("Financial evaluation failed. Please try again.")
@@ -474,7 +399,7 @@ if st.session_state.processing:
             )
                 
         except Exception as e:
-            StatusTracker.set_status("❌ Processing error")
+            StatusTracker.set_status(run_id, "❌ Processing error")
             logger.error(f"Processing failed: {str(e)}")
             st.error(f"Processing error: {str(e)}")
             st.session_state.chat_history.append(
@@ -490,36 +415,14 @@ if st.session_state.get('show_details', False) and st.session_state.form_data an
     
     final_state = st.session_state.final_state  # for convenience
 
-    recon_data = {
-        "Field": ["Emirates ID", "Name", "Phone", "Address", 
-                  "Monthly Income", "Loan Amount"],
-        "Form Value": [
-            st.session_state.form_data['emirates_id'],
-            st.session_state.form_data['name'],
-            format_phone(st.session_state.form_data['phone']),
-            st.session_state.form_data['address'],
-            format_currency(st.session_state.form_data['income']),
-            format_currency(st.session_state.form_data['loans'])
-        ],
-        "Document Value": [
-            final_state.get('extracted_emirates_id', ""),
-            final_state.get('extracted_name', ""),
-            format_phone(final_state.get('extracted_phone', "")),
-            final_state.get('extracted_address', ""),
-            format_currency(final_state.get('extracted_income', "")),
-            format_currency(final_state.get('extracted_loans', ""))
-        ],
-        "Status": [
-            "Match" if st.session_state.form_data['emirates_id'] == final_state.get('extracted_emirates_id', "") else "Mismatch",
-            "Match" if st.session_state.form_data['name'].strip().lower() == final_state.get('extracted_name', "").strip().lower() else "Mismatch",
-            "Match" if st.session_state.form_data['phone'].replace(" ", "") == (final_state.get('extracted_phone', "") or "").replace(" ", "") else "Mismatch",
-            "Match" if normalize_address(st.session_state.form_data['address']) == normalize_address(final_state.get('extracted_address', "")) else "Mismatch",
-            "Match" if abs(st.session_state.form_data['income'] - float(final_state.get('extracted_income', 0.0))) <= 500 else "Mismatch",
-            "Match" if abs(st.session_state.form_data['loans'] - float(final_state.get('extracted_loans', 0.0))) <= 500 else "Mismatch"
-        ]
-    }
-    
-    recon_df = pd.DataFrame(recon_data)
+    form_data = st.session_state.form_data
+    recon_df = build_reconciliation_table(
+        tuple(form_data[key] for key in ('emirates_id', 'name', 'phone', 'address', 'income', 'loans')),
+        tuple(final_state.get(key, "") for key in (
+            'extracted_emirates_id', 'extracted_name', 'extracted_phone',
+            'extracted_address', 'extracted_income', 'extracted_loans'
+        ))
+    )
     
     def highlight_status(row):
         styles = [''] * len(row)
@@ -540,6 +443,24 @@ if st.session_state.get('show_details', False) and st.session_state.form_data an
         st.session_state.form_data = None
         st.rerun()
 
+# --- Deferred Recommendations ---
+@st.fragment(run_every="3s")
+def poll_recommendations():
+    """Pick up background recommendations for this session's run when ready"""
+    application_id = st.session_state.pending_recommendations
+    if not application_id:
+        return
+    result = recommendation_queue.get(application_id)
+    if result is None or result.get('status') == 'pending':
+        st.caption("💼 Career suggestions are being prepared...")
+        return
+    st.session_state.pending_recommendations = None
+    append_recommendations(result)
+    st.rerun(scope="app")
+
+if st.session_state.pending_recommendations:
+    poll_recommendations()
+
 # --- Chat History ---
 if st.session_state.chat_history:
     st.divider()
@@ -575,15 +496,14 @@ with st.sidebar:
         "Error occurred": {"icon": "❌", "color": "red"}
     }
     
-    current_status = StatusTracker.get_status() or "Ready for submission"
-    current_status = StatusTracker.get_status() or "Ready for submission"
+    current_status = StatusTracker.get_status(st.session_state.run_id) or "Ready for submission"
     status_info = {
         "Ready for submission": {"icon": "📝", "color": "blue", "text": "Fill out the form and submit your application"},
         "📄 Extracting documents": {"icon": "📄", "color": "orange", "text": "Extracting data from uploaded documents"},
         "🔍 Reconciling data": {"icon": "🔍", "color": "orange", "text": "Comparing form data with documents"},
         "🔍 Validating information": {"icon": "🔒", "color": "orange", "text": "Validating against government databases"},
         "🤖 Running AI evaluation": {"icon": "🤖", "color": "orange", "text": "Assessing financial eligibility"},
-        "💼 Generating career recommendations": {"icon": "💼", "color": "purple", "text": "Creating personalized career suggestions"},
+        "💼 Queuing career recommendations": {"icon": "💼", "color": "purple", "text": "Personalized career suggestions will follow shortly"},
         "✅ Processing complete": {"icon": "✅", "color": "green", "text": "Your application has been processed"},
         "❌ Processing error": {"icon": "❌", "color": "red", "text": "An error occurred during processing"}
     }.get(current_status, {"icon": "ℹ️", "color": "blue", "text": current_status})
@@ -603,6 +523,21 @@ with st.sidebar:
             <p style="margin: 0.5rem 0 0; color: var(--text-color);">{status_info['text']}</p>
         </div>
     """, unsafe_allow_html=True)
+
+    # Per-stage timings of this session's latest run
+    stage_timings = progress_bus.stage_timings(st.session_state.run_id) if st.session_state.run_id else {}
+    if stage_timings:
+        st.caption("Stage timings")
+        for stage, seconds in stage_timings.items():
+            st.caption(f"{stage.replace('_', ' ').title()}: {seconds:.2f}s")
+
+    decision_summary = decision_stats.snapshot()
+    if decision_summary['decisions']:
+        st.caption(f"LLM skipped for {decision_summary['skip_rate']:.0%} of "
+                   f"{decision_summary['decisions']} decisions")
+
+    gateway = llm_gateway.snapshot()
+    st.caption(f"LLM queue: {gateway['active']} running, {gateway['queue_depth']} waiting")
     
 def get_status_details(status):
     """Return additional details for each status"""
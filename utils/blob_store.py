@@ -0,0 +1,110 @@
+import hashlib
+import io
+import os
+import threading
+from typing import Any, Dict, Optional
+from utils.logger import get_logger
+
+logger = get_logger("blob_store")
+
+BLOB_STORE_MAX_BYTES = int(os.environ.get("BLOB_STORE_MAX_BYTES", str(256 * 2**20)))
+
+
+def read_bytes(source: Any) -> bytes:
+    """Contents of bytes, a path or a file-like object (uploads included)"""
+    if isinstance(source, (bytes, bytearray)):
+        return bytes(source)
+    if isinstance(source, str):
+        with open(source, "rb") as f:
+            return f.read()
+    if hasattr(source, "getvalue"):
+        return source.getvalue()
+    if hasattr(source, "seek"):
+        source.seek(0)
+    return source.read()
+
+
+class BlobStoreFull(Exception):
+    """Raised by put() when a new document would exceed the store's size limit"""
+    pass
+
+
+class BlobStore:
+    """
+    Content-addressed, size-bounded in-memory store for uploaded documents
+
+    Workflow state carries the sha256 id instead of the payload, so state
+    stays small and cheap to copy, log and checkpoint. Identical uploads
+    share one entry; each put() holds a reference that release() drops.
+    Blobs are removed once their last reference is released and never
+    while a run holds them, so when referenced blobs fill max_bytes new
+    documents are rejected with BlobStoreFull instead.
+    """
+
+    def __init__(self, max_bytes: int = BLOB_STORE_MAX_BYTES):
+        self._blobs: Dict[str, bytes] = {}
+        self._refs: Dict[str, int] = {}
+        self._size = 0
+        self._max_bytes = max_bytes
+        self._lock = threading.Lock()
+
+    def put(self, source: Any) -> Optional[str]:
+        """
+        Store a document, returns its blob id (None for no or empty source)
+
+        Raises:
+            BlobStoreFull: The document is not stored yet and does not fit
+        """
+        if source is None:
+            return None
+        data = read_bytes(source)
+        if not data:
+            return None
+        blob_id = hashlib.sha256(data).hexdigest()
+        with self._lock:
+            if blob_id not in self._blobs:
+                if self._size + len(data) > self._max_bytes:
+                    logger.warning(f"Blob store full ({self._size} of {self._max_bytes} bytes held by runs), "
+                                   f"rejected {len(data)} byte document")
+                    raise BlobStoreFull("Too many documents are being processed, retry later")
+                self._blobs[blob_id] = data
+                self._size += len(data)
+            self._refs[blob_id] = self._refs.get(blob_id, 0) + 1
+        return blob_id
+
+    def get(self, blob_id: Optional[str]) -> Optional[bytes]:
+        """Stored bytes, None when the id is empty or no longer stored"""
+        if not blob_id:
+            return None
+        with self._lock:
+            data = self._blobs.get(blob_id)
+        if data is None:
+            logger.warning(f"Blob {blob_id[:12]} is not in the store")
+        return data
+
+    def open(self, blob_id: Optional[str]) -> Optional[io.BytesIO]:
+        """Stored document as a fresh file object"""
+        data = self.get(blob_id)
+        return io.BytesIO(data) if data is not None else None
+
+    def release(self, blob_id: Optional[str]):
+        """Drop one reference; the blob is removed when none remain"""
+        if not blob_id:
+            return
+        with self._lock:
+            refs = self._refs.get(blob_id, 0) - 1
+            if refs > 0:
+                self._refs[blob_id] = refs
+                return
+            self._refs.pop(blob_id, None)
+            data = self._blobs.pop(blob_id, None)
+            if data is not None:
+                self._size -= len(data)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"blobs": len(self._blobs), "bytes": self._size, "max_bytes": self._max_bytes}
+
+
+# Process-wide store shared by the UI, the API and the workflow
+blob_store = BlobStore()
@@ -0,0 +1,187 @@
+import functools
+import itertools
+import os
+import queue
+import threading
+import time
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional
+from utils.logger import get_logger
+
+logger = get_logger("event_bus")
+
+# Events kept per run and number of runs kept before the oldest is evicted
+EVENTS_PER_RUN = int(os.environ.get("PROGRESS_EVENTS_PER_RUN", "64"))
+MAX_TRACKED_RUNS = int(os.environ.get("PROGRESS_MAX_RUNS", "1000"))
+
+
+@dataclass(frozen=True)
+class StageEvent:
+    run_id: str
+    seq: int
+    stage: str
+    status: str  # started | completed | failed | reused | info
+    label: str
+    timestamp: float
+    duration: Optional[float] = None
+
+
+class _RunChannel:
+    """Bounded ring buffer of one run's events"""
+
+    def __init__(self, maxlen: int):
+        self.events = deque(maxlen=maxlen)
+        self.seq = itertools.count(1)
+        self.timings: Dict[str, float] = {}
+
+
+class ProgressEventBus:
+    """
+    Per-run progress events keyed by run id
+
+    Publishing only appends to the run's ring buffer and hands the event to
+    a dispatcher thread, so workflow threads never wait on subscribers.
+    Consumers either poll with events_since() or register a callback.
+    """
+
+    def __init__(self, events_per_run: int = EVENTS_PER_RUN, max_runs: int = MAX_TRACKED_RUNS):
+        self._events_per_run = events_per_run
+        self._max_runs = max_runs
+        self._channels: "OrderedDict[str, _RunChannel]" = OrderedDict()
+        self._channels_lock = threading.Lock()
+        self._subscribers: List[Callable[[StageEvent], None]] = []
+        self._dispatch_queue: "queue.SimpleQueue[StageEvent]" = queue.SimpleQueue()
+        self._dispatcher: Optional[threading.Thread] = None
+
+    def _channel(self, run_id: str) -> _RunChannel:
+        channel = self._channels.get(run_id)
+        if channel is not None:
+            return channel
+        with self._channels_lock:
+            channel = self._channels.get(run_id)
+            if channel is None:
+                channel = _RunChannel(self._events_per_run)
+                self._channels[run_id] = channel
+                while len(self._channels) > self._max_runs:
+                    self._channels.popitem(last=False)
+            return channel
+
+    def publish(self, run_id: str, stage: str, status: str, label: str = "",
+                duration: Optional[float] = None) -> Optional[StageEvent]:
+        """Record a timestamped stage event for a run"""
+        if not run_id:
+            return None
+        channel = self._channel(run_id)
+        event = StageEvent(
+            run_id=run_id,
+            seq=next(channel.seq),
+            stage=stage,
+            status=status,
+            label=label or stage,
+            timestamp=time.time(),
+            duration=duration
+        )
+        channel.events.append(event)
+        if duration is not None:
+            channel.timings[stage] = duration
+        if self._subscribers:
+            self._dispatch_queue.put(event)
+        logger.info(f"[{run_id}] {stage} {status}: {event.label}"
+                    + (f" ({duration:.3f}s)" if duration is not None else ""))
+        return event
+
+    @contextmanager
+    def stage(self, run_id: str, stage: str, label: str = ""):
+        """Publish started/completed (or failed) events with the stage duration"""
+        self.publish(run_id, stage, "started", label)
+        start = time.perf_counter()
+        try:
+            yield
+        except Exception:
+            self.publish(run_id, stage, "failed", label, time.perf_counter() - start)
+            raise
+        self.publish(run_id, stage, "completed", label, time.perf_counter() - start)
+
+    def events_since(self, run_id: str, after_seq: int = 0) -> List[StageEvent]:
+        """Events of a run with a sequence number above after_seq"""
+        channel = self._channels.get(run_id)
+        if channel is None:
+            return []
+        return [e for e in list(channel.events) if e.seq > after_seq]
+
+    def latest(self, run_id: str) -> Optional[StageEvent]:
+        channel = self._channels.get(run_id)
+        if channel is None or not channel.events:
+            return None
+        return channel.events[-1]
+
+    def stage_timings(self, run_id: str) -> Dict[str, float]:
+        """Seconds spent in each completed stage of a run"""
+        channel = self._channels.get(run_id)
+        return dict(channel.timings) if channel else {}
+
+    def subscribe(self, callback: Callable[[StageEvent], None]):
+        """Register a callback invoked off the workflow thread for every event"""
+        self._subscribers.append(callback)
+        if self._dispatcher is None:
+            with self._channels_lock:
+                if self._dispatcher is None:
+                    self._dispatcher = threading.Thread(
+                        target=self._dispatch, name="progress-event-dispatcher", daemon=True
+                    )
+                    self._dispatcher.start()
+
+    def _dispatch(self):
+        while True:
+            event = self._dispatch_queue.get()
+            for callback in list(self._subscribers):
+                try:
+                    callback(event)
+                except Exception as e:
+                    logger.error(f"Progress subscriber failed: {str(e)}")
+
+
+def tracked_stage(stage: str, label: str = ""):
+    """Decorate a workflow node so it publishes stage events for state['run_id']"""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(state, *args, **kwargs):
+            with progress_bus.stage(state.get("run_id"), stage, label):
+                return func(state, *args, **kwargs)
+        return wrapper
+    return decorator
+
+
+class StageMetrics:
+    """Subscriber aggregating stage durations across all runs"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stats: Dict[str, Dict[str, float]] = {}
+
+    def __call__(self, event: StageEvent):
+        if event.duration is None:
+            return
+        with self._lock:
+            stats = self._stats.setdefault(
+                event.stage, {"count": 0, "failed": 0, "total_seconds": 0.0, "max_seconds": 0.0}
+            )
+            stats["count"] += 1
+            stats["failed"] += event.status == "failed"
+            stats["total_seconds"] += event.duration
+            stats["max_seconds"] = max(stats["max_seconds"], event.duration)
+
+    def snapshot(self) -> Dict[str, Dict[str, float]]:
+        with self._lock:
+            return {
+                stage: {**stats, "avg_seconds": stats["total_seconds"] / stats["count"]}
+                for stage, stats in self._stats.items()
+            }
+
+
+# Process-wide bus and stage metrics
+progress_bus = ProgressEventBus()
+stage_metrics = StageMetrics()
+progress_bus.subscribe(stage_metrics)
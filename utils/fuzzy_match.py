@@ -0,0 +1,201 @@
+import re
+import threading
+import zlib
+from array import array
+from typing import Dict, Hashable, List, Optional, Tuple
+import numpy as np
+import pandas as pd
+
+# Precompiled normalization shared by reconciliation and the indexes
+_PUNCTUATION = re.compile(r"[^\w\s]")
+_WHITESPACE = re.compile(r"\s+")
+
+# Code points are packed 21 bits apiece into one int64 per trigram
+_SHIFT = 21
+
+
+def normalize(text: Optional[str]) -> str:
+    """Lower-case, strip punctuation and collapse whitespace"""
+    if not text:
+        return ""
+    return _WHITESPACE.sub(" ", _PUNCTUATION.sub("", text)).strip().lower()
+
+
+def _pad(normalized: str) -> str:
+    return f"  {normalized} "
+
+
+def trigram_codes(normalized: str) -> np.ndarray:
+    """Sorted unique int64 codes of the padded trigrams of a normalized string"""
+    if not normalized:
+        return np.empty(0, dtype=np.int64)
+    points = np.frombuffer(_pad(normalized).encode("utf-32-le"), dtype=np.uint32).astype(np.int64)
+    return np.unique((points[:-2] << (2 * _SHIFT)) | (points[1:-1] << _SHIFT) | points[2:])
+
+
+def token_codes(normalized: str) -> np.ndarray:
+    """Sorted unique int64 codes of the whitespace tokens of a normalized string"""
+    if not normalized:
+        return np.empty(0, dtype=np.int64)
+    return np.unique(np.fromiter((zlib.crc32(t.encode("utf-8")) for t in normalized.split(" ")), dtype=np.int64))
+
+
+def _dice(a: np.ndarray, b: np.ndarray) -> float:
+    total = a.size + b.size
+    if total == 0:
+        return 0.0
+    return 2.0 * np.intersect1d(a, b, assume_unique=True).size / total
+
+
+def trigram_similarity(a: str, b: str) -> float:
+    """Dice coefficient of the trigram sets of two normalized strings"""
+    return _dice(trigram_codes(a), trigram_codes(b))
+
+
+def token_similarity(a: str, b: str) -> float:
+    """Dice coefficient of the token sets of two normalized strings"""
+    return _dice(token_codes(a), token_codes(b))
+
+
+def similarity(a: str, b: str) -> float:
+    """
+    Similarity of two normalized strings in [0, 1]
+
+    The larger of the trigram and token scores: trigrams absorb typos and
+    spacing differences, tokens absorb reordered parts ("Dubai, Al Barsha").
+    """
+    if not a or not b:
+        return 0.0
+    return max(trigram_similarity(a, b), token_similarity(a, b))
+
+
+def _sorted_unique(keys: np.ndarray) -> np.ndarray:
+    keys = np.sort(keys)
+    return keys[np.concatenate(([True], keys[1:] != keys[:-1]))] if keys.size else keys
+
+
+def _row_dice(keys_a: np.ndarray, keys_b: np.ndarray, width: int, rows: int) -> np.ndarray:
+    """Per-row Dice scores from (row * width + code id) keys of two sides"""
+    keys_a, keys_b = _sorted_unique(keys_a), _sorted_unique(keys_b)
+    if keys_b.size:
+        positions = np.minimum(np.searchsorted(keys_b, keys_a), keys_b.size - 1)
+        common = keys_a[keys_b[positions] == keys_a]
+    else:
+        common = keys_b
+    size_a = np.bincount(keys_a // width, minlength=rows)
+    size_b = np.bincount(keys_b // width, minlength=rows)
+    inter = np.bincount(common // width, minlength=rows)
+    total = size_a + size_b
+    return np.divide(2.0 * inter, total, out=np.zeros(rows, dtype=float), where=total > 0)
+
+
+def _trigram_keys(values: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """(row, trigram code) pairs of an array of normalized strings"""
+    lengths = np.char.str_len(values)
+    padded = np.char.add(np.char.add("  ", values), " ")
+    points = padded.view(np.uint32).reshape(values.size, -1).astype(np.int64)
+    codes = (points[:, :-2] << (2 * _SHIFT)) | (points[:, 1:-1] << _SHIFT) | points[:, 2:]
+    valid = (np.arange(codes.shape[1]) < (lengths + 1)[:, None]) & (lengths > 0)[:, None]
+    rows = np.broadcast_to(np.arange(values.size)[:, None], codes.shape)
+    return rows[valid], codes[valid]
+
+
+def batch_similarity(a: pd.Series, b: pd.Series) -> np.ndarray:
+    """
+    Row-wise similarity() of two aligned Series of normalized strings
+
+    Trigrams and tokens of all rows are extracted at once, dictionary
+    encoded to integer ids and intersected per row with NumPy set operations.
+    """
+    rows = len(a)
+    a_values = a.fillna("").to_numpy(dtype=str)
+    b_values = b.fillna("").to_numpy(dtype=str)
+    if rows == 0:
+        return np.zeros(0, dtype=float)
+
+    rows_a, codes_a = _trigram_keys(a_values)
+    rows_b, codes_b = _trigram_keys(b_values)
+    _, ids = np.unique(np.concatenate([codes_a, codes_b]), return_inverse=True)
+    width = int(ids.max()) + 1 if ids.size else 1
+    trigram_scores = _row_dice(rows_a * width + ids[:codes_a.size],
+                               rows_b * width + ids[codes_a.size:], width, rows)
+
+    tokens_a = pd.Series(a_values).str.split(" ").explode()
+    tokens_b = pd.Series(b_values).str.split(" ").explode()
+    tokens_a, tokens_b = tokens_a[tokens_a != ""], tokens_b[tokens_b != ""]
+    ids, _ = pd.factorize(pd.concat([tokens_a, tokens_b], ignore_index=True))
+    width = int(ids.max()) + 1 if ids.size else 1
+    token_scores = _row_dice(tokens_a.index.to_numpy() * width + ids[:len(tokens_a)],
+                             tokens_b.index.to_numpy() * width + ids[len(tokens_a):], width, rows)
+
+    scores = np.maximum(trigram_scores, token_scores)
+    scores[(np.char.str_len(a_values) == 0) | (np.char.str_len(b_values) == 0)] = 0.0
+    return scores
+
+
+class TrigramIndex:
+    """
+    Inverted trigram index for "closest stored values" queries
+
+    Normalized forms and trigram sizes are computed once on add(). A query
+    only touches the postings of its own trigrams, so its cost grows with
+    the number of records sharing trigrams rather than with the index size.
+    """
+
+    def __init__(self):
+        self._keys: List[Hashable] = []
+        self._forms: List[str] = []
+        self._sizes = array("q")
+        self._postings: Dict[int, array] = {}
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def add(self, key: Hashable, text: str) -> Optional[int]:
+        """Index a value under a caller key, returns its document number"""
+        normalized = normalize(text)
+        if not normalized:
+            return None
+        codes = trigram_codes(normalized)
+        with self._lock:
+            doc = len(self._keys)
+            self._keys.append(key)
+            self._forms.append(normalized)
+            self._sizes.append(codes.size)
+            for code in codes.tolist():
+                posting = self._postings.get(code)
+                if posting is None:
+                    posting = self._postings[code] = array("q")
+                posting.append(doc)
+        return doc
+
+    def query(self, text: str, k: int = 5, min_similarity: float = 0.5) -> List[Tuple[Hashable, float, str]]:
+        """
+        Closest indexed values by trigram Dice coefficient
+
+        Returns:
+            Up to k (key, score, normalized form) tuples, best first
+        """
+        normalized = normalize(text)
+        codes = trigram_codes(normalized)
+        if codes.size == 0:
+            return []
+        with self._lock:
+            postings = [self._postings[c] for c in codes.tolist() if c in self._postings]
+            if not postings:
+                return []
+            candidates = np.concatenate([np.frombuffer(p, dtype=np.int64) for p in postings])
+            docs, overlap = np.unique(candidates, return_counts=True)
+            # Index into the buffer view right away: arrays cannot grow while exported
+            sizes = np.frombuffer(self._sizes, dtype=np.int64)[docs]
+            scores = 2.0 * overlap / (codes.size + sizes)
+
+            keep = scores >= min_similarity
+            docs, scores = docs[keep], scores[keep]
+            if docs.size > k:
+                top = np.argpartition(-scores, k - 1)[:k]
+                docs, scores = docs[top], scores[top]
+            order = np.argsort(-scores, kind="stable")
+            return [(self._keys[d], float(scores[i]), self._forms[d])
+                    for i, d in ((i, int(docs[i])) for i in order)]
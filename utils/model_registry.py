@@ -0,0 +1,163 @@
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+from datetime import datetime, timezone
+from typing import Any, Dict, Optional
+
+import joblib
+from utils.logger import get_logger
+
+logger = get_logger("model_registry")
+
+# Registry layout: models/manifest.json points at the current version; each
+# version lists its artifacts (relative to models/) and their sha256 checksums.
+REGISTRY_DIR = os.environ.get("MODEL_REGISTRY_DIR", "models")
+MANIFEST_FILE = "manifest.json"
+
+# Artifacts shipped before the registry existed, registered as version 1.0
+LEGACY_VERSION = "1.0"
+LEGACY_ARTIFACTS = {
+    "model": "social_support_xgboost_model.pkl",
+    "features": "model_features.pkl"
+}
+
+
+class ModelIntegrityError(RuntimeError):
+    """Raised when an artifact does not match the checksum in the manifest"""
+
+
+def file_sha256(path: str) -> str:
+    """Compute the sha256 checksum of a file"""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def manifest_path(registry_dir: str = REGISTRY_DIR) -> str:
+    return os.path.join(registry_dir, MANIFEST_FILE)
+
+
+def read_manifest(registry_dir: str = REGISTRY_DIR) -> Dict[str, Any]:
+    """Read the registry manifest, falling back to the legacy artifacts"""
+    path = manifest_path(registry_dir)
+    if not os.path.exists(path):
+        logger.warning(f"No model manifest at {path}, using legacy artifacts")
+        return {
+            "current": LEGACY_VERSION,
+            "versions": {
+                LEGACY_VERSION: {"artifacts": dict(LEGACY_ARTIFACTS), "sha256": {}}
+            }
+        }
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _write_manifest(manifest: Dict[str, Any], registry_dir: str = REGISTRY_DIR):
+    """Write the manifest atomically so readers never see a partial file"""
+    fd, tmp_path = tempfile.mkstemp(dir=registry_dir, prefix=".manifest-", suffix=".json")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(manifest, f, indent=2, sort_keys=True)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, manifest_path(registry_dir))
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def manifest_signature(registry_dir: str = REGISTRY_DIR) -> Optional[tuple]:
+    """Cheap change marker for the manifest (mtime, size), None if absent"""
+    try:
+        stat = os.stat(manifest_path(registry_dir))
+    except FileNotFoundError:
+        return None
+    return (stat.st_mtime_ns, stat.st_size)
+
+
+def load_version(version: Optional[str] = None, registry_dir: str = REGISTRY_DIR) -> Dict[str, Any]:
+    """
+    Load the artifacts of a registered model version
+
+    Args:
+        version: Version to load, defaults to the manifest's current version
+        registry_dir: Registry root directory
+
+    Returns:
+        Dictionary with version, model and features
+    """
+    manifest = read_manifest(registry_dir)
+    version = version or manifest["current"]
+    entry = manifest["versions"].get(version)
+    if entry is None:
+        raise KeyError(f"Model version {version} is not registered")
+
+    loaded = {}
+    for name, rel_path in entry["artifacts"].items():
+        path = os.path.join(registry_dir, rel_path)
+        expected = entry.get("sha256", {}).get(name)
+        if expected and file_sha256(path) != expected:
+            raise ModelIntegrityError(f"Checksum mismatch for {name} of model version {version}")
+        loaded[name] = joblib.load(path)
+
+    logger.info(f"Loaded model version {version} from registry")
+    return {"version": version, "model": loaded["model"], "features": loaded["features"]}
+
+
+def publish_model(model, features, version: Optional[str] = None,
+                  metadata: Optional[Dict[str, Any]] = None,
+                  registry_dir: str = REGISTRY_DIR, activate: bool = True) -> str:
+    """
+    Register a new model version and optionally make it the current one
+
+    Artifacts are written to models/<version>/ and checksummed before the
+    manifest is swapped, so watchers only ever see complete versions.
+    Generated versions are the UTC time plus the start of the model's
+    checksum, so two models published in the same second do not collide.
+    """
+    manifest = read_manifest(registry_dir)
+    if version is not None and version in manifest["versions"]:
+        raise ValueError(f"Model version {version} already exists")
+
+    staging_dir = tempfile.mkdtemp(dir=registry_dir, prefix=".staging-")
+    try:
+        checksums = {}
+        for name, obj in (("model", model), ("features", features)):
+            staged = os.path.join(staging_dir, f"{name}.pkl")
+            joblib.dump(obj, staged)
+            checksums[name] = file_sha256(staged)
+        version = version or f"{datetime.now(timezone.utc):%Y%m%d%H%M%S}-{checksums['model'][:8]}"
+        if version in manifest["versions"]:
+            raise ValueError(f"Model version {version} already exists")
+        artifacts = {name: f"{version}/{name}.pkl" for name in checksums}
+        os.replace(staging_dir, os.path.join(registry_dir, version))
+    except Exception:
+        shutil.rmtree(staging_dir, ignore_errors=True)
+        raise
+
+    manifest["versions"][version] = {
+        "artifacts": artifacts,
+        "sha256": checksums,
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "metadata": metadata or {}
+    }
+    if activate:
+        manifest["current"] = version
+    _write_manifest(manifest, registry_dir)
+    logger.info(f"Published model version {version} (active: {activate})")
+    return version
+
+
+def activate_version(version: str, registry_dir: str = REGISTRY_DIR):
+    """Point the manifest at an already registered version (deploy or rollback)"""
+    manifest = read_manifest(registry_dir)
+    if version not in manifest["versions"]:
+        raise KeyError(f"Model version {version} is not registered")
+    manifest["current"] = version
+    _write_manifest(manifest, registry_dir)
+    logger.info(f"Activated model version {version}")
@@ -0,0 +1,186 @@
+import cProfile
+import functools
+import io
+import os
+import pstats
+import random
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from typing import Dict, Optional
+from utils.logger import get_logger
+
+logger = get_logger("profiling")
+
+# Profile every run, or this fraction of runs; a request flag profiles one run
+PROFILE_RUNS = os.environ.get("PROFILE_RUNS", "0") == "1"
+PROFILE_SAMPLE_RATE = float(os.environ.get("PROFILE_SAMPLE_RATE", "0"))
+# sampling (stack samples, flamegraph input) or deterministic (cProfile)
+PROFILE_MODE = os.environ.get("PROFILE_MODE", "sampling")
+PROFILE_DIR = os.environ.get("PROFILE_DIR", "profiles")
+PROFILE_INTERVAL = float(os.environ.get("PROFILE_INTERVAL", "0.005"))
+PROFILE_TOP_N = int(os.environ.get("PROFILE_TOP_N", "30"))
+
+_REPO_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..')) + os.sep
+# Only one cProfile can be active per process on Python 3.12+
+_deterministic_lock = threading.Lock()
+
+
+def should_profile(requested: bool = False) -> bool:
+    """Whether to profile a run: requested, PROFILE_RUNS, or drawn at PROFILE_SAMPLE_RATE"""
+    return requested or PROFILE_RUNS or (PROFILE_SAMPLE_RATE > 0 and random.random() < PROFILE_SAMPLE_RATE)
+
+
+@functools.lru_cache(maxsize=4096)
+def _frame_label(code) -> str:
+    """function (path:line) with repo and site-packages prefixes removed"""
+    path = code.co_filename
+    if path.startswith(_REPO_ROOT):
+        path = path[len(_REPO_ROOT):]
+    elif "site-packages" + os.sep in path:
+        path = path.split("site-packages" + os.sep, 1)[1]
+    return f"{code.co_name} ({path}:{code.co_firstlineno})".replace(";", ",")
+
+
+class StackSampler:
+    """
+    Statistical profiler of one thread
+
+    A background thread reads the target thread's stack every interval
+    seconds via sys._current_frames() and counts identical stacks, which
+    costs the profiled thread nothing beyond the GIL hand-offs.
+    """
+
+    def __init__(self, thread_id: int, interval: float = PROFILE_INTERVAL):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="profile-sampler", daemon=True)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                continue
+            stack = []
+            while frame is not None:
+                stack.append(_frame_label(frame.f_code))
+                frame = frame.f_back
+            self.stacks[";".join(reversed(stack))] += 1
+            self.samples += 1
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def collapsed(self) -> str:
+        """Folded stacks, one 'root;...;leaf count' line each (flamegraph.pl, speedscope)"""
+        return "".join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+    def summary(self, top_n: int = PROFILE_TOP_N) -> str:
+        """Functions by samples spent in them (self) and under them (total)"""
+        own, total = Counter(), Counter()
+        for stack, count in self.stacks.items():
+            frames = stack.split(";")
+            own[frames[-1]] += count
+            for label in set(frames):
+                total[label] += count
+        n = self.samples or 1
+        lines = [f"{self.samples} samples every {self.interval * 1000:.1f} ms", "",
+                 f"{'self %':>7} {'total %':>8}  function"]
+        for label, count in own.most_common(top_n):
+            lines.append(f"{100 * count / n:7.1f} {100 * total[label] / n:8.1f}  {label}")
+        lines += ["", f"{'total %':>8}  function (by total)"]
+        for label, count in total.most_common(top_n):
+            lines.append(f"{100 * count / n:8.1f}  {label}")
+        return "\n".join(lines) + "\n"
+
+
+class RunProfile:
+    """Profiler of one workflow run; files lists what was written once the run ends"""
+
+    def __init__(self, run_id: str, mode: str = PROFILE_MODE, directory: str = PROFILE_DIR):
+        self.run_id = run_id
+        self.mode = mode
+        self.directory = directory
+        self.files: Dict[str, str] = {}
+        self.duration = 0.0
+        self._started = 0.0
+        self._profiler: Optional[cProfile.Profile] = None
+        self._sampler: Optional[StackSampler] = None
+
+    def start(self):
+        if self.mode == "deterministic" and _deterministic_lock.acquire(blocking=False):
+            self._profiler = cProfile.Profile()
+            self._profiler.enable()
+        else:
+            if self.mode == "deterministic":
+                logger.warning(f"Run {self.run_id}: a deterministic profile is already active, sampling instead")
+                self.mode = "sampling"
+            self._sampler = StackSampler(threading.get_ident())
+            self._sampler.start()
+        self._started = time.perf_counter()
+
+    def stop(self):
+        self.duration = time.perf_counter() - self._started
+        if self._profiler is not None:
+            self._profiler.disable()
+            _deterministic_lock.release()
+        if self._sampler is not None:
+            self._sampler.stop()
+
+    def write(self):
+        os.makedirs(self.directory, exist_ok=True)
+        base = os.path.join(self.directory, self.run_id)
+        header = f"Run {self.run_id}: {self.duration:.3f}s, {self.mode} profile\n\n"
+        if self._profiler is not None:
+            self.files["profile"] = f"{base}.prof"
+            self._profiler.dump_stats(self.files["profile"])
+            out = io.StringIO()
+            pstats.Stats(self._profiler, stream=out).sort_stats("cumulative").print_stats(PROFILE_TOP_N)
+            summary = out.getvalue()
+        else:
+            self.files["collapsed"] = f"{base}.collapsed"
+            with open(self.files["collapsed"], "w", encoding="utf-8") as f:
+                f.write(self._sampler.collapsed())
+            summary = self._sampler.summary()
+        self.files["summary"] = f"{base}.txt"
+        with open(self.files["summary"], "w", encoding="utf-8") as f:
+            f.write(header + summary)
+        logger.info(f"Profile of run {self.run_id} written to {self.files['summary']}")
+
+
+@contextmanager
+def profile_run(run_id: str, requested: bool = False, mode: Optional[str] = None):
+    """
+    Profile the enclosed block of one run when should_profile() says so
+
+    Yields the RunProfile, or None when the run is not profiled (the
+    default, which costs one flag check). The profile is written even if
+    the block raises; failures to write it never fail the run.
+
+    Args:
+        run_id: Names the output files in PROFILE_DIR
+        requested: Profile this run regardless of PROFILE_RUNS and the sample rate
+        mode: "sampling" or "deterministic"; defaults to PROFILE_MODE
+    """
+    if not should_profile(requested):
+        yield None
+        return
+    profile = RunProfile(run_id, mode or PROFILE_MODE)
+    profile.start()
+    try:
+        yield profile
+    finally:
+        profile.stop()
+        try:
+            profile.write()
+        except Exception as e:
+            logger.error(f"Writing profile of run {run_id} failed: {str(e)}")
@@ -1,45 +1,146 @@
+import hashlib
+import io
+import os
 import re
-from typing import Dict, List
-import pdfplumber  # For PDF text extraction
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Union, BinaryIO
 from utils.logger import get_logger
 
+try:
+    import fitz  # PyMuPDF fast path
+except ImportError:
+    fitz = None
+
+try:
+    import pdfplumber  # Fallback PDF text extraction
+except ImportError:
+    pdfplumber = None
+
 logger = get_logger("resume_parser")
 
-def parse_resume(pdf_path: str) -> Dict[str, List[str]]:
+# Only the first pages of a CV carry the sections we use
+MAX_RESUME_PAGES = int(os.environ.get("RESUME_MAX_PAGES", "5"))
+RESUME_CACHE_SIZE = int(os.environ.get("RESUME_CACHE_SIZE", "128"))
+RAW_TEXT_CHARS = 1000
+
+ResumeSource = Union[bytes, bytearray, memoryview, str, os.PathLike, BinaryIO]
+
+# Section headers: a whole header word alone on its line, or followed by ':'
+# and optional inline content ("Experienced nurse ..." is not a header)
+_SECTION_HEADER = re.compile(
+    r"^\s*(technical skills|skills|competencies|work experience|experience|work history|"
+    r"education|qualifications)\b(?:\s*:\s*(.*)|\s*)$",
+    re.IGNORECASE
+)
+_SECTION_KEYS = {
+    "technical skills": "skills",
+    "skills": "skills",
+    "competencies": "skills",
+    "work experience": "experience",
+    "experience": "experience",
+    "work history": "experience",
+    "education": "education",
+    "qualifications": "education"
+}
+_BULLET = re.compile(r"^[\s\-•*●▪]+")
+
+_cache: "OrderedDict[str, Dict]" = OrderedDict()
+_cache_lock = threading.Lock()
+
+
+def read_pdf_bytes(source: ResumeSource) -> bytes:
+    """Return the PDF content of a path, raw bytes or (uploaded) file object"""
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        return bytes(source)
+    if isinstance(source, (str, os.PathLike)):
+        with open(source, "rb") as f:
+            return f.read()
+    if hasattr(source, "getvalue"):
+        return source.getvalue()
+    position = source.tell() if hasattr(source, "tell") else None
+    data = source.read()
+    if position is not None and hasattr(source, "seek"):
+        source.seek(position)  # leave the upload readable for other consumers
+    return data
+
+
+def _extract_text(data: bytes, max_pages: int) -> str:
+    """Extract text from the first max_pages pages, PyMuPDF first"""
+    if fitz is not None:
+        try:
+            with fitz.open(stream=data, filetype="pdf") as doc:
+                return "\n".join(doc[i].get_text() for i in range(min(max_pages, doc.page_count)))
+        except Exception as e:
+            logger.warning(f"PyMuPDF extraction failed, falling back to pdfplumber: {str(e)}")
+    if pdfplumber is None:
+        raise RuntimeError("No PDF backend available (install PyMuPDF or pdfplumber)")
+    with pdfplumber.open(io.BytesIO(data)) as pdf:
+        return "\n".join(page.extract_text() or "" for page in pdf.pages[:max_pages])
+
+
+def extract_sections(text: str) -> Dict[str, List[str]]:
+    """Split resume text into skills, experience and education in one pass"""
+    sections = {"skills": [], "experience": [], "education": []}
+    current = None
+    for line in text.splitlines():
+        header = _SECTION_HEADER.match(line)
+        if header:
+            current = _SECTION_KEYS[header.group(1).lower()]
+            line = header.group(2) or ""
+            # Only the first occurrence of a section is kept
+            if sections[current]:
+                current = None
+                continue
+        elif not line.strip():
+            current = None
+            continue
+        if current is not None:
+            item = _BULLET.sub("", line).strip()
+            if item:
+                sections[current].append(item)
+    return sections
+
+
+def _copy(result: Dict) -> Dict:
+    """Copy a cached result so callers cannot mutate the cache"""
+    return {key: list(value) if isinstance(value, list) else value for key, value in result.items()}
+
+
+def parse_resume(source: ResumeSource, max_pages: int = MAX_RESUME_PAGES) -> Dict[str, List[str]]:
     """
     Extract text from resume PDF and identify key sections
-    
+
     Args:
-        pdf_path: Path to resume PDF file
-        
+        source: Path, raw bytes or file object of the resume PDF
+        max_pages: Maximum number of pages to read
+
     Returns:
         Dictionary containing parsed resume sections
     """
     try:
-        with pdfplumber.open(pdf_path) as pdf:
-            text = "\n".join(page.extract_text() for page in pdf.pages)
-        
-        return {
-            "skills": _extract_skills(text),
-            "experience": _extract_experience(text),
-            "education": _extract_education(text),
-            "raw_text": text[:1000] + "..."  # Store first 1000 chars
+        data = read_pdf_bytes(source)
+        content_hash = hashlib.sha256(data).hexdigest()
+        cache_key = f"{content_hash}:{max_pages}"
+        with _cache_lock:
+            cached = _cache.get(cache_key)
+            if cached is not None:
+                _cache.move_to_end(cache_key)
+        if cached is not None:
+            logger.info(f"Resume cache hit for {content_hash[:12]}")
+            return _copy(cached)
+
+        text = _extract_text(data, max_pages)
+        result = {
+            **extract_sections(text),
+            "raw_text": text[:RAW_TEXT_CHARS] + "...",
+            "content_hash": content_hash
         }
+        with _cache_lock:
+            _cache[cache_key] = result
+            while len(_cache) > RESUME_CACHE_SIZE:
+                _cache.popitem(last=False)
+        return _copy(result)
     except Exception as e:
         logger.error(f"Failed to parse resume: {str(e)}")
         return {"error": str(e)}
-
-def _extract_skills(text: str) -> List[str]:
-    """Extract skills section from resume text"""
-    skills = re.findall(r"(?i)(?:skills|technical skills|competencies)[:\n](.*?)(?:\n\n|\n\w|$)", text, re.DOTALL)
-    return [skill.strip() for skill in skills[0].split("\n") if skill.strip()] if skills else []
-
-def _extract_experience(text: str) -> List[str]:
-    """Extract work experience from resume text"""
-    experience = re.findall(r"(?i)(?:experience|work history)[:\n](.*?)(?:\n\n|\n\w|$)", text, re.DOTALL)
-    return [exp.strip() for exp in experience[0].split("\n") if exp.strip()] if experience else []
-
-def _extract_education(text: str) -> List[str]:
-    """Extract education section from resume text"""
-    education = re.findall(r"(?i)(?:education|qualifications)[:\n](.*?)(?:\n\n|\n\w|$)", text, re.DOTALL)
-    return [edu.strip() for edu in education[0].split("\n") if edu.strip()] if education else []
\ No newline at end of file
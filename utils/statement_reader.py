@@ -0,0 +1,130 @@
+import csv
+import io
+import os
+from typing import Dict, List
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.csv as pv
+import pyarrow.parquet as pq
+from utils.logger import get_logger
+
+logger = get_logger("statement_reader")
+
+# Metadata rows above the header in Excel exports of the bank template
+EXCEL_SKIP_ROWS = int(os.environ.get("STATEMENT_EXCEL_SKIP_ROWS", "6"))
+# Lines searched for the header row of a CSV export
+CSV_HEADER_SCAN_LINES = 50
+
+# Canonical column -> fragment of the source column name
+COLUMN_FRAGMENTS = {"date": "date", "description": "desc", "income": "income", "expenditure": "expend"}
+_DICTIONARY = pa.dictionary(pa.int32(), pa.string())
+
+_PARQUET_MAGIC = b"PAR1"
+_EXCEL_MAGIC = (b"PK\x03\x04", b"\xd0\xcf\x11\xe0")  # xlsx (zip), xls (OLE)
+
+
+def detect_format(data: bytes) -> str:
+    """parquet, excel or csv, from the leading bytes (uploads carry no file name)"""
+    if data[:4] == _PARQUET_MAGIC:
+        return "parquet"
+    if data.startswith(_EXCEL_MAGIC):
+        return "excel"
+    return "csv"
+
+
+def match_columns(names: List[str]) -> Dict[str, str]:
+    """Canonical column -> first source column whose name contains its fragment"""
+    matched = {}
+    for canonical, fragment in COLUMN_FRAGMENTS.items():
+        source = next((n for n in names if fragment in str(n).strip().lower()), None)
+        if source is not None:
+            matched[canonical] = source
+    return matched
+
+
+def _csv_header(data: bytes):
+    """Row index and column names of the first line naming a date and a description column"""
+    lines = data.splitlines()[:CSV_HEADER_SCAN_LINES]
+    for i, line in enumerate(lines):
+        lowered = line.lower()
+        if b"date" in lowered and b"desc" in lowered:
+            return i, next(csv.reader([line.decode("utf-8-sig", errors="replace")]))
+    return 0, next(csv.reader([lines[0].decode("utf-8-sig", errors="replace")])) if lines else []
+
+
+def parse_amounts(values: pa.ChunkedArray) -> pa.ChunkedArray:
+    """Amount strings such as "12,000.00" as float64; blanks become null"""
+    values = pc.utf8_trim_whitespace(pc.replace_substring(values, ",", ""))
+    values = pc.if_else(pc.equal(values, ""), pa.scalar(None, pa.string()), values)
+    return pc.cast(values, pa.float64())
+
+
+def read_csv_table(data: bytes) -> pa.Table:
+    """Statement columns of a CSV export; other columns are skipped without conversion"""
+    skip, names = _csv_header(data)
+    columns = match_columns(names)
+    # Amounts are read as text so thousands separators can be stripped before the cast
+    amounts = [source for canonical, source in columns.items() if canonical in ("income", "expenditure")]
+    column_types = {source: pa.string() for source in amounts}
+    if "description" in columns:
+        column_types[columns["description"]] = _DICTIONARY
+    table = pv.read_csv(
+        io.BytesIO(data),
+        read_options=pv.ReadOptions(skip_rows=skip),
+        convert_options=pv.ConvertOptions(
+            include_columns=list(columns.values()),
+            column_types=column_types,
+            strings_can_be_null=True
+        )
+    )
+    for source in amounts:
+        index = table.schema.get_field_index(source)
+        table = table.set_column(index, source, parse_amounts(table[source]))
+    return table.rename_columns(list(columns))
+
+
+def read_parquet_table(data: bytes) -> pa.Table:
+    """Statement columns of a Parquet export, descriptions read dictionary-encoded"""
+    parquet_file = pq.ParquetFile(pa.BufferReader(data))
+    columns = match_columns(parquet_file.schema_arrow.names)
+    table = pq.read_table(
+        pa.BufferReader(data),
+        columns=list(columns.values()),
+        read_dictionary=[columns["description"]] if "description" in columns else None
+    )
+    return table.rename_columns(list(columns))
+
+
+def _canonical_table(table: pa.Table) -> pa.Table:
+    """Dates as timestamps, descriptions dictionary-encoded, amounts float64 with nulls as 0"""
+    arrays = {}
+    if "date" in table.column_names:
+        date = table["date"]
+        arrays["date"] = pc.cast(date, pa.timestamp("s")) if pa.types.is_date(date.type) else date
+    if "description" in table.column_names:
+        description = table["description"]
+        if not pa.types.is_dictionary(description.type):
+            description = pc.dictionary_encode(pc.cast(description, pa.string()))
+        arrays["description"] = description
+    for amount in ("income", "expenditure"):
+        if amount in table.column_names:
+            arrays[amount] = pc.fill_null(pc.cast(table[amount], pa.float64()), 0.0)
+    return pa.table(arrays)
+
+
+def read_statement(data: bytes) -> pd.DataFrame:
+    """
+    Bank statement bytes as a DataFrame for db.ledger.statement_frame
+
+    CSV and Parquet are read through Arrow with only the date, description,
+    income and expenditure columns converted; descriptions arrive as a
+    pandas Categorical over the Arrow dictionary. Excel goes through pandas
+    with the template's metadata rows skipped.
+    """
+    kind = detect_format(data)
+    if kind == "excel":
+        return pd.read_excel(io.BytesIO(data), skiprows=EXCEL_SKIP_ROWS)
+    table = read_parquet_table(data) if kind == "parquet" else read_csv_table(data)
+    logger.info(f"Read {kind} statement through Arrow: {table.num_rows} rows, columns {table.column_names}")
+    return _canonical_table(table).to_pandas()
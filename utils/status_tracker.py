@@ -1,16 +1,17 @@
 from typing import Optional
+from utils.event_bus import progress_bus
 from utils.logger import get_logger
 
 logger = get_logger("status_tracker")
 
 class StatusTracker:
-    _current_status: Optional[str] = None
-    
-    @classmethod
-    def set_status(cls, status: str):
-        cls._current_status = status
-        logger.info(f"Status updated: {status}")
-    
-    @classmethod
-    def get_status(cls) -> Optional[str]:
-        return cls._current_status
\ No newline at end of file
+    """Per-run status view over the progress event bus"""
+
+    @staticmethod
+    def set_status(run_id: str, status: str):
+        progress_bus.publish(run_id, "status", "info", status)
+
+    @staticmethod
+    def get_status(run_id: Optional[str]) -> Optional[str]:
+        event = progress_bus.latest(run_id) if run_id else None
+        return event.label if event else None
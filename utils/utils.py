@@ -1,57 +1,66 @@
+import os
 from llm_utils.ollama_wrapper import get_local_llm
-from langchain_core.prompts import ChatPromptTemplate
+from llm_utils.llm_gateway import Priority
+from llm_utils.prompt_budget import PromptSection, fit_sections
 from langchain_core.output_parsers import StrOutputParser
 from utils.logger import get_logger
 from langsmith import traceable
 
 logger = get_logger("utils")
 
+# Per-call token budgets: prompt size drives llama3 latency on CPU
+FINANCIAL_PROMPT_TOKENS = int(os.environ.get("FINANCIAL_PROMPT_TOKENS", "300"))
+FINANCIAL_COMPLETION_TOKENS = int(os.environ.get("FINANCIAL_COMPLETION_TOKENS", "350"))
+SHAP_TOP_FACTORS = 3
+
+
+def summarize_ml_validation(ml_validation: dict, top_factors: int = SHAP_TOP_FACTORS) -> str:
+    """One line summary of the ML result and its strongest SHAP factors"""
+    if not ml_validation or ml_validation.get('status') == 'error':
+        return "ML assessment: unavailable"
+    verdict = 'eligible' if ml_validation.get('eligible') else 'not eligible'
+    summary = f"ML assessment: {verdict} (confidence {(ml_validation.get('confidence') or 0) * 100:.0f}%)"
+    shap_values = ml_validation.get('shap_values') or {}
+    strongest = sorted(shap_values.items(), key=lambda kv: abs(kv[1]), reverse=True)[:top_factors]
+    if strongest:
+        summary += "; main factors: " + ", ".join(f"{feature} {value:+.2f}" for feature, value in strongest)
+    return summary
+
+
 @traceable(name="Ollama Financial Assistance LLM", tags=["llm", "financial"], metadata={"type": "llm"})
 def ollama_financial_assistance_response(
     income: float,
     loans: float,
     dependents: int,
     ml_validation: dict,
-    eligibility_status: str,
-    name: str,
-    mismatches: list,
-    emirates_id: str,
-    phone: str,
-    address: str
+    name: str
 ) -> str:
     logger.info(f"Calling LLM for financial assistance evaluation")
-    
-    # Create the LLM chain
-    llm = get_local_llm()
-    prompt = ChatPromptTemplate.from_template(
-        "You are a financial assistance advisor for the UAE government. "
-        "Evaluate the following application for social support:\n\n"
-        "Emirates ID: {emirates_id}\n"
-        "Name: {name}\n"
-        "Phone: {phone}\n"
-        "Address: {address}\n"
-        "Dependents: {dependents}\n"
-        "Monthly Income: AED {income}\n"
-        "Total Loans: AED {loans}\n\n"
-        "Based on UAE social support policies, determine if the applicant is eligible for assistance. "
-        "Eligibility criteria: Monthly income < AED 5000 AND at least 2 dependents.\n\n"
-        "Provide a detailed response explaining your decision."
-    )
-    chain = prompt | llm | StrOutputParser()
-    
-    # Invoke the chain
-    response = chain.invoke({
-        "emirates_id": emirates_id,
-        "name": name,
-        "phone": phone,
-        "address": address,
-        "dependents": dependents,
-        "income": income,
-        "loans": loans,
-        "eligibility_status": 'eligible' if ml_validation['eligible'] else 'not eligible',
-        "confidence": ml_validation['confidence'] * 100  # Convert to percentage
-    })
-    
+
+    # Only the fields the decision depends on; identity details are not sent
+    prompt, tokens = fit_sections([
+        PromptSection(
+            "You are a financial assistance advisor for the UAE government. "
+            "Evaluate the following application for social support:\n"
+        ),
+        PromptSection(
+            f"Name: {name}\n"
+            f"Dependents: {dependents}\n"
+            f"Monthly Income: AED {income}\n"
+            f"Total Loans: AED {loans}"
+        ),
+        PromptSection(summarize_ml_validation(ml_validation), shrinkable=True),
+        PromptSection(
+            "\nBased on UAE social support policies, determine if the applicant is eligible for assistance. "
+            "Eligibility criteria: Monthly income < AED 5000 AND at least 2 dependents.\n"
+            "Provide a concise response explaining your decision."
+        )
+    ], FINANCIAL_PROMPT_TOKENS, name="financial_decision")
+    logger.info(f"Financial decision prompt: {tokens} tokens")
+
+    chain = get_local_llm(FINANCIAL_COMPLETION_TOKENS, Priority.DECISION) | StrOutputParser()
+    response = chain.invoke(prompt, config={"metadata": {"prompt_name": "financial_decision"}})
+
     logger.info(f"LLM evaluation completed")
     return response
 
@@ -1,35 +1,119 @@
-import joblib
+import os
+import threading
 import pandas as pd
-from typing import Dict, Any
+from dataclasses import dataclass
+from typing import Callable, Dict, Any, List, Optional
 from utils.logger import get_logger
-import shap  # <-- Add this import
+from utils.model_registry import load_version, manifest_signature, read_manifest
+import shap
 from langsmith import traceable, trace
 
 
 logger = get_logger("xgboost_validator")
 
+# Seconds between manifest checks; 0 disables hot reload
+MODEL_RELOAD_INTERVAL = float(os.environ.get("MODEL_RELOAD_INTERVAL", "30"))
+
+
+@dataclass(frozen=True)
+class ModelBundle:
+    """Immutable model, feature list and explainer of one registry version"""
+    version: str
+    model: Any
+    features: List[str]
+    explainer: Any
+
+
 class XGBoostValidator:
-    def __init__(self):
-        self.model = None
-        self.features = None
-        self.explainer = None  # <-- Add this line
+    def __init__(self, reload_interval: float = MODEL_RELOAD_INTERVAL):
+        self._bundle: Optional[ModelBundle] = None
+        self._reload_lock = threading.Lock()
+        self._signature = None
+        self._stop_event = threading.Event()
+        self._reload_callbacks: List[Callable[[str], None]] = []
         self._load_model()
-        
+        if reload_interval > 0:
+            self._start_watcher(reload_interval)
+
+    # Read-only views kept for callers that used the old attributes
+    @property
+    def model(self):
+        return self._bundle.model
 
-    def _load_model(self):
+    @property
+    def features(self):
+        return self._bundle.features
+
+    @property
+    def explainer(self):
+        return self._bundle.explainer
+
+    @property
+    def model_version(self) -> str:
+        return self._bundle.version
+
+    def _load_model(self, version: Optional[str] = None):
         try:
-            self.model = joblib.load("models/social_support_xgboost_model.pkl")
-            self.features = joblib.load("models/model_features.pkl")
-            logger.info("XGBoost model loaded successfully")
-            # Initialize SHAP explainer after model is loaded
-            import xgboost
-            self.explainer = shap.TreeExplainer(self.model)
+            signature = manifest_signature()
+            loaded = load_version(version)
+            # Build the SHAP explainer before publishing the bundle so a
+            # request never sees a model without its matching explainer
+            bundle = ModelBundle(
+                version=loaded["version"],
+                model=loaded["model"],
+                features=list(loaded["features"]),
+                explainer=shap.TreeExplainer(loaded["model"])
+            )
+            self._bundle = bundle  # single reference swap, atomic for readers
+            self._signature = signature
+            logger.info(f"XGBoost model version {bundle.version} loaded successfully")
         except Exception as e:
             logger.error(f"Failed to load model: {str(e)}")
             raise
+
+    def reload_if_changed(self) -> bool:
+        """Swap in the manifest's current version if it changed on disk"""
+        with self._reload_lock:
+            signature = manifest_signature()
+            if signature == self._signature:
+                return False
+            try:
+                current = read_manifest()["current"]
+                if self._bundle and current == self._bundle.version:
+                    self._signature = signature
+                    return False
+                self._load_model(current)
+                for callback in self._reload_callbacks:
+                    callback(current)
+                return True
+            except Exception as e:
+                # Keep serving the previous version on a bad deploy
+                logger.error(f"Model hot reload failed, keeping version "
+                             f"{self._bundle.version if self._bundle else None}: {str(e)}")
+                self._signature = signature
+                return False
+
+    def on_reload(self, callback: Callable[[str], None]):
+        """Call callback(version) after every hot reload, e.g. to drop results of the old model"""
+        self._reload_callbacks.append(callback)
+
+    def _start_watcher(self, interval: float):
+        def watch():
+            while not self._stop_event.wait(interval):
+                self.reload_if_changed()
+
+        thread = threading.Thread(target=watch, name="model-registry-watcher", daemon=True)
+        thread.start()
+
+    def stop(self):
+        self._stop_event.set()
+
     @traceable(name="XGBoost Validator", tags=["tool", "ml"], metadata={"type": "tool"})
     def validate(self, input_data: Dict[str, Any]) -> Dict[str, Any]:
         """Validate eligibility using the pre-trained model and capture SHAP values"""
+        # Pin the bundle for the whole request; a concurrent reload only
+        # affects requests that start after the swap
+        bundle = self._bundle
         try:
             # Prepare input DataFrame
             input_df = pd.DataFrame([{
@@ -38,30 +122,31 @@ class XGBoostValidator:
                 'dependents': input_data.get('dependents', 0),
                 'employment_status': 1,  # Default assumptions
                 'existing_benefits': 0
-            }], columns=self.features)
-            
+            }], columns=bundle.features)
+
             # Make prediction
-            proba = self.model.predict_proba(input_df)[0][1]
-            
+            proba = bundle.model.predict_proba(input_df)[0][1]
+
             # SHAP analysis
-            shap_values = self.explainer.shap_values(input_df)
+            shap_values = bundle.explainer.shap_values(input_df)
             # Convert SHAP values to a dict for easy serialization
-            shap_dict = {feature: float(shap_values[0][i]) for i, feature in enumerate(self.features)}
-            
+            shap_dict = {feature: float(shap_values[0][i]) for i, feature in enumerate(bundle.features)}
+
             return {
                 'eligible': bool(proba > 0.5),
                 'confidence': float(proba),
-                'model_version': '1.0',
+                'model_version': bundle.version,
                 'status': 'success',
-                'shap_values': shap_dict  # <-- Add SHAP values to output
+                'shap_values': shap_dict
             }
         except Exception as e:
             logger.error(f"Validation failed: {str(e)}")
             return {
                 'eligible': False,
                 'error': str(e),
+                'model_version': bundle.version,
                 'status': 'error'
             }
 
 # Singleton instance
-validator = XGBoostValidator()
\ No newline at end of file
+validator = XGBoostValidator()
@@ -0,0 +1,142 @@
+import copy
+import functools
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import Counter, OrderedDict
+from typing import Any, Callable, Dict, Iterable, Optional
+from utils.event_bus import progress_bus
+from utils.logger import get_logger
+
+logger = get_logger("workflow_memo")
+
+WORKFLOW_MEMO_ENABLED = os.environ.get("WORKFLOW_MEMO", "1") == "1"
+WORKFLOW_MEMO_SIZE = int(os.environ.get("WORKFLOW_MEMO_SIZE", "256"))
+WORKFLOW_MEMO_TTL = float(os.environ.get("WORKFLOW_MEMO_TTL", "3600"))
+
+
+def fingerprint(state: Dict[str, Any], reads: Iterable[str], extra: Any = None) -> str:
+    """
+    sha256 of the state keys a node reads (plus any extra context)
+
+    Uploads are content-addressed blob ids, so documents are fingerprinted
+    by content without hashing their bytes again.
+    """
+    payload = json.dumps([[key, state.get(key)] for key in reads] + [extra],
+                         sort_keys=True, default=str, separators=(",", ":"))
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class NodeMemo:
+    """
+    Bounded store of workflow node outputs keyed by input fingerprint
+
+    A wrapped node whose read keys hash to a fingerprint seen within the
+    TTL returns a copy of the earlier output instead of running, so a
+    resubmission that corrects one field only re-executes the nodes that
+    read it. Outputs reporting errors are never stored. Outputs that also
+    depend on shared data outside the state are stored with its version and
+    recomputed once it changes. Entries are evicted least recently used
+    first, or removed with invalidate() (the validator calls it on model
+    reload).
+    """
+
+    def __init__(self, max_entries: int = WORKFLOW_MEMO_SIZE, ttl: float = WORKFLOW_MEMO_TTL,
+                 enabled: bool = WORKFLOW_MEMO_ENABLED):
+        self._entries: "OrderedDict[tuple, tuple]" = OrderedDict()
+        self._max_entries = max_entries
+        self._ttl = ttl
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self._hits = Counter()
+        self._misses = Counter()
+
+    def _get(self, key: tuple):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            stored_at, output, version = entry
+            if time.monotonic() - stored_at > self._ttl:
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return output, version
+
+    def _put(self, key: tuple, output: Dict[str, Any], version: Any = None):
+        with self._lock:
+            self._entries[key] = (time.monotonic(), copy.deepcopy(output), version)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self._max_entries:
+                self._entries.popitem(last=False)
+
+    def wrap(self, node_name: str, func: Callable, reads: Iterable[str],
+             context: Optional[Callable[[], Any]] = None, label: str = "",
+             cacheable: Optional[Callable[[Dict[str, Any]], bool]] = None,
+             version: Optional[Callable[[Dict[str, Any], Dict[str, Any]], Any]] = None,
+             on_reuse: Optional[Callable[[Dict[str, Any], Dict[str, Any]], None]] = None) -> Callable:
+        """
+        Memoize a node on the state keys it reads
+
+        Args:
+            node_name: Graph node name, also the stage reported on reuse
+            func: Node function returning a state delta
+            reads: Every state key the node's output depends on
+            context: Returns extra inputs outside the state (e.g. the model version)
+            label: Progress label published when the output is reused
+            cacheable: Decides whether an output may be reused (e.g. not degraded ones)
+            version: Version of shared data the output was computed from, given the
+                state and the output; a stored output whose version changed is recomputed
+            on_reuse: Called with the state and the output when an output is reused
+        """
+        reads = tuple(reads)
+
+        @functools.wraps(func)
+        def wrapper(state, *args, **kwargs):
+            if not self.enabled:
+                return func(state, *args, **kwargs)
+            key = (node_name, fingerprint(state, reads, context() if context else None))
+            entry = self._get(key)
+            if entry is not None and version is not None and version(state, entry[0]) != entry[1]:
+                logger.info(f"{node_name}: shared data changed since the stored output, recomputing")
+                entry = None
+            if entry is not None:
+                output = copy.deepcopy(entry[0])
+                with self._lock:
+                    self._hits[node_name] += 1
+                logger.info(f"{node_name}: inputs unchanged, reusing previous output")
+                progress_bus.publish(state.get("run_id"), node_name, "reused", label or node_name)
+                if on_reuse is not None:
+                    on_reuse(state, output)
+                return output
+            with self._lock:
+                self._misses[node_name] += 1
+            output = func(state, *args, **kwargs)
+            if isinstance(output, dict) and not output.get("errors") and (cacheable is None or cacheable(output)):
+                self._put(key, output, version(state, output) if version is not None else None)
+            return output
+
+        return wrapper
+
+    def invalidate(self, node_name: Optional[str] = None) -> int:
+        """Drop stored outputs of one node, or of all nodes; returns the number removed"""
+        with self._lock:
+            keys = [k for k in self._entries if node_name is None or k[0] == node_name]
+            for key in keys:
+                del self._entries[key]
+        logger.info(f"Invalidated {len(keys)} memoized outputs" + (f" of {node_name}" if node_name else ""))
+        return len(keys)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            nodes = set(self._hits) | set(self._misses)
+            return {
+                "entries": len(self._entries),
+                "nodes": {n: {"hits": self._hits[n], "misses": self._misses[n]} for n in sorted(nodes)}
+            }
+
+
+# Process-wide memo of the application workflow's nodes
+node_memo = NodeMemo()
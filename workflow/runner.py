@@ -0,0 +1,132 @@
+from typing import Any, Dict, Iterable, Optional
+from db.audit_log import audit_log
+from db.database import insert_application
+from utils.blob_store import BlobStoreFull, blob_store
+from utils.event_bus import progress_bus
+from utils.logger import get_logger
+from utils.profiling import profile_run
+from utils.status_tracker import StatusTracker
+from workflow.workflow import app as workflow_app
+
+logger = get_logger("workflow_runner")
+
+# State keys holding blob ids of uploads, which never leave the process
+_FILE_KEYS = ("emirates_id_file", "resume_file")
+_FILE_LIST_KEYS = ("bank_statement_files",)
+_INTERNAL_KEYS = {*_FILE_KEYS, *_FILE_LIST_KEYS, "prior_run_ids"}
+
+
+def build_initial_state(run_id: str, form_data: Dict[str, Any], resume_file: Optional[Any] = None,
+                        prior_run_ids: Iterable[str] = ()) -> Dict[str, Any]:
+    """
+    Workflow input from submitted form fields and uploaded files
+
+    Uploads are moved into the blob store and the state carries their ids;
+    run_application releases them when the run ends.
+
+    Raises:
+        BlobStoreFull: The store has no room for the uploads (none are kept)
+    """
+    files = {key: form_data.get(key) for key in _FILE_KEYS}
+    files["resume_file"] = resume_file
+    file_lists = {key: form_data.get(key) or [] for key in _FILE_LIST_KEYS}
+    stored = []
+    try:
+        blob_ids = {key: blob_store.put(source) for key, source in files.items()}
+        stored.extend(blob_ids.values())
+        blob_lists = {}
+        for key, sources in file_lists.items():
+            blob_lists[key] = []
+            for source in sources:
+                blob_id = blob_store.put(source)
+                stored.append(blob_id)
+                if blob_id:
+                    blob_lists[key].append(blob_id)
+    except BlobStoreFull:
+        for blob_id in stored:
+            blob_store.release(blob_id)
+        raise
+    return {
+        **form_data,
+        **blob_ids,
+        **blob_lists,
+        "run_id": run_id,
+        "prior_run_ids": list(prior_run_ids),
+        "extracted_emirates_id": "",
+        "extracted_name": "",
+        "extracted_address": "",
+        "extracted_phone": "",
+        "extracted_income": 0.0,
+        "extracted_loans": 0.0,
+        "mismatches": [],
+        "ollama_response": ""
+    }
+
+
+def run_application(initial_state: Dict[str, Any], profile: bool = False) -> Dict[str, Any]:
+    """
+    Run the workflow for one submission and store the application
+
+    Duplicates rejected by the workflow are not stored again. The final
+    state gains an application_id key (None when nothing was stored,
+    negative and provisional when DB_WRITE_MODE=spool), and profile_files
+    when the run was profiled (profile=True, PROFILE_RUNS or sampled).
+    Every run, failed ones included, is queued to the audit log.
+    """
+    run_id = initial_state["run_id"]
+    try:
+        with profile_run(run_id, requested=profile) as run_profile:
+            final_state = workflow_app.invoke(initial_state)
+
+            application_id = None
+            if not final_state.get('duplicate_of'):
+                application_id = insert_application(
+                    final_state['extracted_emirates_id'],
+                    initial_state['name'], initial_state['phone'], initial_state['address'],
+                    initial_state['dependents'], initial_state['income'], initial_state['loans'],
+                    final_state['extracted_income'],
+                    final_state['extracted_loans'],
+                    eligible=(final_state.get('validation_result') or {}).get('eligible'),
+                    mismatch_fields=final_state.get('mismatches') or [],
+                    run_id=run_id,
+                    submitted_emirates_id=initial_state['emirates_id']
+                )
+        StatusTracker.set_status(run_id, "✅ Processing complete")
+        final_state = {**final_state, 'application_id': application_id}
+        if run_profile is not None:
+            final_state['profile_files'] = run_profile.files
+        _audit(initial_state, final_state, application_id, "duplicate" if final_state.get('duplicate_of') else "complete")
+        return final_state
+    except Exception as e:
+        StatusTracker.set_status(run_id, "❌ Processing error")
+        logger.error(f"Run {run_id} failed: {str(e)}")
+        _audit(initial_state, {**initial_state, "errors": str(e)}, None, "error")
+        raise
+    finally:
+        for key in _FILE_KEYS:
+            blob_store.release(initial_state.get(key))
+        for key in _FILE_LIST_KEYS:
+            for blob_id in initial_state.get(key) or []:
+                blob_store.release(blob_id)
+
+
+def _audit(initial_state: Dict[str, Any], final_state: Dict[str, Any], application_id: Optional[int], status: str):
+    """Queue the run's full result and stage timings; never fails the run"""
+    try:
+        audit_log.record(
+            initial_state["run_id"], application_id,
+            final_state.get('extracted_emirates_id') or initial_state.get('emirates_id'), status,
+            {**public_result(final_state), "stage_timings": progress_bus.stage_timings(initial_state["run_id"])}
+        )
+    except Exception as e:
+        logger.error(f"Audit record of run {initial_state['run_id']} failed: {str(e)}")
+
+
+def public_result(final_state: Dict[str, Any]) -> Dict[str, Any]:
+    """Final state without uploads, DataFrames or other non-serializable values"""
+    result = {}
+    for key, value in final_state.items():
+        if key in _INTERNAL_KEYS or not isinstance(value, (str, int, float, bool, list, dict, type(None))):
+            continue
+        result[key] = value
+    return result
@@ -4,15 +4,25 @@ from typing import TypedDict, List, Optional, Any
 from agents.document_loader_agent import load_documents_and_extract_fields
 from agents.reconciliation_agent import reconcile_fields
 from agents.validation_agent import run_all_validations
+from agents.recommendation_queue import recommendation_queue
+from agents.decision_policy import Decision, decide, record_decision, render_clear_cut
+from llm_utils.llm_gateway import LLMGatewayBusy
+from db import ledger
+from db.duplicate_index import duplicate_index
 from utils.utils import ollama_financial_assistance_response
 from utils.logger import get_logger
 from utils.xgboost_validator import validator
-from utils.status_tracker import StatusTracker
+from utils.event_bus import tracked_stage
+from utils.blob_store import blob_store
+from workflow.memo import node_memo
 from langsmith import traceable
 
 logger = get_logger("workflow")
 
 class ApplicationState(TypedDict):
+    run_id: str
+    prior_run_ids: List[str]  # earlier stored runs of this session, not duplicates of it
+    duplicate_of: Optional[dict]
     emirates_id: str
     name: str
     phone: str
@@ -20,8 +30,8 @@ class ApplicationState(TypedDict):
     dependents: int
     income: float
     loans: float
-    emirates_id_file: Optional[Any]
-    bank_statement_file: Optional[Any]
+    emirates_id_file: Optional[str]  # blob ids in utils.blob_store, not file objects
+    bank_statement_files: List[str]
     extracted_emirates_id: str
     extracted_name: str
     extracted_address: str
@@ -31,40 +41,68 @@ class ApplicationState(TypedDict):
     mismatches: List[str]
     ollama_response: str
     validation_results: dict
-    resume_file: Optional[Any]
+    validation_result: Optional[dict]
+    errors: Optional[str]
+    resume_file: Optional[str]
     recommendations: Optional[dict[str, Any]]
 
 
-def log_state_change(node_name: str, state: ApplicationState):
-    """Log state changes with sensitive data redaction"""
-    safe_state = {
-        **state,
-        "emirates_id": f"{state['emirates_id'][:3]}..." if state['emirates_id'] else "",
-        "extracted_emirates_id": f"{state['extracted_emirates_id'][:3]}..." if state['extracted_emirates_id'] else "",
-        "phone": f"{state['phone'][:3]}..." if state['phone'] else "",
-        "extracted_phone": f"{state['extracted_phone'][:3]}..." if state.get('extracted_phone') else "",
-        "name": f"{state['name'][:1]}***" if state['name'] else "",
-        "extracted_name": f"{state['extracted_name'][:1]}***" if state.get('extracted_name') else "",
-        "address": f"{state['address'][:10]}..." if state['address'] else "",
-        "extracted_address": f"{state['extracted_address'][:10]}..." if state.get('extracted_address') else "",
-        "emirates_id_file": "[FILE]" if state['emirates_id_file'] else "None",
-        "bank_statement_file": "[FILE]" if state['bank_statement_file'] else "None"
-    }
-    logger.info(f"STATE CHANGE AFTER {node_name}: {safe_state}")
+_REDACTED_PREFIX = {
+    "emirates_id": 3, "extracted_emirates_id": 3,
+    "phone": 3, "extracted_phone": 3,
+    "address": 10, "extracted_address": 10
+}
+_REDACTED_NAMES = ("name", "extracted_name")
+
+
+def log_state_change(node_name: str, update: dict):
+    """Log the keys a node changed, with sensitive data redacted"""
+    safe_update = {}
+    for key, value in update.items():
+        if key in _REDACTED_PREFIX:
+            value = f"{value[:_REDACTED_PREFIX[key]]}..." if value else ""
+        elif key in _REDACTED_NAMES:
+            value = f"{value[:1]}***" if value else ""
+        safe_update[key] = value
+    logger.info(f"STATE CHANGE AFTER {node_name}: {safe_update}")
+
+@traceable(name="Check Duplicates", tags=["tool"], metadata={"type": "tool"})
+@tracked_stage("check_duplicates", "🔎 Checking for duplicate applications")
+def check_duplicates_node(state: ApplicationState) -> ApplicationState:
+    """Reject resubmitted Emirates IDs, phones or addresses before any expensive work"""
+    logger.info("Starting duplicate application check")
+    try:
+        matches = duplicate_index.find(
+            state['emirates_id'],
+            state['phone'],
+            state['address'],
+            exclude_runs=state.get('prior_run_ids') or []
+        )
+        if matches:
+            logger.warning(f"Duplicate application detected on: {', '.join(matches)}")
+        return {'duplicate_of': matches}
+    except Exception as e:
+        # Never block an application because the index is unavailable
+        logger.error(f"Duplicate check failed: {str(e)}")
+        return {'duplicate_of': {}}
+
+def check_duplicate_route(state: ApplicationState) -> str:
+    if state.get('duplicate_of'):
+        logger.info("Routing to END due to duplicate application")
+        return "end"
+    return "extract"
 
 @traceable(name="Extract Documents", tags=["agent"], metadata={"type": "agent"})
+@tracked_stage("extract_documents", "📄 Extracting documents")
 def extract_documents_node(state: ApplicationState) -> ApplicationState:
     logger.info("Starting document extraction node")
-    logger.info(f"Status update: Extracting documents")
-    StatusTracker.set_status("📄 Extracting documents")
     try:
         doc_result = load_documents_and_extract_fields(
-            state['emirates_id_file'],
+            blob_store.open(state['emirates_id_file']),
             state['emirates_id'],
-            state['bank_statement_file']
+            [blob_store.open(blob_id) for blob_id in state.get('bank_statement_files') or []]
         )
         new_state = {
-            **state,
             'extracted_emirates_id': doc_result['extracted_emirates_id'],
             'extracted_name': doc_result['extracted_name'],
             'extracted_address': doc_result['extracted_address'],
@@ -86,10 +124,9 @@ def extract_documents_node(state: ApplicationState) -> ApplicationState:
         raise
 
 @traceable(name="Reconcile Data", tags=["agent"], metadata={"type": "agent"})
+@tracked_stage("reconcile_data", "🔍 Reconciling data")
 def reconcile_data_node(state: ApplicationState) -> ApplicationState:
     logger.info("Starting data reconciliation node")
-    logger.info(f"Status update: Recocilliation fields")
-    StatusTracker.set_status("🔍 Reconciling data")
     try:
         mismatches = reconcile_fields(
             state['name'], state['extracted_name'],
@@ -98,7 +135,7 @@ def reconcile_data_node(state: ApplicationState) -> ApplicationState:
             state['income'], state['extracted_income'],
             state['loans'], state['extracted_loans']
         )
-        new_state = {**state, 'mismatches': mismatches}
+        new_state = {'mismatches': mismatches}
         
         if mismatches:
             logger.warning(f"Data reconciliation found mismatches: {', '.join(mismatches)}")
@@ -112,11 +149,10 @@ def reconcile_data_node(state: ApplicationState) -> ApplicationState:
         raise
 
 @traceable(name="Run Validation", tags=["agent"], metadata={"type": "agent"})
+@tracked_stage("run_validation", "🔍 Validating information")
 def run_validation_node(state: ApplicationState) -> ApplicationState:
     """Run all data validations"""
     logger.info("Starting data validation node")
-    logger.info(f"Status update: 🔍 Validating information")
-    StatusTracker.set_status("🔍 Validating information")
     try:
         validation_results = run_all_validations(
             state['emirates_id'],
@@ -125,10 +161,7 @@ def run_validation_node(state: ApplicationState) -> ApplicationState:
             state['dependents']
         )
         
-        new_state = {
-            **state,
-            'validation_results': validation_results
-        }
+        new_state = {'validation_results': validation_results}
         
         logger.info(f"Validation completed - All valid: {validation_results['all_valid']}")
         log_state_change("RUN_VALIDATION", new_state)
@@ -154,11 +187,9 @@ def check_validation(state: ApplicationState) -> str:
         return "end"
 
 @traceable(name="Evaluate Financial Assistance", tags=["llm", "financial"], metadata={"type": "llm"})
+@tracked_stage("evaluate_financial_assistance", "🤖 Running AI evaluation")
 def evaluate_financial_assistance_node(state: ApplicationState) -> ApplicationState:
     logger.info("Starting financial assistance evaluation")
-    # logger.info(f"Current workflow state at evaluation: {state}")
-    logger.info(f"Status update: 🤖 Running AI evaluation")
-    StatusTracker.set_status("🔍 🤖 Running AI evaluation")
     try:
         # Prepare data for XGBoost validator
         validation_input = {
@@ -171,7 +202,7 @@ def evaluate_financial_assistance_node(state: ApplicationState) -> ApplicationSt
         validation_result = validator.validate(validation_input)
         logger.info(f"ML validation_result received: {validation_result}")
         
-        # Prepare LLM input with all required fields and detailed ML output
+        # Prepare LLM input: decision fields and the ML result with its SHAP analysis
         llm_input = {
             'income': state['extracted_income'],
             'loans': state['extracted_loans'],
@@ -179,31 +210,37 @@ def evaluate_financial_assistance_node(state: ApplicationState) -> ApplicationSt
             'ml_validation': {
                 'eligible': validation_result['eligible'],
                 'confidence': validation_result.get('confidence'),
-                'model_version': validation_result.get('model_version'),
                 'status': validation_result.get('status'),
-                'shap_values': validation_result.get('shap_values')  # SHAP analysis
+                'shap_values': validation_result.get('shap_values')
             },
-            'eligibility_status': 'eligible' if validation_result['eligible'] else 'not_eligible',
-            'name': state['name'],
-            'emirates_id': state['emirates_id'],
-            'phone': state['phone'],
-            'mismatches': state.get('mismatches', []),
-            'address': state['address']
+            'name': state['name']
         }
         
-        # Get LLM response
-        response = ollama_financial_assistance_response(**llm_input)
+        # Templated response for settled outcomes, LLM only for borderline cases
+        decision = decide(
+            state['name'], state['extracted_income'], state['extracted_loans'], state['dependents'],
+            llm_input['ml_validation'], state.get('validation_results')
+        )
+        record_decision(decision)
+        response = decision.response
+        if decision.use_llm:
+            try:
+                response = ollama_financial_assistance_response(**llm_input)
+            except LLMGatewayBusy as e:
+                # Degrade to the templated decision instead of failing the application
+                logger.warning(f"LLM unavailable for decision, using template: {str(e)}")
+                response = render_clear_cut(state['name'], state['extracted_income'], state['extracted_loans'],
+                                            state['dependents'], llm_input['ml_validation'])
+                validation_result = {**validation_result, 'llm_fallback': True}
         
         return {
-            **state,
             'ollama_response': response,
-            'validation_result': validation_result
+            'validation_result': {**validation_result, 'decision_reason': decision.reason}
         }
         
     except Exception as e:
         logger.error(f"Evaluation failed: {str(e)}")
         return {
-            **state,
             'errors': str(e),
             'validation_result': None
         }
@@ -215,43 +252,85 @@ def check_reconciliation(state: ApplicationState) -> str:
     logger.info("Routing to data valiation on third party API services")
     return "validate"
 
-@traceable(name="Generate Recommendations", run_type="chain")
-def generate_recommendations_node(state: ApplicationState) -> ApplicationState:
-    logger.info("Starting recommendation generation")
-    StatusTracker.set_status("💼 Generating career recommendations") 
+@traceable(name="Enqueue Recommendations", run_type="chain")
+@tracked_stage("enqueue_recommendations", "💼 Queuing career recommendations")
+def enqueue_recommendations_node(state: ApplicationState) -> ApplicationState:
+    """Hand recommendation generation to the background queue so the decision returns immediately"""
+    logger.info("Queuing recommendation generation")
     try:
-        if state.get('validation_result', {}).get('eligible') and state.get('resume_file'):
-            from agents.recommendation_agent import RecommendationAgent
-            
-            recommender = RecommendationAgent()
-            recommendations = recommender.generate_recommendations(
-                financial_approved=True,
-                resume_text=state.get('resume_file'),
-                financial_data={
+        if (state.get('validation_result') or {}).get('eligible') and state.get('resume_file'):
+            recommendations = recommendation_queue.enqueue(
+                state['run_id'],
+                blob_store.get(state['resume_file']),
+                {
                     'income': state['extracted_income'],
                     'loans': state['extracted_loans'],
                     'dependents': state['dependents']
                 }
             )
-            
-            return {
-                **state,
-                'recommendations': recommendations
-            }
-        return state
+            return {'recommendations': recommendations}
+        return {}
+    except Exception as e:
+        logger.error(f"Queuing recommendations failed: {str(e)}")
+        return {}
+
+def _ledger_version(state: ApplicationState, output: dict):
+    """Version of the ledger extracted income and loans were read from"""
+    if not state.get('bank_statement_files'):
+        return None
+    try:
+        return ledger.ledger_version(output.get('extracted_emirates_id') or state['emirates_id'])
     except Exception as e:
-        logger.error(f"Recommendation generation failed: {str(e)}")
-        return state
+        logger.warning(f"Ledger version unavailable, documents will be extracted again: {str(e)}")
+        return object()  # equal to no stored version
+
+def _record_reused_decision(state: ApplicationState, output: dict):
+    record_decision(Decision(use_llm=False, reason="reused"))
 
 workflow = StateGraph(ApplicationState)
 
-workflow.add_node("extract_documents", extract_documents_node)
-workflow.add_node("reconcile_data", reconcile_data_node)
-workflow.add_node("run_validation", run_validation_node)
-workflow.add_node("evaluate_financial_assistance", evaluate_financial_assistance_node)
-workflow.add_node("generate_recommendations", generate_recommendations_node)
+# Nodes are memoized on the state keys they read, so a resubmission only
+# re-runs what its corrections affect. The duplicate check reads the live
+# index and enqueueing has a side effect per run; both always run.
+workflow.add_node("check_duplicates", check_duplicates_node)
+workflow.add_node("extract_documents", node_memo.wrap(
+    "extract_documents", extract_documents_node,
+    reads=("emirates_id", "emirates_id_file", "bank_statement_files"),
+    label="📄 Documents unchanged",
+    version=_ledger_version
+))
+workflow.add_node("reconcile_data", node_memo.wrap(
+    "reconcile_data", reconcile_data_node,
+    reads=("name", "extracted_name", "phone", "extracted_phone", "address", "extracted_address",
+           "income", "extracted_income", "loans", "extracted_loans"),
+    label="🔍 Reconciliation unchanged"
+))
+workflow.add_node("run_validation", node_memo.wrap(
+    "run_validation", run_validation_node,
+    reads=("emirates_id", "name", "address", "dependents"),
+    label="🔍 Validation unchanged"
+))
+workflow.add_node("evaluate_financial_assistance", node_memo.wrap(
+    "evaluate_financial_assistance", evaluate_financial_assistance_node,
+    reads=("name", "extracted_income", "extracted_loans", "dependents", "validation_results"),
+    context=lambda: validator.model_version,
+    label="🤖 Evaluation unchanged",
+    cacheable=lambda output: not (output.get('validation_result') or {}).get('llm_fallback'),
+    on_reuse=_record_reused_decision
+))
+workflow.add_node("enqueue_recommendations", enqueue_recommendations_node)
+# Evaluations of the previous model are unreachable after a reload; free them
+validator.on_reload(lambda version: node_memo.invalidate("evaluate_financial_assistance"))
 
-workflow.set_entry_point("extract_documents")
+workflow.set_entry_point("check_duplicates")
+workflow.add_conditional_edges(
+    "check_duplicates",
+    check_duplicate_route,
+    {
+        "end": END,
+        "extract": "extract_documents"
+    }
+)
 workflow.add_edge("extract_documents", "reconcile_data")
 workflow.add_conditional_edges(
     "reconcile_data",
@@ -270,7 +349,7 @@ workflow.add_conditional_edges(
     }
 )
 # workflow.add_edge("evaluate_financial_assistance", END)
-workflow.add_edge("evaluate_financial_assistance", "generate_recommendations")
-workflow.add_edge("generate_recommendations", END)
+workflow.add_edge("evaluate_financial_assistance", "enqueue_recommendations")
+workflow.add_edge("enqueue_recommendations", END)
 
 app = workflow.compile()
\ No newline at end of file